@@ -1,12 +1,15 @@
 #backend/app.py
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, request, jsonify, send_from_directory, stream_with_context, g, has_request_context
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session as BaseSession
 from flask_jwt_extended import JWTManager, jwt_required, create_access_token, get_jwt_identity, create_refresh_token, get_jwt
 from flask_cors import CORS
 from flask_mail import Mail, Message
 from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename
-from datetime import datetime, timedelta, timezone
+from werkzeug.test import EnvironBuilder
+from datetime import datetime, timedelta, timezone, date
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 import os
 import secrets
 import smtplib
@@ -17,10 +20,30 @@ import cloudinary.uploader
 from openai import OpenAI
 import json
 import re
-from sqlalchemy import or_, and_, func, desc
+import zipfile
+import gzip
+import zlib
+import difflib
+import base64
+import html
+import math
+from sqlalchemy import Select, or_, and_, func, desc, update, insert, delete, select, exists, bindparam, tuple_, event, case, literal_column, true, false, inspect, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import defer, make_transient_to_detached
+from sqlalchemy.orm.exc import StaleDataError
 from sqlalchemy.dialects.postgresql import UUID
 import uuid
+import click
+import time
+import queue
+import random
+import atexit
+import threading
+import socketserver
 from collections import defaultdict
+from functools import wraps
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
 
 app = Flask(__name__)
 
@@ -30,6 +53,15 @@ app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', secrets.token_hex(32)
 app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(hours=1)
 app.config['JWT_REFRESH_TOKEN_EXPIRES'] = timedelta(days=30)
 
+# Password Hashing Configuration
+# The method string (algorithm and cost parameters) is stored as the prefix of
+# every werkzeug hash, so it doubles as the hash version: any stored hash whose
+# prefix differs from PASSWORD_HASH_METHOD is upgraded on the next login.
+PASSWORD_HASH_METHOD = os.getenv('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', 2))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv('PASSWORD_HASH_MAX_PENDING', 16))
+PASSWORD_HASH_TIMEOUT = float(os.getenv('PASSWORD_HASH_TIMEOUT', 10))
+
 # Database Configuration
 if os.getenv('DATABASE_URL'):
     app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL').replace('postgres://', 'postgresql://')
@@ -38,10 +70,30 @@ else:
 
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
+# Read Replica Configuration
+# DATABASE_REPLICA_URL takes one or more comma-separated replica URLs. GET and
+# HEAD requests read from a replica, except for users who wrote within the last
+# REPLICA_PIN_SECONDS, which should stay above the worst replication lag. Pins
+# live in the cache, so they only hold across workers with REDIS_URL.
+app.config['SQLALCHEMY_BINDS'] = {
+    f'replica_{i}': url.strip().replace('postgres://', 'postgresql://')
+    for i, url in enumerate(u for u in os.getenv('DATABASE_REPLICA_URL', '').split(',') if u.strip())
+}
+REPLICA_BINDS = list(app.config['SQLALCHEMY_BINDS'])
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', 10))
+
+class RoutingSession(BaseSession):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and REPLICA_BINDS and not self._flushing and is_replica_read(clause):
+            return self._db.engines[g.replica_bind]
+        if has_request_context() and (self._flushing or getattr(clause, 'is_dml', False)):
+            g.db_wrote = True
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
 # Initialize extensions
-db = SQLAlchemy(app)
+db = SQLAlchemy(app, session_options={"class_": RoutingSession})
 jwt = JWTManager(app)
-CORS(app, origins=['http://localhost:3000', 'https://dsa-learningdaily.vercel.app'])
+CORS(app, origins=['http://localhost:3000', 'https://dsa-learningdaily.vercel.app'], expose_headers=['ETag'])
 
 # Cloudinary Configuration
 cloudinary.config(
@@ -59,546 +111,213 @@ if os.getenv('OPENAI_API_KEY'):
         print(f"OpenAI initialization failed: {e}")
         openai_client = None
 
+# Cache Configuration
+# Without REDIS_URL every worker keeps its own in-memory cache, so revocations
+# made in another worker are picked up once SESSION_STATE_TTL expires.
+REDIS_URL = os.getenv('REDIS_URL')
+CACHE_MAX_ENTRIES = int(os.getenv('CACHE_MAX_ENTRIES', 50000))
+
+# Entity Cache Configuration
+# User and UserPreferences rows are cached in the shared cache by id for up to
+# ENTITY_CACHE_TTL seconds and dropped as soon as a change to them commits.
+# Needs REDIS_URL; without a shared cache rows are always read from the database.
+ENTITY_CACHE_TTL = int(os.getenv('ENTITY_CACHE_TTL', 300))
+# How long a changed row stays uncacheable, covering reads that loaded it
+# before the change committed
+ENTITY_CACHE_TOMBSTONE_TTL = int(os.getenv('ENTITY_CACHE_TOMBSTONE_TTL', 10))
+
+# Session Tracking Configuration
+SESSION_STATE_TTL = int(os.getenv('SESSION_STATE_TTL', 60))
+SESSION_ACTIVITY_FLUSH_INTERVAL = int(os.getenv('SESSION_ACTIVITY_FLUSH_INTERVAL', 60))
+
+# Notification Stream Configuration
+NOTIFICATION_STREAM_HEARTBEAT = int(os.getenv('NOTIFICATION_STREAM_HEARTBEAT', 15))
+NOTIFICATION_STREAM_MAX_SECONDS = int(os.getenv('NOTIFICATION_STREAM_MAX_SECONDS', 300))
+
+# Notification Fan-out Configuration
+NOTIFICATION_FANOUT_CHUNK_SIZE = int(os.getenv('NOTIFICATION_FANOUT_CHUNK_SIZE', 1000))
+EMAIL_DELIVERY_INTERVAL = int(os.getenv('EMAIL_DELIVERY_INTERVAL', 30))
+EMAIL_DELIVERY_BATCH_SIZE = int(os.getenv('EMAIL_DELIVERY_BATCH_SIZE', 50))
+EMAIL_MAX_ATTEMPTS = int(os.getenv('EMAIL_MAX_ATTEMPTS', 5))
+# A claimed email whose worker died is picked up again after this long
+EMAIL_DELIVERY_LEASE_SECONDS = int(os.getenv('EMAIL_DELIVERY_LEASE_SECONDS', 300))
+
+# Pomodoro Stats Configuration
+POMODORO_STATS_TTL = int(os.getenv('POMODORO_STATS_TTL', 3600))
+
+# Leaderboard Configuration
+LEADERBOARD_REBUILD_INTERVAL = int(os.getenv('LEADERBOARD_REBUILD_INTERVAL', 300))
+LEADERBOARD_MAX_LIMIT = 100
+
+# Progress Sync Configuration
+PROGRESS_BATCH_MAX_ENTRIES = int(os.getenv('PROGRESS_BATCH_MAX_ENTRIES', 200))
+
+# Note Storage Configuration
+# Bodies at least this many characters long are stored zlib-compressed.
+# PostgreSQL already compresses large values (TOAST), so this mainly pays off
+# on SQLite; set it very high to disable.
+NOTE_COMPRESSION_THRESHOLD = int(os.getenv('NOTE_COMPRESSION_THRESHOLD', 4096))
+NOTE_SNIPPET_LENGTH = 200
+# Every Nth revision of a note is stored whole; the ones in between are diffs
+# against their predecessor, so rebuilding any version applies at most N-1 diffs
+NOTE_SNAPSHOT_INTERVAL = int(os.getenv('NOTE_SNAPSHOT_INTERVAL', 20))
+
+# Export/Import Configuration
+EXPORT_FETCH_SIZE = int(os.getenv('EXPORT_FETCH_SIZE', 500))
+IMPORT_BATCH_SIZE = int(os.getenv('IMPORT_BATCH_SIZE', 500))
+
+# Calendar Configuration
+CALENDAR_MAX_RANGE_WEEKS = 16
+CALENDAR_FEED_TTL = int(os.getenv('CALENDAR_FEED_TTL', 86400))
+CALENDAR_FEED_POMODORO_DAYS = int(os.getenv('CALENDAR_FEED_POMODORO_DAYS', 90))
+
+# Account Deletion Configuration
+ACCOUNT_PURGE_INTERVAL = int(os.getenv('ACCOUNT_PURGE_INTERVAL', 60))
+ACCOUNT_PURGE_CHUNK_SIZE = int(os.getenv('ACCOUNT_PURGE_CHUNK_SIZE', 500))
+# A worker that stops renewing its claim on a purge for this long is presumed dead
+ACCOUNT_PURGE_LEASE_SECONDS = int(os.getenv('ACCOUNT_PURGE_LEASE_SECONDS', 300))
+
+# Data Retention Configuration
+# Days each table keeps rows that no longer matter (see RETENTION_POLICIES);
+# RETENTION_<TABLE>_DAYS overrides a default and a negative value keeps rows forever.
+RETENTION_DAYS = {
+    name: int(os.getenv(f'RETENTION_{name.upper()}_DAYS', default)) for name, default in (
+        ('password_reset', 0),
+        ('user_session', 30),
+        ('notification', 90),
+        ('ai_conversation', 365),
+        ('idempotency_key', 2),
+        ('change_log', 30),
+        ('email_outbox', 30),
+        ('account_deletion', 30),
+    )
+}
+RETENTION_INTERVAL = int(os.getenv('RETENTION_INTERVAL', 3600))
+RETENTION_BATCH_SIZE = int(os.getenv('RETENTION_BATCH_SIZE', 500))
+# Archived rows are appended to gzipped NDJSON files here before being deleted
+RETENTION_ARCHIVE_DIR = os.getenv('RETENTION_ARCHIVE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'archive'))
+
+# Partitioning Configuration
+# On PostgreSQL pomodoro_session and ai_conversation are range-partitioned by
+# month; partitions are created this many months ahead of time.
+PARTITIONED_STORAGE = app.config['SQLALCHEMY_DATABASE_URI'].startswith('postgresql')
+PARTITION_MONTHS_AHEAD = int(os.getenv('PARTITION_MONTHS_AHEAD', 3))
+PARTITION_MAINTENANCE_INTERVAL = int(os.getenv('PARTITION_MAINTENANCE_INTERVAL', 86400))
+# Pomodoros are looked up in the partitions of this many recent hours first
+POMODORO_MAX_OPEN_HOURS = int(os.getenv('POMODORO_MAX_OPEN_HOURS', 24))
+
+# Batch Request Configuration
+BATCH_MAX_REQUESTS = int(os.getenv('BATCH_MAX_REQUESTS', 20))
+BATCH_PARALLEL_WORKERS = int(os.getenv('BATCH_PARALLEL_WORKERS', 4))
+# Headers a sub-request may set itself; Authorization always comes from the batch
+BATCH_FORWARDED_HEADERS = ('If-None-Match', 'If-Match', 'Idempotency-Key', 'Accept-Language')
+BATCH_RESPONSE_HEADERS = ('ETag', 'Location', 'Retry-After', 'Cache-Control')
+# Per-request state in g: the replica picked for reads, whether the request
+# wrote, the entity cache generation it read and the user version its ETag names
+BATCH_REQUEST_SCOPED_GLOBALS = ('replica_bind', 'db_wrote', 'entity_cache_generation', 'user_data_version')
+
+# Cohort Configuration
+COHORT_MAX_MEMBERS = int(os.getenv('COHORT_MAX_MEMBERS', 1000))
+COHORT_STRAGGLER_DAYS = int(os.getenv('COHORT_STRAGGLER_DAYS', 7))
+
 # Email Configuration
 SMTP_HOST = 'smtp.gmail.com'
 SMTP_PORT = 587
 SMTP_USER = os.getenv('SMTP_USER')
 SMTP_PASS = os.getenv('SMTP_PASS')
 
-# Embedded Data
-RESOURCES = {
-    # Text Resources
-    "w3_python_getstarted": {"title": "Python Setup - W3Schools", "url": "https://www.w3schools.com/python/python_getstarted.asp", "type": "text"},
-    "jt_cpp_tutorial": {"title": "C++ Setup - JavaTpoint", "url": "https://www.javatpoint.com/cpp-tutorial", "type": "text"},
-    "w3_python_syntax": {"title": "Python Syntax - W3Schools", "url": "https://www.w3schools.com/python/python_syntax.asp", "type": "text"},
-    "programiz_cpp_basics": {"title": "C++ Basics - Programiz", "url": "https://www.programiz.com/cpp-programming", "type": "text"},
-    "w3_python_user_input": {"title": "Python I/O - W3Schools", "url": "https://www.w3schools.com/python/python_user_input.asp", "type": "text"},
-    "jt_cpp_io": {"title": "C++ I/O - JavaTpoint", "url": "https://www.javatpoint.com/cpp-basic-input-output", "type": "text"},
-    "w3_python_functions": {"title": "Python Functions - W3Schools", "url": "https://www.w3schools.com/python/python_functions.asp", "type": "text"},
-    "tutsp_cpp_functions": {"title": "C++ Functions - TutorialsPoint", "url": "https://www.tutorialspoint.com/cplusplus/cpp_functions.htm", "type": "text"},
-    "w3_python_lists": {"title": "Python Lists - W3Schools", "url": "https://www.w3schools.com/python/python_lists.asp", "type": "text"},
-    "programiz_cpp_arrays": {"title": "C++ Arrays - Programiz", "url": "https://www.programiz.com/cpp-programming/arrays", "type": "text"},
-    "w3_dsa_arrays": {"title": "Arrays - W3Schools", "url": "https://www.w3schools.com/dsa/dsa_arrays.php", "type": "text"},
-    "w3_python_strings": {"title": "Strings - W3Schools", "url": "https://www.w3schools.com/python/python_strings.asp", "type": "text"},
-    "jt_string_ds": {"title": "String DS - JavaTpoint", "url": "https://www.javatpoint.com/string-in-data-structure", "type": "text"},
-    "w3_ll": {"title": "Linked Lists - W3Schools", "url": "https://www.w3schools.com/dsa/dsa_data_linkedlists.php", "type": "text"},
-    "jt_singly_ll": {"title": "Singly LL - JavaTpoint", "url": "https://www.javatpoint.com/singly-linked-list", "type": "text"},
-    "programiz_ll": {"title": "LL Operations - Programiz", "url": "https://www.programiz.com/dsa/linked-list", "type": "text"},
-    "tutsp_ll_algos": {"title": "LL Algorithms - TutorialsPoint", "url": "https://www.tutorialspoint.com/data_structures_algorithms/linked_list_algorithms.htm", "type": "text"},
-    "w3_stacks": {"title": "Stacks - W3Schools", "url": "https://www.w3schools.com/dsa/dsa_data_stacks.php", "type": "text"},
-    "jt_stack": {"title": "Stack Tutorial - JavaTpoint", "url": "https://www.javatpoint.com/data-structure-stack", "type": "text"},
-    "programiz_stack": {"title": "Stack Applications - Programiz", "url": "https://www.programiz.com/dsa/stack", "type": "text"},
-    "tutsp_stack_algo": {"title": "Stack Algorithm - TutorialsPoint", "url": "https://www.tutorialspoint.com/data_structures_algorithms/stack_algorithm.htm", "type": "text"},
-    "w3_queues": {"title": "Queues - W3Schools", "url": "https://www.w3schools.com/dsa/dsa_data_queues.php", "type": "text"},
-    "jt_queue": {"title": "Queue - JavaTpoint", "url": "https://www.javatpoint.com/data-structure-queue", "type": "text"},
-    "w3_trees": {"title": "Trees - W3Schools", "url": "https://www.w3schools.com/dsa/dsa_data_trees.php", "type": "text"},
-    "jt_binary_tree": {"title": "Binary Trees - JavaTpoint", "url": "https://www.javatpoint.com/binary-tree", "type": "text"},
-    "programiz_tree_traversal": {"title": "Tree Traversal - Programiz", "url": "https://www.programiz.com/dsa/tree-traversal", "type": "text"},
-    "tutsp_tree_traversal": {"title": "Tree Traversal - TutorialsPoint", "url": "https://www.tutorialspoint.com/data_structures_algorithms/tree_traversal.htm", "type": "text"},
-    "w3_bfs": {"title": "BFS - W3Schools", "url": "https://www.w3schools.com/dsa/dsa_algo_graphs_bfs.php", "type": "text"},
-    "jt_tree_ds": {"title": "Tree DS - JavaTpoint", "url": "https://www.javatpoint.com/tree-data-structure", "type": "text"},
-    "programiz_binary_tree": {"title": "Binary Tree Ops - Programiz", "url": "https://www.programiz.com/dsa/binary-tree", "type": "text"},
-    "jt_doubly_ll": {"title": "Doubly LL - JavaTpoint", "url": "https://www.javatpoint.com/doubly-linked-list", "type": "text"},
-    "programiz_circular_ll": {"title": "Circular LL - Programiz", "url": "https://www.programiz.com/dsa/circular-linked-list", "type": "text"},
-    "programiz_two_pointers": {"title": "Two Pointers - Programiz", "url": "https://www.programiz.com/dsa/two-pointers-technique", "type": "text"},
-    "programiz_priority_queue": {"title": "Priority Queue - Programiz", "url": "https://www.programiz.com/dsa/priority-queue", "type": "text"},
-    "tutsp_sliding_window": {"title": "Sliding Window - TutorialsPoint", "url": "https://www.tutorialspoint.com/sliding-window-technique", "type": "text"},
-    "w3_dsa_exercises": {"title": "DSA Exercises - W3Schools", "url": "https://www.w3schools.com/dsa/dsa_exercises.php", "type": "practice"},
-    "w3_reverse_ll_examples": {"title": "Reverse LL Examples - W3Schools", "url": "https://www.w3schools.com/dsa/dsa_linkedlists_reverse.php", "type": "text"},
-    "w3_ll_exercises": {"title": "LL Exercises - W3Schools", "url": "https://www.w3schools.com/dsa/dsa_exercises_linkedlists.php", "type": "practice"},
-    "w3_stack_exercises": {"title": "Stack Exercises - W3Schools", "url": "https://www.w3schools.com/dsa/dsa_exercises_stacks.php", "type": "practice"},
-    "w3_tree_exercises": {"title": "Tree Exercises - W3Schools", "url": "https://www.w3schools.com/dsa/dsa_exercises_trees.php", "type": "practice"},
-
-    # Visualizations
-    "galles_array_vis": {"title": "Array Visualization", "url": "https://www.cs.usfca.edu/~galles/visualization/Array.html", "type": "interactive"},
-    "galles_bst": {"title": "BST Visualization", "url": "https://www.cs.usfca.edu/~galles/visualization/BST.html", "type": "interactive"},
-    "galles_heap": {"title": "Heap Visualization", "url": "https://www.cs.usfca.edu/~galles/visualization/Heap.html", "type": "interactive"},
-    "galles_open_hash": {"title": "Hash Table Visualization", "url": "https://www.cs.usfca.edu/~galles/visualization/OpenHash.html", "type": "interactive"},
-    "galles_dfs": {"title": "DFS Visualization", "url": "https://www.cs.usfca.edu/~galles/visualization/DFS.html", "type": "interactive"},
-    "galles_bfs": {"title": "BFS Visualization", "url": "https://www.cs.usfca.edu/~galles/visualization/BFS.html", "type": "interactive"},
-    "galles_dijkstra": {"title": "Dijkstra Visualization", "url": "https://www.cs.usfca.edu/~galles/visualization/Dijkstra.html", "type": "interactive"},
-    "galles_sorting": {"title": "Sorting Visualization", "url": "https://www.cs.usfca.edu/~galles/visualization/ComparisonSort.html", "type": "interactive"},
-    "galles_nqueens": {"title": "N-Queens Visualization", "url": "https://www.cs.usfca.edu/~galles/visualization/RecQueens.html", "type": "interactive"},
-    "galles_trie": {"title": "Trie Visualization", "url": "https://www.cs.usfca.edu/~galles/visualization/Trie.html", "type": "interactive"},
-    "visualgo_avl": {"title": "AVL Trees - VisuAlgo", "url": "https://visualgo.net/en/bst", "type": "interactive"},
-    "visualgo_sssp": {"title": "SSSP - VisuAlgo", "url": "https://visualgo.net/en/sssp", "type": "interactive"},
-    "visualgo_mst": {"title": "MST - VisuAlgo", "url": "https://visualgo.net/en/mst", "type": "interactive"},
-    "visualgo_sorting": {"title": "Sorting - VisuAlgo", "url": "https://visualgo.net/en/sorting", "type": "interactive"},
-    "visualgo_graphds": {"title": "Graph DS - VisuAlgo", "url": "https://visualgo.net/en/graphds", "type": "interactive"},
-    "visualgo_ufds": {"title": "Union-Find - VisuAlgo", "url": "https://visualgo.net/en/ufds", "type": "interactive"},
-
-    # Video Resources
-    "yt_neetcode_two_pointers": {"title": "Two Pointers - NeetCode", "url": "https://www.youtube.com/watch?v=jzZsG8n2R9A", "type": "video"},
-    "yt_abdul_bari_bst": {"title": "BST - Abdul Bari", "url": "https://www.youtube.com/watch?v=pYT9F8_LFTM", "type": "video"},
-    "yt_neetcode_validate_bst": {"title": "Validate BST - NeetCode", "url": "https://www.youtube.com/watch?v=s6ATEkipzow", "type": "video"},
-    "yt_abdul_bari_heap": {"title": "Heap - Abdul Bari", "url": "https://www.youtube.com/watch?v=HqPJF2L5h9U", "type": "video"},
-    "yt_csdojo_hash": {"title": "Hash Tables - CS Dojo", "url": "https://www.youtube.com/watch?v=shs0KM3wKv8", "type": "video"},
-    "yt_csdojo_graph_theory": {"title": "Graph Theory - CS Dojo", "url": "https://www.youtube.com/watch?v=gXgEDyodOJU", "type": "video"},
-    "yt_abdul_bari_dijkstra": {"title": "Dijkstra - Abdul Bari", "url": "https://www.youtube.com/watch?v=XB4MIexjvY0", "type": "video"},
-    "yt_mycodeschool_merge": {"title": "Merge Sort - mycodeschool", "url": "https://www.youtube.com/watch?v=JSceec-wEyw", "type": "video"},
-    "yt_neetcode_binary_search": {"title": "Binary Search - NeetCode", "url": "https://www.youtube.com/watch?v=s4DPM8ct1pI", "type": "video"},
-    "yt_csdojo_recursion": {"title": "Recursion - CS Dojo", "url": "https://www.youtube.com/watch?v=KEEKn7Me-ms", "type": "video"},
-    "yt_neetcode_backtracking": {"title": "Backtracking - NeetCode", "url": "https://www.youtube.com/watch?v=pfiQ_PS1g8E", "type": "video"},
-    "yt_neetcode_dp": {"title": "DP Fundamentals - NeetCode", "url": "https://www.youtube.com/watch?v=oBt53YbR9Kk", "type": "video"},
-    "yt_knapsack": {"title": "Knapsack Problem", "url": "https://www.youtube.com/watch?v=8LusJS5-AGo", "type": "video"},
-    "yt_bit_manip": {"title": "Bit Manipulation", "url": "https://www.youtube.com/watch?v=NLKQEOgBAnw", "type": "video"},
-
-    # GeeksforGeeks Resources
-    "gfg_sliding_window": {"title": "Sliding Window - GFG", "url": "https://www.geeksforgeeks.org/window-sliding-technique/", "type": "text"},
-    "gfg_reverse_ll": {"title": "Reverse LL - GFG", "url": "https://www.geeksforgeeks.org/reverse-a-linked-list/", "type": "text"},
-    "gfg_deque_intro": {"title": "Deque Introduction - GFG", "url": "https://www.geeksforgeeks.org/deque-set-1-introduction-applications/", "type": "text"},
-    "gfg_tree_traversals": {"title": "Tree Traversals - GFG", "url": "https://www.geeksforgeeks.org/tree-traversals-inorder-preorder-and-postorder/", "type": "text"},
-    "gfg_bst": {"title": "BST Operations - GFG", "url": "https://www.geeksforgeeks.org/binary-search-tree-data-structure/", "type": "text"},
-    "gfg_binary_heap": {"title": "Binary Heap - GFG", "url": "https://www.geeksforgeeks.org/binary-heap/", "type": "text"},
-    "gfg_hashing": {"title": "Hashing DS - GFG", "url": "https://www.geeksforgeeks.org/hashing-data-structure/", "type": "text"},
-    "gfg_rolling_hash": {"title": "Rolling Hash - GFG", "url": "https://www.geeksforgeeks.org/rolling-hash-to-find-lexicographically-smallest-substring/", "type": "text"},
-    "gfg_graph_apps": {"title": "Graph Applications - GFG", "url": "https://www.geeksforgeeks.org/applications-of-graph-data-structure/", "type": "text"},
-    "gfg_floyd_warshall": {"title": "Floyd-Warshall - GFG", "url": "https://www.geeksforgeeks.org/floyd-warshall-algorithm-dp-16/", "type": "text"},
-    "gfg_toposort": {"title": "Topological Sort - GFG", "url": "https://www.geeksforgeeks.org/topological-sorting/", "type": "text"},
-    "gfg_ternary_search": {"title": "Ternary Search - GFG", "url": "https://www.geeksforgeeks.org/ternary-search/", "type": "text"},
-    "gfg_lcs": {"title": "LCS - GFG", "url": "https://www.geeksforgeeks.org/longest-common-subsequence-dp-4/", "type": "text"},
-    "gfg_greedy": {"title": "Greedy Algorithms - GFG", "url": "https://www.geeksforgeeks.org/greedy-algorithms/", "type": "text"},
-
-    # LeetCode Problems
-    "lc_1_two_sum": {"title": "Two Sum - LeetCode", "url": "https://leetcode.com/problems/two-sum/", "type": "practice"},
-    "lc_206_reverse_ll": {"title": "Reverse LL - LeetCode", "url": "https://leetcode.com/problems/reverse-linked-list/", "type": "practice"},
-    "lc_20_valid_parentheses": {"title": "Valid Parentheses - LeetCode", "url": "https://leetcode.com/problems/valid-parentheses/", "type": "practice"},
-    "lc_104_max_depth": {"title": "Max Depth - LeetCode", "url": "https://leetcode.com/problems/maximum-depth-of-binary-tree/", "type": "practice"},
-    "lc_98_validate_bst": {"title": "Validate BST - LeetCode", "url": "https://leetcode.com/problems/validate-binary-search-tree/", "type": "practice"},
-    "lc_235_lca_bst": {"title": "LCA BST - LeetCode", "url": "https://leetcode.com/problems/lowest-common-ancestor-of-a-binary-search-tree/", "type": "practice"},
-    "lc_215_kth_largest": {"title": "Kth Largest - LeetCode", "url": "https://leetcode.com/problems/kth-largest-element-in-an-array/", "type": "practice"},
-    "lc_23_merge_k_sorted": {"title": "Merge K Lists - LeetCode", "url": "https://leetcode.com/problems/merge-k-sorted-lists/", "type": "practice"},
-    "lc_49_group_anagrams": {"title": "Group Anagrams - LeetCode", "url": "https://leetcode.com/problems/group-anagrams/", "type": "practice"},
-    "lc_200_islands": {"title": "Number of Islands - LeetCode", "url": "https://leetcode.com/problems/number-of-islands/", "type": "practice"},
-    "lc_133_clone_graph": {"title": "Clone Graph - LeetCode", "url": "https://leetcode.com/problems/clone-graph/", "type": "practice"},
-    "lc_78_subsets": {"title": "Subsets - LeetCode", "url": "https://leetcode.com/problems/subsets/", "type": "practice"},
-    "lc_46_permutations": {"title": "Permutations - LeetCode", "url": "https://leetcode.com/problems/permutations/", "type": "practice"},
-    "lc_300_lis": {"title": "LIS - LeetCode", "url": "https://leetcode.com/problems/longest-increasing-subsequence/", "type": "practice"},
-
-    # Other Resources
-    "python_heapq": {"title": "Python heapq", "url": "https://docs.python.org/3/library/heapq.html", "type": "text"},
-    "py_dict": {"title": "Python Dictionaries", "url": "https://docs.python.org/3/tutorial/datastructures.html#dictionaries", "type": "text"},
-    "pythontutor": {"title": "Python Tutor", "url": "http://pythontutor.com", "type": "interactive"},
-    "leetcode_dp_patterns": {"title": "DP Patterns", "url": "https://leetcode.com/discuss/general-discussion/458695/dynamic-programming-patterns", "type": "practice"},
-    "system_design_primer": {"title": "System Design Primer", "url": "https://github.com/donnemartin/system-design-primer", "type": "text"},
-}
+# Curriculum
+# The roadmap and resources live in data/curriculum.json. They are loaded and
+# indexed once at import; with gunicorn's preload_app the master does this
+# before forking, so workers share the parsed data (see gunicorn.conf.py).
+CURRICULUM_PATH = os.getenv('CURRICULUM_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'curriculum.json'))
+CURRICULUM_DAYS = ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday')
+RESOURCE_TYPES = ('text', 'video', 'interactive', 'practice')
 
-ROADMAP = [
-{
-"week": 1,
-"title": "Foundation & Environment",
-"goal": "Set up development environment and basic programming concepts",
-"project": {"title": "Scientific Calculator","description": "Build a calculator with basic and advanced operations","skills": ["Arrays", "Functions", "Error handling"]},
-"days": [
-{
-"day": "Monday","topic": "Environment Setup","activities": "Install Python/C++, Git, IDE setup","resources": ["w3_python_getstarted", "jt_cpp_tutorial"],"time_estimate": 120
-},
-{
-"day": "Tuesday","topic": "Basic Syntax","activities": "Variables, data types, operators","resources": ["w3_python_syntax", "programiz_cpp_basics"],"time_estimate": 90
-},
-{
-"day": "Wednesday","topic": "Input/Output","activities": "File I/O, console I/O, formatting","resources": ["w3_python_user_input", "jt_cpp_io"],"time_estimate": 90
-},
-{
-"day": "Thursday","topic": "Functions","activities": "Function definition, parameters, scope","resources": ["w3_python_functions", "tutsp_cpp_functions"],"time_estimate": 90
-},
-{
-"day": "Friday","topic": "Arrays/Lists Basics","activities": "Creation, indexing, basic operations","resources": ["w3_python_lists", "programiz_cpp_arrays"],"time_estimate": 90
-},
-{
-"day": "Saturday","topic": "Project Start: Scientific Calculator","activities": "Plan features, basic arithmetic","resources": [],"time_estimate": 180
-},
-{
-"day": "Sunday","topic": "Project Complete: Scientific Calculator","activities": "Advanced operations, error handling","resources": [],"time_estimate": 180
-}
-]
-},
-{
-"week": 2,
-"title": "Arrays & String Mastery",
-"goal": "Master array operations and string manipulation",
-"project": {
-"title": "Text Analyzer","description": "Build a text analysis tool with word frequency and pattern detection","skills": ["String processing", "Two pointers", "Sliding window"]
-},
-"days": [
-{
-"day": "Monday","topic": "Array Operations","activities": "Iteration, searching, basic algorithms","resources": ["w3_dsa_arrays", "galles_array_vis"],"time_estimate": 90
-},
-{
-"day": "Tuesday","topic": "Two Pointers Technique","activities": "Two Sum, reverse array, palindrome","resources": ["programiz_two_pointers", "yt_neetcode_two_pointers"],"time_estimate": 90
-},
-{
-"day": "Wednesday","topic": "String Processing","activities": "Manipulation, pattern matching basics","resources": ["w3_python_strings", "jt_string_ds"],"time_estimate": 90
-},
-{
-"day": "Thursday","topic": "Sliding Window","activities": "Maximum subarray, longest substring","resources": ["gfg_sliding_window", "tutsp_sliding_window"],"time_estimate": 90
-},
-{
-"day": "Friday","topic": "Key Problems","activities": "Two Sum, Longest Substring, Valid Palindrome","resources": ["w3_dsa_exercises", "lc_1_two_sum"],"time_estimate": 120
-},
-{
-"day": "Saturday","topic": "Project Start: Text Analyzer","activities": "Word count, frequency analysis","resources": [],"time_estimate": 180
-},
-{
-"day": "Sunday","topic": "Project Complete: Text Analyzer","activities": "Pattern detection, statistics","resources": [],"time_estimate": 180
-}]},
-{
-"week": 3,
-"title": "Linked Lists Deep Dive",
-"goal": "Master linked list operations and applications",
-"project": {
-"title": "Music Playlist Manager","description": "Implement a playlist system using linked lists","skills": ["Linked list operations", "Doubly linked lists", "Circular lists"]
-},
-"days": [
-{
-"day": "Monday","topic": "Linked List Basics","activities": "Node structure, traversal","resources": ["w3_ll", "jt_singly_ll"],"time_estimate": 90
-},
-{
-"day": "Tuesday","topic": "Singly Linked Lists","activities": "Insert, delete, search operations","resources": ["programiz_ll", "tutsp_ll_algos"],"time_estimate": 90
-},
-{
-"day": "Wednesday","topic": "Reverse & Manipulation","activities": "Reverse list, merge, cycle detection","resources": ["gfg_reverse_ll", "w3_reverse_ll_examples"],"time_estimate": 90
-},
-{
-"day": "Thursday","topic": "Doubly & Circular Lists","activities": "Advanced variations and use cases","resources": ["jt_doubly_ll", "programiz_circular_ll"],"time_estimate": 90
-},
-{
-"day": "Friday","topic": "Key Problems","activities": "Reverse, Merge Two Lists, Cycle Detection","resources": ["w3_ll_exercises", "lc_206_reverse_ll"],"time_estimate": 120
-},
-{
-"day": "Saturday","topic": "Project Start: Music Playlist Manager","activities": "Song management using linked lists","resources": [],"time_estimate": 180
-},
-{
-"day": "Sunday","topic": "Project Complete: Music Playlist Manager","activities": "Shuffle, repeat, playlist operations","resources": [],"time_estimate": 180
-}]},
-{
-"week": 4,
-"title": "Stacks & Queues Applications",
-"goal": "Understand LIFO/FIFO operations and real-world applications",
-"project": {
-"title": "Code Editor","description": "Build an editor with undo/redo and bracket matching","skills": ["Stack operations", "Expression evaluation", "Queue applications"]
-},
-"days": [
-{
-"day": "Monday","topic": "Stack Fundamentals","activities": "LIFO operations, implementation","resources": ["w3_stacks", "jt_stack"],"time_estimate": 90
-},
-{
-"day": "Tuesday","topic": "Stack Applications","activities": "Expression evaluation, parentheses matching","resources": ["programiz_stack", "tutsp_stack_algo"],"time_estimate": 90
-},
-{
-"day": "Wednesday","topic": "Queue Fundamentals","activities": "FIFO operations, circular queues","resources": ["w3_queues", "jt_queue"],"time_estimate": 90
-},
-{
-"day": "Thursday","topic": "Advanced Queues","activities": "Deque, priority queue introduction","resources": ["gfg_deque_intro", "programiz_priority_queue"],"time_estimate": 90
-},
-{
-"day": "Friday","topic": "Key Problems","activities": "Valid Parentheses, Min Stack","resources": ["w3_stack_exercises", "lc_20_valid_parentheses"],"time_estimate": 120
-},
-{
-"day": "Saturday","topic": "Project Start: Code Editor","activities": "Undo/redo functionality using stacks","resources": [],"time_estimate": 180
-},
-{
-"day": "Sunday","topic": "Project Complete: Code Editor","activities": "Bracket matching, syntax validation","resources": [],"time_estimate": 180
-} ] },
-{
-"week": 5,
-"title": "Binary Trees Foundation",
-"goal": "Master tree traversals and basic tree operations",
-"project": {
-"title": "Family Tree","description": "Create a genealogy tree with relationship queries","skills": ["Tree traversals", "DFS/BFS", "Tree properties"]
-},
-"days": [
-{
-"day": "Monday","topic": "Tree Basics","activities": "Terminology, node structure","resources": ["w3_trees", "jt_binary_tree"],"time_estimate": 90
-},
-{
-"day": "Tuesday","topic": "Tree Traversals (DFS)","activities": "Preorder, inorder, postorder","resources": ["programiz_tree_traversal", "gfg_tree_traversals"],"time_estimate": 90
-},
-{
-"day": "Wednesday","topic": "Level Order (BFS)","activities": "Breadth-first traversal using queues","resources": ["tutsp_tree_traversal", "w3_bfs"],"time_estimate": 90
-},
-{
-"day": "Thursday","topic": "Tree Properties","activities": "Height, depth, diameter calculations","resources": ["jt_tree_ds", "programiz_binary_tree"],"time_estimate": 90
-},
-{
-"day": "Friday","topic": "Key Problems","activities": "Max Depth, Same Tree, Symmetric Tree","resources": ["w3_tree_exercises", "lc_104_max_depth"],"time_estimate": 120
-},
-{
-"day": "Saturday","topic": "Project Start: Family Tree","activities": "Genealogy tree with traversals","resources": [],"time_estimate": 180
-},
-{
-"day": "Sunday","topic": "Project Complete: Family Tree","activities": "Relationship queries, tree visualization","resources": [],"time_estimate": 180
-}]},
-{
-"week": 6,
-"title": "Binary Search Trees",
-"goal": "Master BST operations and balanced tree concepts",
-"project": {
-"title": "Student Database","description": "BST-based student record management system","skills": ["BST operations", "Searching", "Tree balancing"]
-},
-"days": [
-{
-"day": "Monday","topic": "BST Properties","activities": "BST invariant, insertion, search","resources": ["galles_bst", "yt_abdul_bari_bst"],"time_estimate": 90
-},
-{
-"day": "Tuesday","topic": "BST Operations","activities": "Insert, delete, find operations","resources": ["gfg_bst"],"time_estimate": 90
-},
-{
-"day": "Wednesday","topic": "BST Validation","activities": "Validate BST, range checking","resources": ["yt_neetcode_validate_bst"],"time_estimate": 90
-},
-{
-"day": "Thursday","topic": "Balanced Trees","activities": "AVL introduction, rotation concepts","resources": ["visualgo_avl"],"time_estimate": 90
-},
-{
-"day": "Friday","topic": "Key Problems","activities": "Validate BST, Lowest Common Ancestor","resources": ["lc_98_validate_bst", "lc_235_lca_bst"],"time_estimate": 120
-},
-{
-"day": "Saturday","topic": "Project Start: Student Database","activities": "BST-based student record system","resources": [],"time_estimate": 180
-},
-{
-"day": "Sunday","topic": "Project Complete: Student Database","activities": "Search, grade analysis, reporting","resources": [],"time_estimate": 180
-}
-]
-},
-{
-"week": 7,
-"title": "Heaps & Priority Queues",
-"goal": "Master heap operations and priority-based algorithms",
-"project": {
-"title": "Task Scheduler","description": "Priority-based task management system","skills": ["Heap operations", "Priority queues", "Top-K problems"]
-},
-"days": [
-{
-"day": "Monday","topic": "Heap Fundamentals","activities": "Min/max heap properties, heapify","resources": ["galles_heap", "yt_abdul_bari_heap"],"time_estimate": 90
-},
-{
-"day": "Tuesday","topic": "Heap Operations","activities": "Insert, extract, build heap","resources": ["gfg_binary_heap"],"time_estimate": 90
-},
-{
-"day": "Wednesday","topic": "Priority Queue","activities": "Implementation using heaps","resources": ["python_heapq"],"time_estimate": 90
-},
-{
-"day": "Thursday","topic": "Heap Applications","activities": "Top K elements, median finding","resources": ["lc_215_kth_largest"],"time_estimate": 90
-},
-{
-"day": "Friday","topic": "Key Problems","activities": "Kth Largest, Merge K Lists","resources": ["lc_215_kth_largest", "lc_23_merge_k_sorted"],"time_estimate": 120
-},
-{
-"day": "Saturday","topic": "Project Start: Task Scheduler","activities": "Priority-based task management","resources": [],"time_estimate": 180
-},
-{
-"day": "Sunday","topic": "Project Complete: Task Scheduler","activities": "Deadline handling, priority queues","resources": [],"time_estimate": 180
-}
-]
-},
-{
-"week": 8,
-"title": "Hashing & Hash Tables",
-"goal": "Master hash-based data structures and fast lookups",
-"project": {
-"title": "Spell Checker","description": "Hash-based dictionary with word suggestions","skills": ["Hash functions", "Collision handling", "String matching"]
-},
-"days": [
-{
-"day": "Monday","topic": "Hashing Basics","activities": "Hash functions, collision handling","resources": ["galles_open_hash", "yt_csdojo_hash"],"time_estimate": 90
-},
-{
-"day": "Tuesday","topic": "Hash Table Operations","activities": "Insert, search, delete with collisions","resources": ["gfg_hashing"],"time_estimate": 90
-},
-{
-"day": "Wednesday","topic": "Hash Applications","activities": "Frequency counting, duplicate detection","resources": ["py_dict"],"time_estimate": 90
-},
-{
-"day": "Thursday","topic": "Advanced Hashing","activities": "Rolling hash, perfect hashing","resources": ["gfg_rolling_hash"],"time_estimate": 90
-},
-{
-"day": "Friday","topic": "Key Problems","activities": "Two Sum, Group Anagrams, Valid Anagram","resources": ["lc_1_two_sum", "lc_49_group_anagrams"],"time_estimate": 120
-},
-{
-"day": "Saturday","topic": "Project Start: Spell Checker","activities": "Hash-based dictionary and suggestions","resources": [],"time_estimate": 180
-},
-{
-"day": "Sunday","topic": "Project Complete: Spell Checker","activities": "Edit distance, word suggestions","resources": [],"time_estimate": 180
-}
-]
-},
-{
-"week": 9,
-"title": "Graph Fundamentals",
-"goal": "Master graph representations and basic algorithms",
-"project": {
-"title": "Social Network","description": "Friend connections and suggestions system","skills": ["Graph traversals", "BFS/DFS", "Connected components"]
-},
-"days": [
-{
-"day": "Monday","topic": "Graph Basics","activities": "Representation, adjacency list/matrix","resources": ["visualgo_graphds", "yt_csdojo_graph_theory"],"time_estimate": 90
-},
-{
-"day": "Tuesday","topic": "DFS Implementation","activities": "Depth-first search, applications","resources": ["galles_dfs"],"time_estimate": 90
-},
-{
-"day": "Wednesday","topic": "BFS Implementation","activities": "Breadth-first search, shortest path","resources": ["galles_bfs"],"time_estimate": 90
-},
-{
-"day": "Thursday","topic": "Graph Applications","activities": "Connected components, cycle detection","resources": ["gfg_graph_apps"],"time_estimate": 90
-},
-{
-"day": "Friday","topic": "Key Problems","activities": "Number of Islands, Clone Graph","resources": ["lc_200_islands", "lc_133_clone_graph"],"time_estimate": 120
-},
-{
-"day": "Saturday","topic": "Project Start: Social Network","activities": "Friend connections using graphs","resources": [],"time_estimate": 180
-},
-{
-"day": "Sunday","topic": "Project Complete: Social Network","activities": "Friend suggestions, mutual connections","resources": [],"time_estimate": 180
-}
-]
-},
-{
-"week": 10,
-"title": "Advanced Graph Algorithms",
-"goal": "Master shortest path and advanced graph algorithms",
-"project": {"title": "GPS Navigation","description": "Route finding and optimization system","skills": ["Dijkstra", "A*", "MST algorithms"]
-},
-"days": [
-{
-"day": "Monday","topic": "Dijkstra's Algorithm","activities": "Shortest path in weighted graphs","resources": ["galles_dijkstra", "yt_abdul_bari_dijkstra"],"time_estimate": 90
-},
-{
-"day": "Tuesday","topic": "Bellman-Ford","activities": "Negative weight handling","resources": ["visualgo_sssp"],"time_estimate": 90
-},
-{
-"day": "Wednesday","topic": "Floyd-Warshall","activities": "All-pairs shortest path","resources": ["gfg_floyd_warshall"],"time_estimate": 90
-},
-{
-"day": "Thursday","topic": "MST Algorithms","activities": "Kruskal's and Prim's algorithms","resources": ["visualgo_mst"],"time_estimate": 90
-},
-{
-"day": "Friday","topic": "Topological Sort","activities": "Ordering in DAGs","resources": ["gfg_toposort"],"time_estimate": 90
-},
-{
-"day": "Saturday","topic": "Project Start: GPS Navigation","activities": "Shortest path finder","resources": [],"time_estimate": 180
-},
-{
-"day": "Sunday","topic": "Project Complete: GPS Navigation","activities": "Route optimization, traffic handling","resources": [],"time_estimate": 180
-}]},
-{
-"week": 11,
-"title": "Sorting & Searching Mastery",
-"goal": "Master all major sorting algorithms and binary search variations",
-"project": {
-"title": "Movie Database","description": "Efficient sorting and searching system","skills": ["Sorting algorithms", "Binary search", "Quick select"]
-},
-"days": [
-{
-"day": "Monday","topic": "Basic Sorting","activities": "Bubble, selection, insertion sort","resources": ["galles_sorting"],"time_estimate": 90
-},
-{
-"day": "Tuesday","topic": "Merge Sort","activities": "Divide and conquer approach","resources": ["yt_mycodeschool_merge"],"time_estimate": 90
-},
-{
-"day": "Wednesday","topic": "Quick Sort","activities": "Partitioning and optimization","resources": ["visualgo_sorting"],"time_estimate": 90
-},
-{
-"day": "Thursday","topic": "Binary Search","activities": "Search variations, bounds","resources": ["yt_neetcode_binary_search"],"time_estimate": 90
-},
-{
-"day": "Friday","topic": "Advanced Searching","activities": "Ternary search, exponential search","resources": ["gfg_ternary_search"],"time_estimate": 90
-},
-{
-"day": "Saturday","topic": "Project Start: Movie Database","activities": "Sorting and searching optimization","resources": [],"time_estimate": 180
-},
-{
-"day": "Sunday","topic": "Project Complete: Movie Database","activities": "Multi-criteria sorting, fast queries","resources": [],"time_estimate": 180
-}]},
-{
-"week": 12,
-"title": "Recursion & Backtracking",
-"goal": "Master recursive problem-solving and backtracking patterns",
-"project": {"title": "Sudoku Solver","description": "Interactive puzzle solver with hints","skills": ["Recursion", "Backtracking", "Constraint solving"]},
-"days": [
-{
-"day": "Monday","topic": "Recursion Basics","activities": "Base cases, recursive thinking","resources": ["yt_csdojo_recursion"],"time_estimate": 90
-},
-{
-"day": "Tuesday","topic": "Recursive Patterns","activities": "Tree recursion, memoization","resources": ["pythontutor"],"time_estimate": 90
-},
-{
-"day": "Wednesday","topic": "Backtracking Intro","activities": "Template, decision trees","resources": ["yt_neetcode_backtracking"],"time_estimate": 90
-},
-{
-"day": "Thursday","topic": "Classic Problems","activities": "N-Queens, Sudoku solver","resources": ["galles_nqueens"],"time_estimate": 90
-},
-{
-"day": "Friday","topic": "More Backtracking","activities": "Subsets, permutations, combinations","resources": ["lc_78_subsets", "lc_46_permutations"],"time_estimate": 120
-},
-{
-"day": "Saturday","topic": "Project Start: Sudoku Solver","activities": "Interactive puzzle solver","resources": [],"time_estimate": 180
-},
-{
-"day": "Sunday","topic": "Project Complete: Sudoku Solver","activities": "Validation, hints, difficulty levels","resources": [],"time_estimate": 180
-}]},
-{
-"week": 13,
-"title": "Dynamic Programming",
-"goal": "Master DP patterns and optimization problems",
-"project": {
-"title": "Investment Calculator","description": "Financial optimization using DP","skills": ["DP patterns", "Optimization", "Memoization"]},
-"days": [
-{
-"day": "Monday","topic": "DP Fundamentals","activities": "Memoization vs tabulation","resources": ["yt_neetcode_dp"],"time_estimate": 90
-},
-{
-"day": "Tuesday","topic": "Classic DP","activities": "Fibonacci, climbing stairs, coin change","resources": ["leetcode_dp_patterns"],"time_estimate": 90
-},
-{
-"day": "Wednesday","topic": "String DP","activities": "LCS, edit distance, palindromes","resources": ["gfg_lcs"],"time_estimate": 90
-},
-{
-"day": "Thursday","topic": "Knapsack Problems","activities": "0/1 and unbounded knapsack","resources": ["yt_knapsack"],"time_estimate": 90
-},
-{
-"day": "Friday","topic": "Advanced DP","activities": "LIS, maximum subarray, matrix chain","resources": ["lc_300_lis"],"time_estimate": 120
-},
-{
-"day": "Saturday","topic": "Project Start: Investment Calculator","activities": "DP-based financial optimization","resources": [],"time_estimate": 180
-},
-{
-"day": "Sunday","topic": "Project Complete: Investment Calculator","activities": "Portfolio optimization, risk analysis","resources": [],"time_estimate": 180
-}]},
-{
-"week": 14,"title": "Advanced Topics & System Design","goal": "Integrate all concepts into a comprehensive system",
-"project": {"title": "File Compressor & Mini Database","description": "Apply multiple DSA concepts in real systems","skills": ["System design", "Algorithm selection", "Optimization"]},
-"days": [
-{
-"day": "Monday","topic": "Greedy Algorithms","activities": "Activity selection, Huffman coding","resources": ["gfg_greedy"],"time_estimate": 90
-},
-{
-"day": "Tuesday","topic": "Bit Manipulation","activities": "Bitwise operations, bit tricks","resources": ["yt_bit_manip"],"time_estimate": 90
-},
-{
-"day": "Wednesday", "topic": "Trie Data Structure","activities": "Prefix trees, autocomplete","resources": ["galles_trie"],"time_estimate": 90
-},
-{
-"day": "Thursday","topic": "Union-Find","activities": "Disjoint set operations","resources": ["visualgo_ufds"],"time_estimate": 90
-},
-{
-"day": "Friday","topic": "System Design Prep","activities": "Scalability, data structure choices","resources": ["system_design_primer"],"time_estimate": 90
-},
-{
-"day": "Saturday","topic": "Project Start: File Compressor","activities": "Huffman coding implementation","resources": [], "time_estimate": 180
-},
-{
-"day": "Sunday","topic": "Final Project: Mini Database","activities": "Complete system with all DSA concepts","resources": [],"time_estimate": 180
-}
-]
-}
-]
+class CurriculumError(ValueError):
+    pass
+
+def validate_curriculum(data):
+    errors = []
+    if not isinstance(data.get('version'), int):
+        errors.append("version must be an integer")
+    resources = data.get('resources')
+    roadmap = data.get('roadmap')
+    if not isinstance(resources, dict) or not isinstance(roadmap, list):
+        return errors + ["resources must be an object and roadmap a list"]
+    
+    for resource_id, resource in resources.items():
+        for field in ('title', 'url', 'type'):
+            if not resource.get(field):
+                errors.append(f"resource {resource_id}: missing {field}")
+        if resource.get('type') not in RESOURCE_TYPES:
+            errors.append(f"resource {resource_id}: unknown type {resource.get('type')!r}")
+    
+    seen_weeks = set()
+    for week in roadmap:
+        number = week.get('week')
+        if not isinstance(number, int):
+            errors.append(f"week {number!r}: week must be an integer")
+        elif number in seen_weeks:
+            errors.append(f"week {number}: duplicate week")
+        seen_weeks.add(number)
+        for field in ('title', 'goal', 'days'):
+            if not week.get(field):
+                errors.append(f"week {number}: missing {field}")
+        
+        seen_days = set()
+        for day in week.get('days') or []:
+            name = day.get('day')
+            if name not in CURRICULUM_DAYS:
+                errors.append(f"week {number}: unknown day {name!r}")
+            elif name in seen_days:
+                errors.append(f"week {number}: duplicate day {name}")
+            seen_days.add(name)
+            if not isinstance(day.get('time_estimate'), int) or day['time_estimate'] < 0:
+                errors.append(f"week {number} {name}: time_estimate must be a non-negative integer")
+            for resource_id in day.get('resources', []):
+                if resource_id not in resources:
+                    errors.append(f"week {number} {name}: unknown resource {resource_id}")
+    return errors
+
+class Curriculum:
+    def __init__(self, data):
+        self.version = data['version']
+        self.resources = data['resources']
+        self.roadmap = sorted(data['roadmap'], key=lambda week: week['week'])
+        
+        self.weeks = {week['week']: week for week in self.roadmap}
+        self.days = {(week['week'], day['day']): day for week in self.roadmap for day in week['days']}
+        self.resource_days = defaultdict(list)
+        for (week_number, day_name), day in self.days.items():
+            for resource_id in day.get('resources', []):
+                self.resource_days[resource_id].append((week_number, day_name))
+        self.resources_by_type = defaultdict(dict)
+        for resource_id, resource in self.resources.items():
+            self.resources_by_type[resource['type']][resource_id] = resource
+        self.week_totals = {week['week']: {
+            "days": len(week['days']),
+            "time_estimate": sum(day['time_estimate'] for day in week['days'])
+        } for week in self.roadmap}
+        self.total_days = sum(totals['days'] for totals in self.week_totals.values())
+
+def load_curriculum(path=CURRICULUM_PATH):
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    errors = validate_curriculum(data)
+    if errors:
+        raise CurriculumError(f"{path}: " + "; ".join(errors))
+    return Curriculum(data)
+
+CURRICULUM = load_curriculum()
+RESOURCES = CURRICULUM.resources
+ROADMAP = CURRICULUM.roadmap
 
 # Database Models
 class User(db.Model):
     id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     email = db.Column(db.String(120), unique=True, nullable=False)
-    password_hash = db.Column(db.String(128), nullable=False)
+    password_hash = db.Column(db.String(255), nullable=False)
     name = db.Column(db.String(100), nullable=False)
     avatar_url = db.Column(db.String(255))
     is_verified = db.Column(db.Boolean, default=False)
@@ -608,82 +327,3128 @@ class User(db.Model):
     longest_streak = db.Column(db.Integer, default=0)
     total_study_time = db.Column(db.Integer, default=0)
     last_streak_date = db.Column(db.Date)
+    change_seq = db.Column(db.Integer, default=0, nullable=False)
+    unread_notifications = db.Column(db.Integer, default=0, nullable=False)
+    calendar_token = db.Column(db.String(64), unique=True)
+    # Bumped by every write to the user's data; personal GET endpoints derive their ETag from it
+    data_version = db.Column(db.Integer, default=0, nullable=False)
+    deleted_at = db.Column(db.DateTime)
 
 class PasswordReset(db.Model):
     id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    user_id = db.Column(db.String(36), db.ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.String(36), db.ForeignKey('user.id'), nullable=False, index=True)
     token = db.Column(db.String(255), unique=True, nullable=False)
     expires_at = db.Column(db.DateTime, nullable=False)
     used = db.Column(db.Boolean, default=False)
 
 class UserSession(db.Model):
     id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    user_id = db.Column(db.String(36), db.ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.String(36), db.ForeignKey('user.id'), nullable=False, index=True)
     device_info = db.Column(db.String(255))
     ip_address = db.Column(db.String(45))
     login_time = db.Column(db.DateTime, default=datetime.utcnow)
     last_activity = db.Column(db.DateTime, default=datetime.utcnow)
     is_active = db.Column(db.Boolean, default=True)
 
-class Notification(db.Model):
-    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    user_id = db.Column(db.String(36), db.ForeignKey('user.id'), nullable=False)
-    title = db.Column(db.String(200), nullable=False)
-    message = db.Column(db.Text)
-    type = db.Column(db.String(50), default='info')
-    is_read = db.Column(db.Boolean, default=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+class Notification(db.Model):
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    user_id = db.Column(db.String(36), db.ForeignKey('user.id'), nullable=False)
+    title = db.Column(db.String(200), nullable=False)
+    message = db.Column(db.Text)
+    type = db.Column(db.String(50), default='info')
+    is_read = db.Column(db.Boolean, default=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    dedupe_key = db.Column(db.String(100))
+    
+    __table_args__ = (
+        db.Index('ix_notification_user_created', 'user_id', 'created_at'),
+        db.Index('uq_notification_user_dedupe', 'user_id', 'dedupe_key', unique=True),
+    )
+
+class UserPreferences(db.Model):
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    user_id = db.Column(db.String(36), db.ForeignKey('user.id'), unique=True, nullable=False)
+    theme = db.Column(db.String(20), default='light')
+    layout = db.Column(db.String(20), default='default')
+    notifications_enabled = db.Column(db.Boolean, default=True)
+    email_notifications = db.Column(db.Boolean, default=True)
+    accessibility_mode = db.Column(db.Boolean, default=False)
+    language = db.Column(db.String(10), default='en')
+    timezone = db.Column(db.String(64), default='UTC')
+
+class Progress(db.Model):
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    user_id = db.Column(db.String(36), db.ForeignKey('user.id'), nullable=False)
+    week = db.Column(db.Integer, nullable=False)
+    day = db.Column(db.String(20), nullable=False)
+    completed = db.Column(db.Boolean, default=False)
+    completion_date = db.Column(db.DateTime)
+    time_spent = db.Column(db.Integer, default=0)
+    notes = db.Column(db.Text)
+    
+    __table_args__ = (db.UniqueConstraint('user_id', 'week', 'day', name='uq_progress_user_week_day'),)
+
+class PomodoroSession(db.Model):
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    user_id = db.Column(db.String(36), db.ForeignKey('user.id'), nullable=False)
+    # Part of the table's key where PostgreSQL partitions the table on it
+    start_time = db.Column(db.DateTime, primary_key=PARTITIONED_STORAGE, nullable=False)
+    end_time = db.Column(db.DateTime)
+    duration = db.Column(db.Integer, nullable=False)
+    completed = db.Column(db.Boolean, default=False)
+    topic = db.Column(db.String(200))
+    session_type = db.Column(db.String(20), default='study')
+    
+    __table_args__ = (
+        db.Index('ix_pomodoro_session_user_start', 'user_id', 'start_time'),
+        {"postgresql_partition_by": "RANGE (start_time)"},
+    )
+    # Rows are still identified by id alone, whatever the table's key
+    __mapper_args__ = {"primary_key": [id]}
+
+COMPRESSED_TEXT_MARKER = '\x1fz:'
+
+class CompressedText(db.TypeDecorator):
+    impl = db.Text
+    cache_ok = True
+    
+    def process_bind_param(self, value, dialect):
+        if value is None or (len(value) < NOTE_COMPRESSION_THRESHOLD and not value.startswith(COMPRESSED_TEXT_MARKER)):
+            return value
+        compressed = COMPRESSED_TEXT_MARKER + base64.b64encode(zlib.compress(value.encode('utf-8'))).decode('ascii')
+        # Text that starts with the marker must always be wrapped to round-trip
+        if len(compressed) >= len(value) and not value.startswith(COMPRESSED_TEXT_MARKER):
+            return value
+        return compressed
+    
+    def process_result_value(self, value, dialect):
+        if value and value.startswith(COMPRESSED_TEXT_MARKER):
+            return zlib.decompress(base64.b64decode(value[len(COMPRESSED_TEXT_MARKER):])).decode('utf-8')
+        return value
+    
+    def coerce_compared_value(self, op, value):
+        # LIKE patterns and other comparisons are bound as plain text
+        return db.Text()
+
+class Note(db.Model):
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    user_id = db.Column(db.String(36), db.ForeignKey('user.id'), nullable=False, index=True)
+    title = db.Column(db.String(200), nullable=False)
+    content = db.Column(CompressedText)
+    snippet = db.Column(db.String(NOTE_SNIPPET_LENGTH + 3))
+    # Distinct words of bodies large enough to be stored compressed, for search
+    search_text = db.deferred(db.Column(db.Text))
+    tags = db.Column(db.String(500))
+    week = db.Column(db.Integer)
+    day = db.Column(db.String(20))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    version = db.Column(db.Integer, default=1, nullable=False)
+    
+    # Every ORM UPDATE bumps version and is conditional on the old value
+    __mapper_args__ = {"version_id_col": version}
+
+class AIConversation(db.Model):
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    user_id = db.Column(db.String(36), db.ForeignKey('user.id'), nullable=False, index=True)
+    question = db.Column(db.Text, nullable=False)
+    answer = db.Column(db.Text, nullable=False)
+    citations = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, primary_key=PARTITIONED_STORAGE, default=datetime.utcnow)
+    
+    __table_args__ = ({"postgresql_partition_by": "RANGE (created_at)"},)
+    __mapper_args__ = {"primary_key": [id]}
+
+# Cache Backends
+class MemoryCache:
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES):
+        self._data = {}
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            return value
+    
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            if key not in self._data and len(self._data) >= self._max_entries:
+                self._evict()
+            self._data[key] = (value, expires_at)
+    
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+    
+    def _evict(self):
+        now = time.monotonic()
+        expired = [k for k, (_, expires_at) in self._data.items() if expires_at is not None and expires_at < now]
+        for key in expired:
+            del self._data[key]
+        # Still full: drop the oldest insertions
+        while len(self._data) >= self._max_entries:
+            del self._data[next(iter(self._data))]
+
+class RedisCache:
+    def __init__(self, url):
+        import redis
+        self._client = redis.Redis.from_url(url)
+        self._client.ping()
+    
+    def get(self, key):
+        value = self._client.get(key)
+        return json.loads(value) if value is not None else None
+    
+    def set(self, key, value, ttl=None):
+        self._client.set(key, json.dumps(value), ex=int(ttl) if ttl else None)
+    
+    def delete(self, *keys):
+        if keys:
+            self._client.delete(*keys)
+
+def create_cache():
+    if REDIS_URL:
+        try:
+            return RedisCache(REDIS_URL)
+        except Exception as e:
+            print(f"Redis cache unavailable, using in-memory cache: {e}")
+    return MemoryCache()
+
+cache = create_cache()
+
+# Entity Cache
+# Sits behind the session's identity map: a row already loaded in this session
+# is always returned as that same object, the cache is only consulted before
+# the session has seen the row, and only by GET and HEAD requests; anything
+# that may write loads the current row. Bulk updates that cannot name the rows
+# they touch bump the generation, which is part of every key.
+CACHED_ENTITIES = {User: 'id', UserPreferences: 'user_id'}
+ENTITY_CACHE_GENERATION_KEY = 'entity:generation'
+# Never written to the shared cache; loaded from the database when accessed
+ENTITY_CACHE_EXCLUDED_COLUMNS = {'password_hash', 'calendar_token'}
+ENTITY_CACHE_TOMBSTONE = {"_tombstone": True}
+# An in-memory cache cannot see invalidations made by other workers, so rows
+# are only cached when the cache is shared
+ENTITY_CACHE_ENABLED = isinstance(cache, RedisCache)
+
+def entity_cache_generation():
+    if has_request_context() and 'entity_cache_generation' in g:
+        return g.entity_cache_generation
+    generation = cache.get(ENTITY_CACHE_GENERATION_KEY)
+    if generation is None:
+        # Random rather than a counter, so an evicted generation can never come back
+        generation = uuid.uuid4().hex[:12]
+        cache.set(ENTITY_CACHE_GENERATION_KEY, generation)
+    if has_request_context():
+        g.entity_cache_generation = generation
+    return generation
+
+def bump_entity_cache_generation():
+    cache.set(ENTITY_CACHE_GENERATION_KEY, uuid.uuid4().hex[:12])
+
+def entity_cache_key(model, value):
+    return f"entity:{model.__tablename__}:{entity_cache_generation()}:{value}"
+
+def dump_entity(obj):
+    data = {}
+    for column in obj.__table__.columns:
+        if column.key in ENTITY_CACHE_EXCLUDED_COLUMNS:
+            continue
+        value = getattr(obj, column.key)
+        data[column.key] = value.isoformat() if isinstance(value, (datetime, date)) else value
+    return data
+
+def load_entity(model, data):
+    values = {}
+    for column in model.__table__.columns:
+        if column.key not in data:
+            continue
+        value = data[column.key]
+        if value is not None and isinstance(column.type, db.DateTime):
+            value = datetime.fromisoformat(value)
+        elif value is not None and isinstance(column.type, db.Date):
+            value = date.fromisoformat(value)
+        values[column.key] = value
+    obj = model(**values)
+    make_transient_to_detached(obj)
+    # load=False attaches the object as persistent and unmodified without a query
+    return db.session.merge(obj, load=False)
+
+def cached_entity(model, value):
+    column = CACHED_ENTITIES[model]
+    for obj in db.session.identity_map.values():
+        if type(obj) is model and getattr(obj, column) == value:
+            return obj
+    
+    query = model.query.filter(getattr(model, column) == value)
+    if not ENTITY_CACHE_ENABLED or not has_request_context() or request.method not in ('GET', 'HEAD'):
+        # A cached copy must never be the base of a write
+        return query.first()
+    
+    key = entity_cache_key(model, value)
+    data = cache.get(key)
+    if data is not None and data != ENTITY_CACHE_TOMBSTONE:
+        # The response's ETag names the version read from the database; a
+        # cached row older than that must not be served under it
+        etag_version = g.get('user_data_version')
+        if model is not User or etag_version is None or etag_version[0] != value or data.get('data_version') == etag_version[1]:
+            return load_entity(model, data)
+        return query.first()
+    
+    obj = query.first()
+    # A tombstone set while the row was loading means this copy may predate it
+    if obj is not None and data is None and cache.get(key) is None:
+        cache.set(key, dump_entity(obj), ttl=ENTITY_CACHE_TTL)
+    return obj
+
+@event.listens_for(db.session, 'after_flush')
+def forget_flushed_entities(session, flush_context):
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        column = CACHED_ENTITIES.get(type(obj))
+        if column:
+            forget_cached_entities(type(obj), [getattr(obj, column)])
+
+def get_user(user_id):
+    return cached_entity(User, user_id)
+
+def get_preferences(user_id):
+    return cached_entity(UserPreferences, user_id)
+
+def forget_cached_entities(model, values):
+    values = list(values)
+    if not values or not ENTITY_CACHE_ENABLED:
+        return
+    
+    def forget():
+        # A tombstone rather than a delete, so reads still holding the old
+        # row do not put it back
+        for value in values:
+            cache.set(entity_cache_key(model, value), ENTITY_CACHE_TOMBSTONE, ttl=ENTITY_CACHE_TOMBSTONE_TTL)
+    after_commit(forget)
+
+# Pub/Sub Backends
+# Used to fan notifications out to open SSE streams. The in-process backend
+# only reaches streams held by the same worker; multi-worker deployments point
+# REDIS_URL at Redis, or locally at the stand-in below.
+class Subscription:
+    def __init__(self, pubsub, channel):
+        self._pubsub = pubsub
+        self.channel = channel
+        self.messages = queue.Queue(maxsize=100)
+    
+    def get(self, timeout=None):
+        try:
+            return self.messages.get(timeout=timeout)
+        except queue.Empty:
+            return None
+    
+    def close(self):
+        self._pubsub.unsubscribe(self)
+
+class LocalPubSub:
+    def __init__(self):
+        self._subscriptions = defaultdict(set)
+        self._lock = threading.Lock()
+    
+    def publish(self, channel, message):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(channel, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.messages.put_nowait(message)
+            except queue.Full:
+                # A stalled client must not block publishers; it will resync on reconnect
+                pass
+    
+    def subscribe(self, channel):
+        subscription = Subscription(self, channel)
+        with self._lock:
+            self._subscriptions[channel].add(subscription)
+        return subscription
+    
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.channel)
+            if subscriptions:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.channel]
+
+class RedisSubscription:
+    def __init__(self, client, channel):
+        self.channel = channel
+        self._pubsub = client.pubsub(ignore_subscribe_messages=True)
+        self._pubsub.subscribe(channel)
+    
+    def get(self, timeout=None):
+        message = self._pubsub.get_message(timeout=timeout)
+        return json.loads(message['data']) if message else None
+    
+    def close(self):
+        self._pubsub.close()
+
+class RedisPubSub:
+    def __init__(self, url):
+        import redis
+        self._client = redis.Redis.from_url(url)
+        self._client.ping()
+    
+    def publish(self, channel, message):
+        self._client.publish(channel, json.dumps(message))
+    
+    def subscribe(self, channel):
+        return RedisSubscription(self._client, channel)
+
+def create_pubsub():
+    if REDIS_URL:
+        try:
+            return RedisPubSub(REDIS_URL)
+        except Exception as e:
+            print(f"Redis pub/sub unavailable, using in-process pub/sub: {e}")
+    return LocalPubSub()
+
+pubsub = create_pubsub()
+
+# Redis-Protocol Stand-in
+# Speaks the part of the Redis protocol RedisCache and RedisPubSub use (PING,
+# GET, SET with EX, DEL, PUBLISH, SUBSCRIBE), so several local workers can
+# share a cache and notification streams without installing Redis:
+#   flask --app app redis-standin --port 6379
+#   REDIS_URL=redis://localhost:6379 gunicorn app:app
+# Everything is held in memory and lost when it stops; production uses Redis.
+class RedisStandInServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    
+    def __init__(self, address):
+        super().__init__(address, RedisStandInHandler)
+        self.data = MemoryCache()
+        self.subscribers = defaultdict(set)
+        self.subscribers_lock = threading.Lock()
+    
+    def publish(self, channel, message):
+        with self.subscribers_lock:
+            handlers = list(self.subscribers.get(channel, ()))
+        for handler in handlers:
+            handler.send([b'message', channel, message], push=True)
+        return len(handlers)
+
+class RedisStandInHandler(socketserver.StreamRequestHandler):
+    def setup(self):
+        super().setup()
+        self.channels = set()
+        self.write_lock = threading.Lock()
+        # Switched to 3 by HELLO, as recent redis-py clients do on connect
+        self.protocol = 2
+    
+    def read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        if not line.startswith(b'*'):
+            # Inline command, as typed into telnet
+            return line.split()
+        args = []
+        for _ in range(int(line[1:])):
+            length = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+    
+    def encode(self, value, push=False):
+        if value is None:
+            return b'_\r\n' if self.protocol == 3 else b'$-1\r\n'
+        if isinstance(value, int):
+            return b':%d\r\n' % value
+        if isinstance(value, dict):
+            items = [item for pair in value.items() for item in pair]
+            if self.protocol == 3:
+                return b'%%%d\r\n' % len(value) + b''.join(self.encode(item) for item in items)
+            value = items
+        if isinstance(value, list):
+            # Out-of-band pub/sub messages are pushes in RESP3
+            prefix = b'>' if push and self.protocol == 3 else b'*'
+            return prefix + b'%d\r\n' % len(value) + b''.join(self.encode(item) for item in value)
+        return b'$%d\r\n%s\r\n' % (len(value), value)
+    
+    def send(self, value, raw=False, push=False):
+        with self.write_lock:
+            self.wfile.write(value if raw else self.encode(value, push))
+    
+    def handle(self):
+        try:
+            while True:
+                args = self.read_command()
+                if args is None:
+                    break
+                if args:
+                    self.dispatch(args[0].upper(), args[1:])
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            self.unsubscribe(list(self.channels))
+    
+    def dispatch(self, command, args):
+        server = self.server
+        if command == b'PING':
+            if self.channels and self.protocol == 2:
+                self.send([b'pong', b''])
+            else:
+                self.send(b'+PONG\r\n', raw=True)
+        elif command == b'HELLO':
+            if args and args[0] not in (b'2', b'3'):
+                self.send(b'-NOPROTO unsupported protocol version\r\n', raw=True)
+                return
+            self.protocol = int(args[0]) if args else self.protocol
+            self.send({b'server': b'redis', b'version': b'7.0.0', b'proto': self.protocol,
+                       b'mode': b'standalone', b'role': b'master', b'modules': []})
+        elif command in (b'CLIENT', b'SELECT'):
+            self.send(b'+OK\r\n', raw=True)
+        elif command == b'GET' and len(args) == 1:
+            value = server.data.get(args[0])
+            self.send(value.encode('latin-1') if value is not None else None)
+        elif command == b'SET' and len(args) >= 2:
+            options = [arg.upper() for arg in args[2:]]
+            ttl = int(args[2 + options.index(b'EX') + 1]) if b'EX' in options else None
+            # Stored as str so MemoryCache never shares the connection's buffers
+            server.data.set(args[0], args[1].decode('latin-1'), ttl=ttl)
+            self.send(b'+OK\r\n', raw=True)
+        elif command == b'DEL' and args:
+            existing = [key for key in args if server.data.get(key) is not None]
+            server.data.delete(*args)
+            self.send(len(existing))
+        elif command == b'PUBLISH' and len(args) == 2:
+            self.send(server.publish(args[0], args[1]))
+        elif command == b'SUBSCRIBE' and args:
+            for channel in args:
+                with server.subscribers_lock:
+                    server.subscribers[channel].add(self)
+                self.channels.add(channel)
+                self.send([b'subscribe', channel, len(self.channels)], push=True)
+        elif command == b'UNSUBSCRIBE':
+            channels = args or list(self.channels)
+            self.unsubscribe(channels)
+            for channel in channels:
+                self.send([b'unsubscribe', channel, len(self.channels)], push=True)
+            if not channels:
+                self.send([b'unsubscribe', None, 0], push=True)
+        elif command == b'QUIT':
+            self.send(b'+OK\r\n', raw=True)
+            raise ConnectionError
+        else:
+            self.send(b'-ERR unknown command or wrong number of arguments\r\n', raw=True)
+    
+    def unsubscribe(self, channels):
+        with self.server.subscribers_lock:
+            for channel in channels:
+                handlers = self.server.subscribers.get(channel)
+                if handlers:
+                    handlers.discard(self)
+                    if not handlers:
+                        del self.server.subscribers[channel]
+                self.channels.discard(channel)
+
+# Leaderboards
+# Indexable skip list (each forward link records how many positions it skips),
+# giving O(log n) insert, remove, rank-of-key and item-at-rank.
+class _SkipListTail:
+    def __lt__(self, other):
+        return False
+    
+    def __le__(self, other):
+        return False
+
+class _SkipListNode:
+    __slots__ = ('key', 'next', 'width')
+    
+    def __init__(self, key, level, tail=None):
+        self.key = key
+        self.next = [tail] * level
+        self.width = [1] * level
+
+class RankedSkipList:
+    MAX_LEVEL = 24
+    
+    def __init__(self):
+        self.size = 0
+        self._tail = _SkipListNode(_SkipListTail(), 0)
+        self._head = _SkipListNode(None, self.MAX_LEVEL, self._tail)
+    
+    def __len__(self):
+        return self.size
+    
+    def insert(self, key):
+        chain = [None] * self.MAX_LEVEL
+        steps_at_level = [0] * self.MAX_LEVEL
+        node = self._head
+        for level in reversed(range(self.MAX_LEVEL)):
+            while node.next[level].key <= key:
+                steps_at_level[level] += node.width[level]
+                node = node.next[level]
+            chain[level] = node
+        
+        height = 1
+        while height < self.MAX_LEVEL and random.random() < 0.5:
+            height += 1
+        
+        new_node = _SkipListNode(key, height)
+        steps = 0
+        for level in range(height):
+            previous = chain[level]
+            new_node.next[level] = previous.next[level]
+            previous.next[level] = new_node
+            new_node.width[level] = previous.width[level] - steps
+            previous.width[level] = steps + 1
+            steps += steps_at_level[level]
+        for level in range(height, self.MAX_LEVEL):
+            chain[level].width[level] += 1
+        self.size += 1
+    
+    def remove(self, key):
+        chain = [None] * self.MAX_LEVEL
+        node = self._head
+        for level in reversed(range(self.MAX_LEVEL)):
+            while node.next[level].key < key:
+                node = node.next[level]
+            chain[level] = node
+        
+        target = chain[0].next[0]
+        if target is self._tail or target.key != key:
+            raise KeyError(key)
+        
+        for level in range(len(target.next)):
+            previous = chain[level]
+            previous.width[level] += target.width[level] - 1
+            previous.next[level] = target.next[level]
+        for level in range(len(target.next), self.MAX_LEVEL):
+            chain[level].width[level] -= 1
+        self.size -= 1
+    
+    def rank(self, key):
+        # Number of keys strictly smaller than key
+        node = self._head
+        position = 0
+        for level in reversed(range(self.MAX_LEVEL)):
+            while node.next[level].key < key:
+                position += node.width[level]
+                node = node.next[level]
+        return position
+    
+    def slice(self, start, stop):
+        start = max(start, 0)
+        stop = min(stop, self.size)
+        if start >= stop:
+            return []
+        
+        node = self._head
+        remaining = start + 1
+        for level in reversed(range(self.MAX_LEVEL)):
+            while node.width[level] <= remaining and node.next[level] is not self._tail:
+                remaining -= node.width[level]
+                node = node.next[level]
+        
+        keys = []
+        while len(keys) < stop - start:
+            keys.append(node.key)
+            node = node.next[0]
+        return keys
+
+class Leaderboard:
+    def __init__(self, period=None):
+        self.period = period
+        self._scores = {}
+        self._ranking = RankedSkipList()
+        self._lock = threading.Lock()
+    
+    def __len__(self):
+        return len(self._ranking)
+    
+    def set_score(self, member, score):
+        with self._lock:
+            self._set_score(member, score)
+    
+    def add_score(self, member, delta):
+        with self._lock:
+            self._set_score(member, self._scores.get(member, 0) + delta)
+    
+    def _set_score(self, member, score):
+        # Ordered by score descending, ties broken by member id
+        old_score = self._scores.pop(member, None)
+        if old_score is not None:
+            self._ranking.remove((-old_score, member))
+        if score > 0:
+            self._scores[member] = score
+            self._ranking.insert((-score, member))
+    
+    def rank(self, member):
+        with self._lock:
+            score = self._scores.get(member)
+            if score is None:
+                return None, 0
+            return self._ranking.rank((-score, member)), score
+    
+    def entries(self, start, stop):
+        start = max(start, 0)
+        with self._lock:
+            return [(start + i, member, -negative_score)
+                    for i, (negative_score, member) in enumerate(self._ranking.slice(start, stop))]
+    
+    @classmethod
+    def from_scores(cls, scores, period=None):
+        board = cls(period)
+        for member, score in scores:
+            board._set_score(member, score or 0)
+        return board
+
+LEADERBOARD_BOARDS = ('all_time', 'weekly')
+_leaderboards = {}
+_leaderboards_lock = threading.Lock()
+
+# Background Tasks
+# Periodic tasks run in daemon threads, started lazily by the first request in
+# each process so that preforked workers each get their own threads.
+_background_tasks = []
+_background_tasks_pid = None
+_background_tasks_lock = threading.Lock()
+
+def background_task(interval):
+    def decorator(fn):
+        _background_tasks.append((interval, fn))
+        return fn
+    return decorator
+
+def _run_background_task(interval, fn):
+    while True:
+        time.sleep(interval)
+        try:
+            with app.app_context():
+                fn()
+        except Exception as e:
+            print(f"Background task {fn.__name__} failed: {e}")
+
+def start_background_tasks():
+    global _background_tasks_pid
+    if _background_tasks_pid == os.getpid():
+        return
+    with _background_tasks_lock:
+        if _background_tasks_pid == os.getpid():
+            return
+        _background_tasks_pid = os.getpid()
+        for interval, fn in _background_tasks:
+            threading.Thread(target=_run_background_task, args=(interval, fn), name=fn.__name__, daemon=True).start()
+
+@app.before_request
+def ensure_background_tasks():
+    start_background_tasks()
+
+class IdempotencyKey(db.Model):
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    user_id = db.Column(db.String(36), db.ForeignKey('user.id'), nullable=False)
+    key = db.Column(db.String(100), nullable=False)
+    endpoint = db.Column(db.String(100), nullable=False)
+    status_code = db.Column(db.Integer, nullable=False)
+    response = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (db.UniqueConstraint('user_id', 'key', name='uq_idempotency_user_key'),)
+
+class ChangeLog(db.Model):
+    user_id = db.Column(db.String(36), db.ForeignKey('user.id'), primary_key=True)
+    seq = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    entity = db.Column(db.String(30), nullable=False)
+    entity_id = db.Column(db.String(36), nullable=False)
+    op = db.Column(db.String(10), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class UserDailyActivity(db.Model):
+    user_id = db.Column(db.String(36), db.ForeignKey('user.id'), primary_key=True)
+    local_date = db.Column(db.Date, primary_key=True)
+    completions = db.Column(db.Integer, default=0, nullable=False)
+    pomodoros = db.Column(db.Integer, default=0, nullable=False)
+
+class EmailOutbox(db.Model):
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    to_email = db.Column(db.String(120), nullable=False)
+    subject = db.Column(db.String(200), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), default='pending', nullable=False)
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime)
+    claimed_until = db.Column(db.DateTime)
+    
+    __table_args__ = (db.Index('ix_email_outbox_status_created', 'status', 'created_at'),)
+
+class LeaderboardEntry(db.Model):
+    board = db.Column(db.String(20), primary_key=True)
+    period = db.Column(db.String(20), primary_key=True)
+    user_id = db.Column(db.String(36), db.ForeignKey('user.id'), primary_key=True, index=True)
+    rank = db.Column(db.Integer, nullable=False)
+    score = db.Column(db.Integer, nullable=False)
+    snapshot_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (db.Index('ix_leaderboard_entry_board_period_rank', 'board', 'period', 'rank'),)
+
+class UserDailyRollup(db.Model):
+    __tablename__ = 'user_daily_rollup'
+    user_id = db.Column(db.String(36), db.ForeignKey('user.id'), primary_key=True)
+    local_date = db.Column(db.Date, primary_key=True)
+    hour = db.Column(db.SmallInteger, primary_key=True, autoincrement=False)
+    study_minutes = db.Column(db.Integer, default=0, nullable=False)
+    pomodoros = db.Column(db.Integer, default=0, nullable=False)
+    completions = db.Column(db.Integer, default=0, nullable=False)
+    notes_created = db.Column(db.Integer, default=0, nullable=False)
+
+class NoteTag(db.Model):
+    note_id = db.Column(db.String(36), db.ForeignKey('note.id', ondelete='CASCADE'), primary_key=True)
+    tag = db.Column(db.String(50), primary_key=True)
+    user_id = db.Column(db.String(36), db.ForeignKey('user.id'), nullable=False)
+    
+    __table_args__ = (db.Index('ix_note_tag_user_tag', 'user_id', 'tag'),)
+
+class UserTagCount(db.Model):
+    user_id = db.Column(db.String(36), db.ForeignKey('user.id'), primary_key=True)
+    tag = db.Column(db.String(50), primary_key=True)
+    count = db.Column(db.Integer, default=0, nullable=False)
+
+class NoteRevision(db.Model):
+    note_id = db.Column(db.String(36), db.ForeignKey('note.id', ondelete='CASCADE'), primary_key=True)
+    version = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    user_id = db.Column(db.String(36), db.ForeignKey('user.id'), nullable=False, index=True)
+    kind = db.Column(db.String(10), nullable=False)
+    data = db.Column(CompressedText, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class Cohort(db.Model):
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    name = db.Column(db.String(100), nullable=False)
+    owner_id = db.Column(db.String(36), db.ForeignKey('user.id'), nullable=False, index=True)
+    join_code = db.Column(db.String(16), unique=True, nullable=False)
+    member_count = db.Column(db.Integer, default=0, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class CohortMember(db.Model):
+    cohort_id = db.Column(db.String(36), db.ForeignKey('cohort.id', ondelete='CASCADE'), primary_key=True)
+    user_id = db.Column(db.String(36), db.ForeignKey('user.id'), primary_key=True)
+    completed_days = db.Column(db.Integer, default=0, nullable=False)
+    total_study_time = db.Column(db.Integer, default=0, nullable=False)
+    last_completed_at = db.Column(db.DateTime)
+    joined_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (db.Index('ix_cohort_member_user', 'user_id'),)
+
+class CohortWeekStat(db.Model):
+    cohort_id = db.Column(db.String(36), db.ForeignKey('cohort.id', ondelete='CASCADE'), primary_key=True)
+    week = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    completions = db.Column(db.Integer, default=0, nullable=False)
+    study_time = db.Column(db.Integer, default=0, nullable=False)
+    members_completed = db.Column(db.Integer, default=0, nullable=False)
+
+class AccountDeletion(db.Model):
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    # Outlives the user row, so deliberately not a foreign key
+    user_id = db.Column(db.String(36), nullable=False, index=True)
+    status = db.Column(db.String(20), default='pending', nullable=False)
+    current_table = db.Column(db.String(50))
+    deleted_rows = db.Column(db.Text, default='{}', nullable=False)
+    claimed_until = db.Column(db.DateTime)
+    requested_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    completed_at = db.Column(db.DateTime)
+
+# Helper Functions
+class PasswordHashBusy(Exception):
+    pass
+
+_password_hash_pool = None
+_password_hash_pool_pid = None
+_password_hash_pool_lock = threading.Lock()
+_password_hash_slots = threading.BoundedSemaphore(PASSWORD_HASH_MAX_PENDING)
+
+def get_password_hash_pool():
+    global _password_hash_pool, _password_hash_pool_pid
+    if PASSWORD_HASH_WORKERS <= 0:
+        return None
+    
+    # Pools do not survive a fork, so every gunicorn worker lazily builds its own
+    with _password_hash_pool_lock:
+        if _password_hash_pool is None or _password_hash_pool_pid != os.getpid():
+            _password_hash_pool = ProcessPoolExecutor(max_workers=PASSWORD_HASH_WORKERS)
+            _password_hash_pool_pid = os.getpid()
+        return _password_hash_pool
+
+def run_password_hash_job(fn, *args):
+    global _password_hash_pool
+    pool = get_password_hash_pool()
+    if pool is None:
+        return fn(*args)
+    
+    # A full queue is answered with 503 at once rather than holding the request
+    if not _password_hash_slots.acquire(blocking=False):
+        raise PasswordHashBusy()
+    try:
+        future = pool.submit(fn, *args)
+        try:
+            return future.result(timeout=PASSWORD_HASH_TIMEOUT)
+        except FutureTimeoutError:
+            future.cancel()
+            raise PasswordHashBusy()
+    except BrokenProcessPool:
+        with _password_hash_pool_lock:
+            _password_hash_pool = None
+        raise
+    finally:
+        _password_hash_slots.release()
+
+def hash_password(password):
+    return run_password_hash_job(generate_password_hash, password, PASSWORD_HASH_METHOD)
+
+def verify_password(password_hash, password):
+    return run_password_hash_job(check_password_hash, password_hash, password)
+
+def password_needs_rehash(password_hash):
+    return password_hash.split('$', 1)[0] != PASSWORD_HASH_METHOD
+
+_session_activity = {}
+_session_activity_lock = threading.Lock()
+
+def session_state_key(session_id):
+    return f"session_active:{session_id}"
+
+def refresh_token_lifetime():
+    return int(app.config['JWT_REFRESH_TOKEN_EXPIRES'].total_seconds())
+
+def start_user_session(user):
+    session = UserSession(
+        id=str(uuid.uuid4()),
+        user_id=user.id,
+        device_info=request.headers.get('User-Agent', '')[:255],
+        ip_address=request.remote_addr
+    )
+    db.session.add(session)
+    return session
+
+def issue_tokens(user_id, session_id):
+    claims = {"sid": session_id}
+    cache.set(session_state_key(session_id), True, ttl=SESSION_STATE_TTL)
+    pin_reads_to_primary(user_id)
+    return (create_access_token(identity=user_id, additional_claims=claims),
+            create_refresh_token(identity=user_id, additional_claims=claims))
+
+def session_is_active(session_id):
+    key = session_state_key(session_id)
+    is_active = cache.get(key)
+    if is_active is None:
+        is_active = bool(db.session.query(UserSession.is_active).filter_by(id=session_id).scalar())
+        # Revocation is permanent, so a revoked state can be cached for as long as any token lives
+        cache.set(key, is_active, ttl=SESSION_STATE_TTL if is_active else refresh_token_lifetime())
+    return is_active
+
+def touch_session(session_id):
+    with _session_activity_lock:
+        _session_activity[session_id] = datetime.utcnow()
+
+@background_task(SESSION_ACTIVITY_FLUSH_INTERVAL)
+def flush_session_activity():
+    with _session_activity_lock:
+        pending = dict(_session_activity)
+        _session_activity.clear()
+    
+    if not pending:
+        return
+    
+    # Core executemany rather than ORM bulk update: sessions deleted in the
+    # meantime simply match no row instead of raising StaleDataError
+    table = UserSession.__table__
+    db.session.execute(
+        update(table).where(table.c.id == bindparam('session_id')).values(last_activity=bindparam('seen_at')),
+        [{"session_id": session_id, "seen_at": seen_at} for session_id, seen_at in pending.items()]
+    )
+    db.session.commit()
+
+@atexit.register
+def flush_session_activity_on_exit():
+    try:
+        with app.app_context():
+            flush_session_activity()
+    except Exception as e:
+        print(f"Session activity flush failed: {e}")
+
+def db_dialect():
+    return db.engine.dialect.name
+
+def upgrade_schema():
+    # create_all() only creates missing tables. Columns and indexes added to
+    # existing models are added here, with their scalar defaults filled into
+    # the existing rows so NOT NULL columns can be added in place.
+    changes = []
+    with db.engine.begin() as connection:
+        inspector = inspect(connection)
+        preparer = connection.dialect.identifier_preparer
+        existing_tables = set(inspector.get_table_names())
+        for table in db.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            present = {column['name']: column['type'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in present:
+                    # SQLite does not enforce VARCHAR lengths, PostgreSQL does
+                    length = getattr(column.type, 'length', None)
+                    if (connection.dialect.name == 'postgresql' and length
+                            and (getattr(present[column.name], 'length', None) or length) < length):
+                        connection.execute(text(
+                            f"ALTER TABLE {preparer.format_table(table)} ALTER COLUMN {preparer.format_column(column)} "
+                            f"TYPE {column.type.compile(dialect=connection.dialect)}"
+                        ))
+                        changes.append(f"{table.name}.{column.name} ({column.type})")
+                    continue
+                ddl = (f"ALTER TABLE {preparer.format_table(table)} ADD COLUMN "
+                       f"{preparer.format_column(column)} {column.type.compile(dialect=connection.dialect)}")
+                default = column.default.arg if column.default is not None and column.default.is_scalar else None
+                if default is not None:
+                    value = bindparam('default', default, type_=column.type)
+                    ddl += " DEFAULT " + str(value.compile(dialect=connection.dialect, compile_kwargs={"literal_binds": True}))
+                    if not column.nullable:
+                        ddl += " NOT NULL"
+                connection.execute(text(ddl))
+                if column.unique:
+                    connection.execute(text(
+                        f"CREATE UNIQUE INDEX {preparer.quote(f'uq_{table.name}_{column.name}')} "
+                        f"ON {preparer.format_table(table)} ({preparer.format_column(column)})"
+                    ))
+                changes.append(f"{table.name}.{column.name}")
+            indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in indexes:
+                    index.create(connection)
+                    changes.append(index.name)
+    return changes
+
+def primary_pin_key(user_id):
+    return f"primary_pin:{user_id}"
+
+def pin_reads_to_primary(user_id):
+    if REPLICA_BINDS:
+        cache.set(primary_pin_key(user_id), True, ttl=REPLICA_PIN_SECONDS)
+
+def is_replica_read(clause):
+    if not has_request_context() or request.method not in ('GET', 'HEAD'):
+        return False
+    if not isinstance(clause, Select) or clause._for_update_arg is not None:
+        return False
+    if 'replica_bind' not in g:
+        try:
+            user_id = get_jwt_identity()
+        except RuntimeError:
+            # Token checks run before the identity is known and must see
+            # sessions created moments ago, so they stay on the primary
+            if request.headers.get('Authorization'):
+                return False
+            user_id = None
+        g.replica_bind = None if user_id and cache.get(primary_pin_key(user_id)) else random.choice(REPLICA_BINDS)
+    return g.replica_bind is not None
+
+@app.after_request
+def pin_writers_to_primary(response):
+    if g.get('db_wrote') and response.status_code < 400:
+        try:
+            user_id = get_jwt_identity()
+        except RuntimeError:
+            user_id = None
+        if user_id:
+            pin_reads_to_primary(user_id)
+    return response
+
+def copy_primary_to_replicas():
+    # Stand-in for replication when trying replicas out locally on SQLite
+    source = db.engine.raw_connection()
+    try:
+        for bind in REPLICA_BINDS:
+            target = db.engines[bind].raw_connection()
+            try:
+                source.driver_connection.backup(target.driver_connection)
+            finally:
+                target.close()
+    finally:
+        source.close()
+
+def upsert_increment(model, keys, increments, connection=None):
+    # Pass connection when called from inside a flush
+    executor = connection if connection is not None else db.session
+    table = model.__table__
+    dialect = db_dialect()
+    if dialect in ('postgresql', 'sqlite'):
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        stmt = dialect_insert(table).values(**keys, **increments)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(keys),
+            set_={column: table.c[column] + stmt.excluded[column] for column in increments}
+        )
+        executor.execute(stmt)
+        return
+    
+    key_filter = and_(*(table.c[column] == value for column, value in keys.items()))
+    result = executor.execute(update(table).where(key_filter).values(
+        **{column: table.c[column] + value for column, value in increments.items()}))
+    if result.rowcount == 0:
+        executor.execute(insert(table).values(**keys, **increments))
+
+def sql_greatest(*values):
+    # SQLite spells GREATEST as the multi-argument form of MAX
+    return func.max(*values) if db_dialect() == 'sqlite' else func.greatest(*values)
+
+# Table Partitioning
+# PostgreSQL only; other databases keep each of these as one plain table.
+# Rows outside every monthly partition (old imports, clock skew) land in the
+# <table>_default partition.
+PARTITIONED_TABLES = {'pomodoro_session': 'start_time', 'ai_conversation': 'created_at'}
+
+def month_start(when):
+    return datetime(when.year, when.month, 1)
+
+def add_months(month, months):
+    index = month.year * 12 + month.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+def partition_name(table_name, month):
+    return f"{table_name}_p{month.year:04d}{month.month:02d}"
+
+def is_partitioned(connection, table_name):
+    return connection.execute(
+        text("SELECT 1 FROM pg_class WHERE relname = :name AND relkind = 'p'"), {"name": table_name}
+    ).first() is not None
+
+def table_partitions(connection, table_name):
+    return set(connection.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = :name"
+    ), {"name": table_name}).scalars())
+
+def create_partitions(connection, table_name, first, last):
+    existing = table_partitions(connection, table_name)
+    created = 0
+    if f"{table_name}_default" not in existing:
+        connection.execute(text(f'CREATE TABLE "{table_name}_default" PARTITION OF "{table_name}" DEFAULT'))
+        created += 1
+    month = month_start(first)
+    while month <= last:
+        name = partition_name(table_name, month)
+        if name not in existing:
+            connection.execute(text(
+                f'CREATE TABLE "{name}" PARTITION OF "{table_name}" '
+                f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+            ))
+            created += 1
+        month = add_months(month, 1)
+    return created
+
+@event.listens_for(PomodoroSession.__table__, 'after_create')
+@event.listens_for(AIConversation.__table__, 'after_create')
+def create_initial_partitions(table, connection, **kw):
+    # A new partitioned table accepts no rows until it has partitions
+    if connection.dialect.name == 'postgresql':
+        now = datetime.utcnow()
+        create_partitions(connection, table.name, now, add_months(month_start(now), PARTITION_MONTHS_AHEAD))
+
+@background_task(PARTITION_MAINTENANCE_INTERVAL)
+def ensure_partitions():
+    if db_dialect() != 'postgresql':
+        return 0
+    now = datetime.utcnow()
+    created = 0
+    with db.engine.begin() as connection:
+        # Workers starting together would otherwise race to create the same partitions
+        connection.execute(text("SELECT pg_advisory_xact_lock(hashtext('ensure_partitions'))"))
+        for table_name in PARTITIONED_TABLES:
+            if is_partitioned(connection, table_name):
+                created += create_partitions(connection, table_name, now, add_months(month_start(now), PARTITION_MONTHS_AHEAD))
+    return created
+
+def expired_partitions(table_name, cutoff):
+    months = []
+    pattern = re.compile(rf"^{table_name}_p(\d{{4}})(\d{{2}})$")
+    for name in table_partitions(db.session.connection(), table_name):
+        match = pattern.match(name)
+        if match:
+            month = datetime(int(match.group(1)), int(match.group(2)), 1)
+            if add_months(month, 1) <= cutoff:
+                months.append(month)
+    return sorted(months)
+
+def drop_partition(table_name, month, detach_only=False):
+    # Instant compared to DELETE: no per-row work, no dead tuples, no vacuum
+    name = partition_name(table_name, month)
+    db.session.execute(text(f'ALTER TABLE "{table_name}" DETACH PARTITION "{name}"'))
+    if not detach_only:
+        db.session.execute(text(f'DROP TABLE "{name}"'))
+    db.session.commit()
+    return name
+
+def partition_existing_table(table_name):
+    # Moves a plain table created before partitioning into a partitioned one.
+    # Everything runs in one transaction that locks the table while rows are copied.
+    table = db.metadata.tables[table_name]
+    key = PARTITIONED_TABLES[table_name]
+    legacy = f"{table_name}_unpartitioned"
+    with db.engine.begin() as connection:
+        if is_partitioned(connection, table_name):
+            return False
+        inspector = inspect(connection)
+        connection.execute(text(f'ALTER TABLE "{table_name}" RENAME TO "{legacy}"'))
+        for index in inspector.get_indexes(legacy):
+            connection.execute(text(f'ALTER INDEX "{index["name"]}" RENAME TO "{index["name"]}_unpartitioned"'))
+        primary_key = inspector.get_pk_constraint(legacy).get('name')
+        if primary_key:
+            connection.execute(text(f'ALTER TABLE "{legacy}" RENAME CONSTRAINT "{primary_key}" TO "{legacy}_pkey"'))
+        
+        table.create(connection)
+        now = datetime.utcnow()
+        first = connection.execute(text(f'SELECT min("{key}") FROM "{legacy}"')).scalar() or now
+        create_partitions(connection, table_name, first, add_months(month_start(now), PARTITION_MONTHS_AHEAD))
+        
+        columns = [column.name for column in table.c]
+        selected = [f'coalesce("{name}", now())' if name == key else f'"{name}"' for name in columns]
+        quoted = ', '.join(f'"{name}"' for name in columns)
+        connection.execute(text(f'INSERT INTO "{table_name}" ({quoted}) SELECT {", ".join(selected)} FROM "{legacy}"'))
+        connection.execute(text(f'DROP TABLE "{legacy}"'))
+    return True
+
+def get_zone(name):
+    try:
+        return ZoneInfo(name) if name else None
+    except (ZoneInfoNotFoundError, ValueError):
+        return None
+
+def user_zone(user_id):
+    preferences = get_preferences(user_id)
+    return get_zone(preferences.timezone if preferences else None) or timezone.utc
+
+def local_date_for(zone, when=None):
+    when = when or datetime.utcnow()
+    return when.replace(tzinfo=timezone.utc).astimezone(zone).date()
+
+def record_daily_activity(user_id, local_date, completions=0, pomodoros=0):
+    upsert_increment(
+        UserDailyActivity,
+        {"user_id": user_id, "local_date": local_date},
+        {"completions": completions, "pomodoros": pomodoros}
+    )
+
+ROLLUP_METRICS = ('study_minutes', 'pomodoros', 'completions', 'notes_created')
+
+def record_rollup(user_id, zone, when=None, **increments):
+    local = (when or datetime.utcnow()).replace(tzinfo=timezone.utc).astimezone(zone)
+    upsert_increment(
+        UserDailyRollup,
+        {"user_id": user_id, "local_date": local.date(), "hour": local.hour},
+        increments
+    )
+
+def backfill_rollups(batch_size=500):
+    # Rebuilds the rollup one batch of users at a time, keyed on user id so
+    # each batch is a fresh index range scan and its own transaction
+    rollup = UserDailyRollup.__table__
+    last_user_id = ''
+    users = 0
+    while True:
+        batch = db.session.execute(
+            select(User.id, UserPreferences.timezone)
+            .outerjoin(UserPreferences, UserPreferences.user_id == User.id)
+            .where(User.id > last_user_id)
+            .order_by(User.id)
+            .limit(batch_size)
+        ).all()
+        if not batch:
+            return users
+        
+        zones = {user_id: get_zone(name) or timezone.utc for user_id, name in batch}
+        user_ids = list(zones)
+        totals = {}
+        
+        def add(user_id, when, column, amount):
+            if not when:
+                return
+            local = when.replace(tzinfo=timezone.utc).astimezone(zones[user_id])
+            row = totals.setdefault((user_id, local.date(), local.hour), {
+                "study_minutes": 0, "pomodoros": 0, "completions": 0, "notes_created": 0
+            })
+            row[column] += amount
+        
+        for user_id, when, time_spent in db.session.execute(
+            select(Progress.user_id, Progress.completion_date, Progress.time_spent)
+            .where(Progress.user_id.in_(user_ids), Progress.completed == true())
+        ):
+            add(user_id, when, 'study_minutes', time_spent or 0)
+            add(user_id, when, 'completions', 1)
+        
+        for user_id, when in db.session.execute(
+            select(PomodoroSession.user_id, PomodoroSession.end_time)
+            .where(PomodoroSession.user_id.in_(user_ids), PomodoroSession.completed == true(),
+                   PomodoroSession.session_type == 'study')
+        ):
+            add(user_id, when, 'pomodoros', 1)
+        
+        for user_id, when in db.session.execute(
+            select(Note.user_id, Note.created_at).where(Note.user_id.in_(user_ids))
+        ):
+            add(user_id, when, 'notes_created', 1)
+        
+        db.session.execute(rollup.delete().where(rollup.c.user_id.in_(user_ids)))
+        if totals:
+            db.session.execute(insert(rollup), [
+                {"user_id": user_id, "local_date": local_date, "hour": hour, **counts}
+                for (user_id, local_date, hour), counts in totals.items()
+            ])
+        db.session.commit()
+        
+        users += len(batch)
+        last_user_id = batch[-1].id
+
+def backfill_daily_activity(batch_size=500):
+    # Streaks are computed from user_daily_activity alone, so it has to hold
+    # every day with a completion or study pomodoro, including those logged
+    # before the table existed
+    activity = UserDailyActivity.__table__
+    last_user_id = ''
+    users = 0
+    while True:
+        batch = db.session.execute(
+            select(User.id, UserPreferences.timezone)
+            .outerjoin(UserPreferences, UserPreferences.user_id == User.id)
+            .where(User.id > last_user_id)
+            .order_by(User.id)
+            .limit(batch_size)
+        ).all()
+        if not batch:
+            return users
+
+        zones = {user_id: get_zone(name) or timezone.utc for user_id, name in batch}
+        user_ids = list(zones)
+        totals = defaultdict(lambda: {"completions": 0, "pomodoros": 0})
+
+        for user_id, when in db.session.execute(
+            select(Progress.user_id, Progress.completion_date)
+            .where(Progress.user_id.in_(user_ids), Progress.completed == true(), Progress.completion_date.isnot(None))
+        ):
+            totals[(user_id, local_date_for(zones[user_id], when))]["completions"] += 1
+
+        for user_id, when in db.session.execute(
+            select(PomodoroSession.user_id, func.coalesce(PomodoroSession.end_time, PomodoroSession.start_time))
+            .where(PomodoroSession.user_id.in_(user_ids), PomodoroSession.completed == true(),
+                   PomodoroSession.session_type == 'study')
+        ):
+            totals[(user_id, local_date_for(zones[user_id], when))]["pomodoros"] += 1
+
+        db.session.execute(activity.delete().where(activity.c.user_id.in_(user_ids)))
+        if totals:
+            db.session.execute(insert(activity), [
+                {"user_id": user_id, "local_date": local_date, **counts}
+                for (user_id, local_date), counts in totals.items()
+            ])
+        db.session.commit()
+
+        users += len(batch)
+        last_user_id = batch[-1].id
+
+def utc_offset_minutes(zone, when):
+    return int(when.replace(tzinfo=timezone.utc).astimezone(zone).utcoffset().total_seconds() // 60)
+
+def utc_offset_periods(zone, start, end):
+    # [(first UTC instant, offset in minutes)] for every offset the zone used
+    # between start and end: step a day at a time, then bisect each change
+    # down to the minute
+    day = start.replace(second=0, microsecond=0)
+    periods = [(day, utc_offset_minutes(zone, day))]
+    while day < end:
+        following = day + timedelta(days=1)
+        if utc_offset_minutes(zone, following) != periods[-1][1]:
+            low, high = 0, 24 * 60
+            while high - low > 1:
+                middle = (low + high) // 2
+                if utc_offset_minutes(zone, day + timedelta(minutes=middle)) == periods[-1][1]:
+                    low = middle
+                else:
+                    high = middle
+            boundary = day + timedelta(minutes=high)
+            periods.append((boundary, utc_offset_minutes(zone, boundary)))
+        day = following
+    return periods
+
+def local_time_parts(column, zone, start=None, end=None):
+    # (day of week with 0 = Sunday, hour) of a naive UTC timestamp in zone.
+    # SQLite has no timezone database, so each row is shifted by the offset
+    # the zone had at that instant, from the transitions between start and end.
+    if db_dialect() == 'postgresql':
+        local = func.timezone(str(zone), func.timezone('UTC', column))
+        return func.extract('dow', local), func.extract('hour', local)
+    now = datetime.utcnow()
+    periods = utc_offset_periods(zone, start or now, max(end or now, start or now))
+    modifiers = [(boundary, f"{offset:+d} minutes") for boundary, offset in periods]
+    modifier = modifiers[-1][1]
+    if len(modifiers) > 1:
+        modifier = case(*((column < boundary, previous) for (_, previous), (boundary, _) in zip(modifiers, modifiers[1:])),
+                        else_=modifier)
+    return (func.cast(func.strftime('%w', column, modifier), db.Integer),
+            func.cast(func.strftime('%H', column, modifier), db.Integer))
+
+def day_number(column):
+    if db_dialect() == 'postgresql':
+        return column - literal_column("DATE '1970-01-01'", type_=db.Date)
+    return func.julianday(column)
+
+def streak_stats_query(local_today, user_filter=None):
+    # Gaps and islands: consecutive dates share the same (date - row_number),
+    # so grouping on that difference yields one row per unbroken run of days
+    activity = UserDailyActivity.__table__
+    numbered = select(
+        activity.c.user_id,
+        activity.c.local_date,
+        (day_number(activity.c.local_date) - func.row_number().over(
+            partition_by=activity.c.user_id, order_by=activity.c.local_date)).label('island')
+    )
+    if user_filter is not None:
+        numbered = numbered.where(user_filter(activity.c.user_id))
+    numbered = numbered.subquery()
+    
+    islands = select(
+        numbered.c.user_id,
+        func.max(numbered.c.local_date).label('last_date'),
+        func.count().label('length')
+    ).group_by(numbered.c.user_id, numbered.c.island).subquery()
+    
+    # A streak is still current if its last day is today or yesterday
+    return select(
+        islands.c.user_id,
+        func.max(islands.c.length).label('longest_streak'),
+        func.max(islands.c.last_date).label('last_streak_date'),
+        func.max(case((islands.c.last_date >= local_today - timedelta(days=1), islands.c.length), else_=0)).label('current_streak')
+    ).group_by(islands.c.user_id)
+
+def refresh_user_streak(user, zone=None):
+    zone = zone or user_zone(user.id)
+    stats = db.session.execute(
+        streak_stats_query(local_date_for(zone), lambda user_id: user_id == user.id)
+    ).first()
+    if stats:
+        user.current_streak = stats.current_streak
+        # Never lower a record kept from before the activity history
+        user.longest_streak = max(user.longest_streak or 0, stats.longest_streak)
+        user.last_streak_date = stats.last_streak_date
+
+def effective_current_streak(user, zone):
+    # Between nightly recomputes a lapsed streak is still stored on the user
+    if not user.last_streak_date or user.last_streak_date < local_date_for(zone) - timedelta(days=1):
+        return 0
+    return user.current_streak
+
+def recompute_all_streaks():
+    # One set-based UPDATE ... FROM per distinct timezone, since "today"
+    # depends on the zone; there is no per-user work in Python
+    users = User.__table__
+    preferences = UserPreferences.__table__
+    zone_column = func.coalesce(preferences.c.timezone, 'UTC')
+    zone_names = [row[0] for row in db.session.execute(
+        select(zone_column).select_from(users.outerjoin(preferences, preferences.c.user_id == users.c.id)).distinct()
+    )]
+    
+    updated = 0
+    for zone_name in zone_names:
+        zone = get_zone(zone_name) or timezone.utc
+        zone_users = select(users.c.id).select_from(
+            users.outerjoin(preferences, preferences.c.user_id == users.c.id)
+        ).where(zone_column == zone_name)
+        stats = streak_stats_query(local_date_for(zone), lambda user_id: user_id.in_(zone_users)).subquery()
+        result = db.session.execute(
+            update(users).where(users.c.id == stats.c.user_id).values(
+                current_streak=stats.c.current_streak,
+                longest_streak=case((stats.c.longest_streak > func.coalesce(users.c.longest_streak, 0), stats.c.longest_streak),
+                                    else_=func.coalesce(users.c.longest_streak, 0)),
+                last_streak_date=stats.c.last_streak_date,
+                data_version=func.coalesce(users.c.data_version, 0) + 1
+            )
+        )
+        db.session.commit()
+        updated += result.rowcount
+    # Too many rows to name one by one
+    bump_entity_cache_generation()
+    return updated
+
+def current_week_period(now=None):
+    year, week, _ = (now or datetime.utcnow()).isocalendar()
+    return f"{year}-W{week:02d}"
+
+def current_week_start(now=None):
+    now = now or datetime.utcnow()
+    return datetime(now.year, now.month, now.day) - timedelta(days=now.weekday())
+
+def leaderboard_scores(board):
+    if board == 'all_time':
+        return db.session.execute(
+            select(User.id, User.total_study_time).where(User.total_study_time > 0, User.deleted_at.is_(None))
+        ).all()
+    return db.session.execute(
+        select(Progress.user_id, func.sum(Progress.time_spent))
+        .join(User, User.id == Progress.user_id)
+        .where(Progress.completed == true(), Progress.completion_date >= current_week_start(),
+               User.deleted_at.is_(None))
+        .group_by(Progress.user_id)
+    ).all()
+
+def rebuild_leaderboard(board):
+    # Built outside the lock and swapped in, so readers never wait on the scan
+    period = current_week_period() if board == 'weekly' else None
+    fresh = Leaderboard.from_scores(leaderboard_scores(board), period)
+    with _leaderboards_lock:
+        _leaderboards[board] = fresh
+    return fresh
+
+def get_leaderboard(board):
+    leaderboard = _leaderboards.get(board)
+    if leaderboard is None or (board == 'weekly' and leaderboard.period != current_week_period()):
+        leaderboard = rebuild_leaderboard(board)
+    return leaderboard
+
+@background_task(LEADERBOARD_REBUILD_INTERVAL)
+def rebuild_leaderboards():
+    # Each worker only sees its own writes incrementally; rebuilding from the
+    # database periodically folds in everyone else's
+    for board in LEADERBOARD_BOARDS:
+        if board in _leaderboards:
+            rebuild_leaderboard(board)
+
+def update_leaderboards(user_id, total_study_time, study_time_delta):
+    all_time = _leaderboards.get('all_time')
+    if all_time is not None:
+        all_time.set_score(user_id, total_study_time)
+    weekly = _leaderboards.get('weekly')
+    if weekly is not None and weekly.period == current_week_period():
+        weekly.add_score(user_id, study_time_delta)
+
+def snapshot_leaderboards():
+    # Persists every board, which also keeps the history of past weekly boards
+    counts = {}
+    for board in LEADERBOARD_BOARDS:
+        leaderboard = rebuild_leaderboard(board)
+        period = leaderboard.period or 'all'
+        now = datetime.utcnow()
+        LeaderboardEntry.query.filter_by(board=board, period=period).delete()
+        rows = [{
+            "board": board,
+            "period": period,
+            "user_id": member,
+            "rank": rank + 1,
+            "score": score,
+            "snapshot_at": now
+        } for rank, member, score in leaderboard.entries(0, len(leaderboard))]
+        for start in range(0, len(rows), 1000):
+            db.session.execute(insert(LeaderboardEntry.__table__), rows[start:start + 1000])
+        db.session.commit()
+        counts[f"{board}:{period}"] = len(rows)
+    return counts
+
+def record_study_day(user, study_time, completions=1):
+    # Incremented in SQL, so concurrent completions cannot lose each other's time
+    user.total_study_time = func.coalesce(User.total_study_time, 0) + study_time
+    zone = user_zone(user.id)
+    record_daily_activity(user.id, local_date_for(zone), completions=completions)
+    record_rollup(user.id, zone, study_minutes=study_time, completions=completions)
+    refresh_user_streak(user, zone)
+    
+    # The flush runs the increment; reading the column then loads the new total
+    db.session.flush()
+    user_id, total_study_time = user.id, user.total_study_time
+    after_commit(lambda: update_leaderboards(user_id, total_study_time, study_time))
+
+# Cohorts
+# Each member row carries the member's own totals and each cohort keeps
+# per-week sums over the days that are currently completed, both updated as
+# members complete or un-complete days, so a cohort dashboard never has to
+# aggregate its members' progress on read.
+def member_week_progress(user_id, weeks=None):
+    query = select(Progress.week, func.count(), func.coalesce(func.sum(Progress.time_spent), 0))\
+        .where(Progress.user_id == user_id, Progress.completed == true())\
+        .group_by(Progress.week)
+    if weeks is not None:
+        query = query.where(Progress.week.in_(list(weeks)))
+    return {week: (completions, study_time) for week, completions, study_time in db.session.execute(query)}
+
+def week_finished(week, completions):
+    totals = CURRICULUM.week_totals.get(week)
+    return totals is not None and completions >= totals['days']
+
+def cohort_progress_change(week, before, after):
+    # before and after are a day's (completed, time_spent), before is None for
+    # a new day; gives the (week, completions, study_time) delta, if any
+    old = (1, before[1] or 0) if before and before[0] else (0, 0)
+    new = (1, after[1] or 0) if after[0] else (0, 0)
+    if old == new:
+        return None
+    return (week, new[0] - old[0], new[1] - old[1])
+
+def record_cohort_progress(user_id, changes):
+    # changes holds (week, completions, study_time) deltas, negative for days
+    # that are no longer completed; see cohort_progress_change
+    changes = [change for change in changes if change]
+    if not changes:
+        return
+    cohort_ids = db.session.execute(
+        select(CohortMember.cohort_id).where(CohortMember.user_id == user_id)
+    ).scalars().all()
+    if not cohort_ids:
+        return
+    
+    deltas = defaultdict(lambda: [0, 0])
+    for week, completions, study_time in changes:
+        deltas[week][0] += completions
+        deltas[week][1] += study_time
+    added = sum(completions for completions, _ in deltas.values())
+    
+    values = {
+        "completed_days": CohortMember.completed_days + added,
+        # Mirrors the user's total, which only ever grows, like recompute_cohort_stats
+        "total_study_time": select(func.coalesce(User.total_study_time, 0)).where(User.id == user_id).scalar_subquery()
+    }
+    if any(completions > 0 for _, completions, _ in changes):
+        values["last_completed_at"] = datetime.utcnow()
+    db.session.execute(
+        update(CohortMember).where(CohortMember.user_id == user_id).values(**values)
+        .execution_options(synchronize_session=False)
+    )
+    
+    week_totals = member_week_progress(user_id, deltas)
+    for week, (completions, study_time) in deltas.items():
+        total = week_totals.get(week, (0, 0))[0]
+        finished = int(week_finished(week, total)) - int(week_finished(week, total - completions))
+        for cohort_id in cohort_ids:
+            upsert_increment(
+                CohortWeekStat,
+                {"cohort_id": cohort_id, "week": week},
+                {"completions": completions, "study_time": study_time, "members_completed": finished}
+            )
+
+def apply_member_weeks(cohort_id, weeks, sign):
+    for week, (completions, study_time) in weeks.items():
+        upsert_increment(
+            CohortWeekStat,
+            {"cohort_id": cohort_id, "week": week},
+            {
+                "completions": sign * completions,
+                "study_time": sign * study_time,
+                "members_completed": sign * int(week_finished(week, completions))
+            }
+        )
+
+def add_cohort_member(cohort, user):
+    weeks = member_week_progress(user.id)
+    last_completed_at = db.session.query(func.max(Progress.completion_date))\
+        .filter(Progress.user_id == user.id, Progress.completed == true()).scalar()
+    db.session.add(CohortMember(
+        cohort_id=cohort.id,
+        user_id=user.id,
+        completed_days=sum(completions for completions, _ in weeks.values()),
+        total_study_time=user.total_study_time or 0,
+        last_completed_at=last_completed_at
+    ))
+    apply_member_weeks(cohort.id, weeks, 1)
+    cohort.member_count += 1
+
+def remove_cohort_member(cohort, member):
+    apply_member_weeks(cohort.id, member_week_progress(member.user_id), -1)
+    db.session.delete(member)
+    cohort.member_count -= 1
+
+def recompute_cohort_stats(cohort_id=None):
+    query = Cohort.query
+    if cohort_id:
+        query = query.filter_by(id=cohort_id)
+    count = 0
+    for cohort in query.all():
+        members = CohortMember.query.filter_by(cohort_id=cohort.id).all()
+        users = {u.id: u for u in db.session.query(User.id, User.total_study_time)
+                 .filter(User.id.in_([m.user_id for m in members])).all()}
+        rows = db.session.execute(
+            select(Progress.user_id, Progress.week, func.count(),
+                   func.coalesce(func.sum(Progress.time_spent), 0), func.max(Progress.completion_date))
+            .join(CohortMember, CohortMember.user_id == Progress.user_id)
+            .where(CohortMember.cohort_id == cohort.id, Progress.completed == true())
+            .group_by(Progress.user_id, Progress.week)
+        ).all()
+        
+        by_member = defaultdict(list)
+        weeks = defaultdict(lambda: {"completions": 0, "study_time": 0, "members_completed": 0})
+        for member_id, week, completions, study_time, last_completed_at in rows:
+            by_member[member_id].append((completions, last_completed_at))
+            weeks[week]["completions"] += completions
+            weeks[week]["study_time"] += study_time
+            weeks[week]["members_completed"] += int(week_finished(week, completions))
+        
+        for member in members:
+            member_rows = by_member.get(member.user_id, [])
+            member.completed_days = sum(completions for completions, _ in member_rows)
+            member.last_completed_at = max((last for _, last in member_rows), default=None)
+            user = users.get(member.user_id)
+            member.total_study_time = (user.total_study_time or 0) if user else 0
+        cohort.member_count = len(members)
+        
+        CohortWeekStat.query.filter_by(cohort_id=cohort.id).delete()
+        if weeks:
+            db.session.execute(insert(CohortWeekStat.__table__),
+                               [{"cohort_id": cohort.id, "week": week, **totals} for week, totals in weeks.items()])
+        db.session.commit()
+        count += 1
+    return count
+
+def percentile(values, pct):
+    # Nearest-rank percentile over an already sorted list
+    if not values:
+        return 0
+    return values[max(0, math.ceil(pct / 100 * len(values)) - 1)]
+
+def pomodoro_stats_key(user_id, data_version):
+    # Every write that changes the stats (sessions, imports, a new timezone)
+    # bumps data_version, so entries cached by any worker go stale with it
+    return f"pomodoro_stats:{user_id}:{data_version}"
+
+WEEKDAY_NAMES = ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday')
+
+def compute_pomodoro_stats(user_id):
+    sessions = PomodoroSession.__table__
+    mine = sessions.c.user_id == user_id
+    completed_minutes = case((sessions.c.completed == true(), sessions.c.duration), else_=0)
+    completed_count = func.sum(case((sessions.c.completed == true(), 1), else_=0))
+    
+    totals = db.session.execute(
+        select(
+            func.count().label('sessions'),
+            func.coalesce(completed_count, 0).label('completed'),
+            func.coalesce(func.sum(completed_minutes), 0).label('minutes'),
+            func.avg(case((sessions.c.completed == true(), sessions.c.duration))).label('average_duration'),
+            func.min(sessions.c.start_time).label('first_start'),
+            func.max(sessions.c.start_time).label('last_start')
+        ).where(mine)
+    ).first()
+    
+    by_type = db.session.execute(
+        select(
+            sessions.c.session_type,
+            func.count().label('sessions'),
+            func.coalesce(completed_count, 0).label('completed'),
+            func.coalesce(func.sum(completed_minutes), 0).label('minutes')
+        ).where(mine).group_by(sessions.c.session_type)
+    ).all()
+    
+    topic = func.coalesce(func.nullif(sessions.c.topic, ''), 'Untitled')
+    by_topic = db.session.execute(
+        select(
+            topic.label('topic'),
+            func.count().label('sessions'),
+            func.coalesce(completed_count, 0).label('completed'),
+            func.coalesce(func.sum(completed_minutes), 0).label('minutes')
+        ).where(mine, sessions.c.session_type == 'study')
+        .group_by(topic).order_by(desc('minutes')).limit(20)
+    ).all()
+    
+    weekday, hour = local_time_parts(sessions.c.start_time, user_zone(user_id), totals.first_start, totals.last_start)
+    by_weekday = [0] * 7
+    by_hour = [0] * 24
+    for bucket, histogram in ((weekday, by_weekday), (hour, by_hour)):
+        for value, minutes in db.session.execute(
+            select(bucket.label('bucket'), func.sum(sessions.c.duration))
+            .where(mine, sessions.c.completed == true(), sessions.c.session_type == 'study')
+            .group_by(bucket)
+        ):
+            histogram[int(value)] = int(minutes or 0)
+    
+    return {
+        "total_sessions": totals.sessions,
+        "completed_sessions": int(totals.completed),
+        "completion_rate": round(int(totals.completed) / totals.sessions, 4) if totals.sessions else 0,
+        "total_minutes": int(totals.minutes),
+        "average_duration": round(float(totals.average_duration), 2) if totals.average_duration is not None else 0,
+        "by_type": {row.session_type or 'study': {
+            "sessions": row.sessions,
+            "completed": int(row.completed),
+            "minutes": int(row.minutes)
+        } for row in by_type},
+        "by_topic": [{
+            "topic": row.topic,
+            "sessions": row.sessions,
+            "completed": int(row.completed),
+            "minutes": int(row.minutes)
+        } for row in by_topic],
+        # Monday first, like the rest of the app
+        "by_weekday": dict(zip(WEEKDAY_NAMES, by_weekday[1:] + by_weekday[:1])),
+        "by_hour": by_hour
+    }
+
+def stored_idempotent_response(user_id, key):
+    previous = IdempotencyKey.query.filter_by(user_id=user_id, key=key).first()
+    if not previous:
+        return None
+    return app.response_class(previous.response, status=previous.status_code, mimetype='application/json')
+
+def after_commit(fn):
+    db.session.info.setdefault('after_commit', []).append(fn)
+
+@event.listens_for(db.session, 'after_commit')
+def run_after_commit_callbacks(session):
+    for fn in session.info.pop('after_commit', []):
+        try:
+            fn()
+        except Exception as e:
+            print(f"After-commit callback failed: {e}")
+
+@event.listens_for(db.session, 'after_rollback')
+def discard_after_commit_callbacks(session):
+    session.info.pop('after_commit', None)
+
+def serialize_note(n):
+    return {
+        "id": n.id,
+        "title": n.title,
+        "content": n.content,
+        "snippet": n.snippet,
+        "tags": n.tags.split(',') if n.tags else [],
+        "week": n.week,
+        "day": n.day,
+        "version": n.version,
+        "created_at": n.created_at.isoformat(),
+        "updated_at": n.updated_at.isoformat()
+    }
+
+def note_plain_text(content):
+    return html.unescape(re.sub(r'<[^>]+>', ' ', content or ''))
+
+def note_snippet(content):
+    text = ' '.join(note_plain_text(content).split())
+    return text[:NOTE_SNIPPET_LENGTH] + "..." if len(text) > NOTE_SNIPPET_LENGTH else text
+
+def note_search_text(content):
+    # LIKE cannot see into compressed bodies. Their distinct words are a
+    # fraction of the text, so they are kept alongside for search.
+    if not content or (len(content) < NOTE_COMPRESSION_THRESHOLD and not content.startswith(COMPRESSED_TEXT_MARKER)):
+        return None
+    return ' '.join(dict.fromkeys(note_plain_text(content).lower().split()))
+
+@event.listens_for(Note.content, 'set')
+def update_note_snippet(note, value, oldvalue, initiator):
+    note.snippet = note_snippet(value)
+    note.search_text = note_search_text(value)
+
+def normalize_tags(tags):
+    # Trimmed, de-duplicated case-insensitively, original order and casing kept
+    if isinstance(tags, str):
+        tags = tags.split(',')
+    normalized = []
+    seen = set()
+    for tag in tags or []:
+        tag = str(tag).strip()[:50]
+        if tag and tag.lower() not in seen:
+            seen.add(tag.lower())
+            normalized.append(tag)
+    return ','.join(normalized)
+
+def tag_keys(tags):
+    return {tag.lower() for tag in tags.split(',')} if tags else set()
+
+def update_tag_index(connection, changes):
+    # changes: (user_id, note_id, old tag keys, new tag keys) per note
+    removed = []
+    added = []
+    deltas = defaultdict(int)
+    for user_id, note_id, old_keys, new_keys in changes:
+        for tag in old_keys - new_keys:
+            removed.append({"old_note_id": note_id, "old_tag": tag})
+            deltas[(user_id, tag)] -= 1
+        for tag in new_keys - old_keys:
+            added.append({"note_id": note_id, "tag": tag, "user_id": user_id})
+            deltas[(user_id, tag)] += 1
+    
+    note_tags = NoteTag.__table__
+    if removed:
+        connection.execute(delete(note_tags).where(
+            note_tags.c.note_id == bindparam('old_note_id'), note_tags.c.tag == bindparam('old_tag')), removed)
+    if added:
+        connection.execute(insert(note_tags), added)
+    for (user_id, tag), delta in deltas.items():
+        if delta:
+            upsert_increment(UserTagCount, {"user_id": user_id, "tag": tag}, {"count": delta}, connection)
+
+@event.listens_for(db.session, 'after_flush')
+def capture_note_tag_changes(session, flush_context):
+    # Runs after the flush so new notes exist before their tags reference them
+    connection = session.connection()
+    changes = []
+    for note in session.new:
+        if isinstance(note, Note):
+            changes.append((note.user_id, note.id, set(), tag_keys(note.tags)))
+    for note in session.dirty:
+        if isinstance(note, Note) and inspect(note).attrs.tags.history.has_changes():
+            old_keys = set(connection.execute(
+                select(NoteTag.tag).where(NoteTag.note_id == note.id)).scalars())
+            changes.append((note.user_id, note.id, old_keys, tag_keys(note.tags)))
+    update_tag_index(connection, changes)
+
+@event.listens_for(db.session, 'before_flush')
+def capture_deleted_note_tags(session, flush_context, instances):
+    # Runs before the flush: once a note's DELETE has run, ON DELETE CASCADE
+    # may already have removed the note_tag rows its counts are taken from
+    deleted = [note for note in session.deleted if isinstance(note, Note)]
+    if not deleted:
+        return
+    connection = session.connection()
+    old_keys = defaultdict(set)
+    for note_id, tag in connection.execute(
+        select(NoteTag.note_id, NoteTag.tag).where(NoteTag.note_id.in_([note.id for note in deleted]))
+    ):
+        old_keys[note_id].add(tag)
+    update_tag_index(connection, [(note.user_id, note.id, old_keys[note.id], set()) for note in deleted])
+
+def note_tag_filter(user_id, tags, match='any'):
+    keys = tag_keys(normalize_tags(tags))
+    tagged = select(NoteTag.note_id).where(NoteTag.user_id == user_id, NoteTag.tag.in_(keys))
+    if match == 'all':
+        tagged = tagged.group_by(NoteTag.note_id).having(func.count() == len(keys))
+    return Note.id.in_(tagged)
+
+def rebuild_tag_index(batch_size=500):
+    # Re-derives note_tag from note.tags in batches, then recounts every
+    # user's tags in one GROUP BY
+    notes = Note.__table__
+    note_tags = NoteTag.__table__
+    last_id = ''
+    indexed = 0
+    while True:
+        batch = db.session.execute(
+            select(notes.c.id, notes.c.user_id, notes.c.tags)
+            .where(notes.c.id > last_id).order_by(notes.c.id).limit(batch_size)
+        ).all()
+        if not batch:
+            break
+        db.session.execute(delete(note_tags).where(note_tags.c.note_id.in_([row.id for row in batch])))
+        rows = [{"note_id": row.id, "tag": tag, "user_id": row.user_id}
+                for row in batch for tag in tag_keys(normalize_tags(row.tags))]
+        if rows:
+            db.session.execute(insert(note_tags), rows)
+        db.session.commit()
+        indexed += len(batch)
+        last_id = batch[-1].id
+    
+    counts = UserTagCount.__table__
+    db.session.execute(delete(counts))
+    db.session.execute(insert(counts).from_select(
+        ['user_id', 'tag', 'count'],
+        select(note_tags.c.user_id, note_tags.c.tag, func.count()).group_by(note_tags.c.user_id, note_tags.c.tag)
+    ))
+    db.session.commit()
+    return indexed
+
+def note_etag(note):
+    return f'"{note.id}:{note.version}"'
+
+def if_match_allows(note):
+    if_match = request.headers.get('If-Match')
+    return if_match is not None and (if_match.strip() == '*' or note_etag(note) in [tag.strip() for tag in if_match.split(',')])
+
+def data_version_etag(fn):
+    # One primary-key lookup decides whether the client's copy is current.
+    # The hour is part of the tag because streaks and "today" figures change
+    # with the clock, not only with writes.
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        user_id = get_jwt_identity()
+        version = db.session.query(User.data_version).filter_by(id=user_id).scalar()
+        if version is None:
+            return fn(*args, **kwargs)
+        g.user_data_version = (user_id, version)
+        etag = f"{user_id}-{version}-{CURRICULUM.version}-{int(time.time()) // 3600}"
+        if request.if_none_match.contains_weak(etag):
+            response = app.response_class(status=304)
+        else:
+            response = app.make_response(fn(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+        response.set_etag(etag, weak=True)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        response.vary.add('Authorization')
+        return response
+    return wrapper
+
+def note_state(note):
+    return {"title": note.title, "content": note.content or '', "tags": note.tags or ''}
+
+def content_tokens(content):
+    # Lines, with HTML additionally split after every tag, since editor
+    # content is often a single very long line
+    return re.split(r'(?<=[>\n])', content)
+
+def diff_content(old, new):
+    # ["=", n] keeps n tokens, ["-", n] drops n, ["+", [tokens]] inserts
+    old_tokens, new_tokens = content_tokens(old), content_tokens(new)
+    ops = []
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, old_tokens, new_tokens, autojunk=False).get_opcodes():
+        if tag == 'equal':
+            ops.append(["=", i2 - i1])
+            continue
+        if i2 > i1:
+            ops.append(["-", i2 - i1])
+        if j2 > j1:
+            ops.append(["+", new_tokens[j1:j2]])
+    return ops
+
+def apply_content_diff(old, ops):
+    old_tokens = content_tokens(old)
+    position = 0
+    output = []
+    for op, value in ops:
+        if op == '=':
+            output.extend(old_tokens[position:position + value])
+            position += value
+        elif op == '-':
+            position += value
+        else:
+            output.extend(value)
+    return ''.join(output)
+
+def add_note_revision(note, version, state, previous_state=None):
+    if previous_state is None or (version - 1) % NOTE_SNAPSHOT_INTERVAL == 0:
+        kind, data = 'snapshot', state
+    else:
+        kind = 'delta'
+        data = {"ops": diff_content(previous_state['content'], state['content'])}
+        data.update({field: state[field] for field in ('title', 'tags') if state[field] != previous_state[field]})
+    db.session.add(NoteRevision(note_id=note.id, version=version, user_id=note.user_id,
+                                kind=kind, data=json.dumps(data, separators=(',', ':'))))
+
+def record_note_update(note, previous_state, previous_version):
+    # Notes written before revisions existed get their current state as a
+    # starting snapshot
+    if not db.session.get(NoteRevision, (note.id, previous_version)):
+        add_note_revision(note, previous_version, previous_state)
+    add_note_revision(note, previous_version + 1, note_state(note), previous_state)
+
+def apply_text_ops(text, ops):
+    # ["=", n] keeps n characters, ["-", n] deletes n, ["+", text] inserts;
+    # whatever is left after the last op is kept. Offsets count UTF-16 code
+    # units, as JavaScript string indices do.
+    if not isinstance(ops, list):
+        raise ValueError("ops must be a list")
+    source = text.encode('utf-16-le', 'surrogatepass')
+    output = []
+    position = 0
+    for op in ops:
+        if not isinstance(op, list) or len(op) != 2:
+            raise ValueError("each op must be a [kind, value] pair")
+        kind, value = op
+        if kind == '+' and isinstance(value, str):
+            output.append(value.encode('utf-16-le', 'surrogatepass'))
+            continue
+        if kind not in ('=', '-') or not isinstance(value, int) or value < 0:
+            raise ValueError(f"invalid op {op!r}")
+        end = position + value * 2
+        if end > len(source):
+            raise ValueError("ops run past the end of the note")
+        if kind == '=':
+            output.append(source[position:end])
+        position = end
+    output.append(source[position:])
+    return b''.join(output).decode('utf-16-le')
+
+def apply_note_fields(note, data):
+    note.title = data.get('title', note.title)
+    if 'tags' in data:
+        note.tags = normalize_tags(data['tags'])
+    note.week = data.get('week', note.week)
+    note.day = data.get('day', note.day)
+    note.updated_at = datetime.utcnow()
+
+def note_at_version(note_id, version):
+    snapshot_version = db.session.query(func.max(NoteRevision.version)).filter(
+        NoteRevision.note_id == note_id, NoteRevision.version <= version, NoteRevision.kind == 'snapshot'
+    ).scalar()
+    if snapshot_version is None:
+        return None
+    revisions = NoteRevision.query.filter(
+        NoteRevision.note_id == note_id, NoteRevision.version.between(snapshot_version, version)
+    ).order_by(NoteRevision.version).all()
+    if not revisions or revisions[-1].version != version:
+        return None
+    
+    state = None
+    for revision in revisions:
+        data = json.loads(revision.data)
+        if revision.kind == 'snapshot':
+            state = data
+            continue
+        state = {
+            "title": data.get('title', state['title']),
+            "content": apply_content_diff(state['content'], data['ops']),
+            "tags": data.get('tags', state['tags'])
+        }
+    return state
+
+def serialize_note_summary(n):
+    # For list views, which query with content deferred
+    return {
+        "id": n.id,
+        "title": n.title,
+        "snippet": n.snippet if n.snippet is not None else note_snippet(n.content),
+        "tags": n.tags.split(',') if n.tags else [],
+        "week": n.week,
+        "day": n.day,
+        "created_at": n.created_at.isoformat(),
+        "updated_at": n.updated_at.isoformat()
+    }
+
+def note_search_condition(term):
+    # Compressed bodies are matched on their distinct words: every word of the
+    # term has to appear, though not necessarily as a phrase
+    words = term.lower().split()
+    return or_(
+        Note.title.contains(term),
+        and_(~Note.content.startswith(COMPRESSED_TEXT_MARKER), Note.content.contains(term)),
+        Note.tags.contains(term),
+        and_(*(Note.search_text.contains(word) for word in words)) if words else false()
+    )
+
+def backfill_note_storage(batch_size=500):
+    # Fills snippets and search text for notes written before those columns
+    # existed and rewrites bodies so that large ones are stored compressed
+    notes = Note.__table__
+    last_id = ''
+    updated = 0
+    while True:
+        batch = db.session.execute(
+            select(notes.c.id, notes.c.content).where(notes.c.id > last_id).order_by(notes.c.id).limit(batch_size)
+        ).all()
+        if not batch:
+            return updated
+        db.session.execute(
+            update(notes).where(notes.c.id == bindparam('note_id'))
+            .values(content=bindparam('body'), snippet=bindparam('summary'), search_text=bindparam('words')),
+            [{"note_id": note_id, "body": content, "summary": note_snippet(content), "words": note_search_text(content)}
+             for note_id, content in batch]
+        )
+        db.session.commit()
+        updated += len(batch)
+        last_id = batch[-1].id
+
+def serialize_progress(p):
+    return {
+        "id": p.id,
+        "week": p.week,
+        "day": p.day,
+        "completed": p.completed,
+        "completion_date": p.completion_date.isoformat() if p.completion_date else None,
+        "time_spent": p.time_spent,
+        "notes": p.notes
+    }
+
+def serialize_pomodoro_session(s):
+    return {
+        "id": s.id,
+        "start_time": s.start_time.isoformat(),
+        "end_time": s.end_time.isoformat() if s.end_time else None,
+        "duration": s.duration,
+        "completed": s.completed,
+        "topic": s.topic,
+        "session_type": s.session_type
+    }
+
+def serialize_notification(n):
+    return {
+        "id": n.id,
+        "title": n.title,
+        "message": n.message,
+        "type": n.type,
+        "is_read": n.is_read,
+        "created_at": n.created_at.isoformat()
+    }
+
+def serialize_ai_conversation(c):
+    return {
+        "id": c.id,
+        "question": c.question,
+        "answer": c.answer,
+        "citations": json.loads(c.citations) if c.citations else [],
+        "created_at": c.created_at.isoformat() if c.created_at else None
+    }
+
+def serialize_preferences(p):
+    return {
+        "id": p.id,
+        "theme": p.theme,
+        "layout": p.layout,
+        "notifications_enabled": p.notifications_enabled,
+        "email_notifications": p.email_notifications,
+        "accessibility_mode": p.accessibility_mode,
+        "language": p.language,
+        "timezone": p.timezone
+    }
+
+# Change feed: every insert, update and delete of these models is appended to
+# the owner's ChangeLog under a per-user sequence number, which GET /sync uses
+# as its cursor.
+SYNC_ENTITIES = {
+    'note': (Note, serialize_note),
+    'progress': (Progress, serialize_progress),
+    'pomodoro_session': (PomodoroSession, serialize_pomodoro_session),
+    'notification': (Notification, serialize_notification),
+    'preferences': (UserPreferences, serialize_preferences),
+}
+SYNC_ENTITY_NAMES = {model: entity for entity, (model, _) in SYNC_ENTITIES.items()}
+
+def log_changes(connection, user_id, changes):
+    if not changes:
+        return
+    
+    # Bumping the counter locks the user row until commit, so one user's
+    # sequence numbers always become visible in order
+    users = User.__table__
+    forget_cached_entities(User, [user_id])
+    connection.execute(update(users).where(users.c.id == user_id)
+                       .values(change_seq=func.coalesce(users.c.change_seq, 0) + len(changes),
+                               data_version=func.coalesce(users.c.data_version, 0) + 1))
+    last_seq = connection.execute(select(users.c.change_seq).where(users.c.id == user_id)).scalar()
+    if last_seq is None:
+        # The user row itself is not written yet; there is nothing to sync from
+        return
+    
+    first_seq = last_seq - len(changes) + 1
+    now = datetime.utcnow()
+    connection.execute(insert(ChangeLog.__table__), [{
+        "user_id": user_id,
+        "seq": first_seq + i,
+        "entity": entity,
+        "entity_id": entity_id,
+        "op": op,
+        "created_at": now
+    } for i, (entity, entity_id, op) in enumerate(changes)])
+
+@event.listens_for(db.session, 'before_flush')
+def capture_sync_changes(session, flush_context, instances):
+    changes = defaultdict(list)
+    touched = set()
+    
+    for op, objects in (('upsert', session.new), ('upsert', session.dirty), ('delete', session.deleted)):
+        for obj in objects:
+            if op == 'upsert' and obj in session.dirty and not session.is_modified(obj, include_collections=False):
+                continue
+            entity = SYNC_ENTITY_NAMES.get(type(obj))
+            if not entity:
+                if isinstance(obj, User):
+                    touched.add(obj.id)
+                elif getattr(obj, 'user_id', None):
+                    touched.add(obj.user_id)
+                continue
+            if obj.id is None:
+                obj.id = str(uuid.uuid4())
+            changes[obj.user_id].append((entity, obj.id, op))
+    
+    for user_id, user_changes in changes.items():
+        log_changes(session.connection(), user_id, user_changes)
+    
+    # log_changes already bumped the data version of users with synced changes
+    touched.difference_update(changes)
+    if touched:
+        users = User.__table__
+        forget_cached_entities(User, touched)
+        session.connection().execute(update(users).where(users.c.id.in_(touched))
+                                     .values(data_version=func.coalesce(users.c.data_version, 0) + 1))
+
+# Export/Import
+# Record types of the NDJSON export, each line being {"type": ..., "data": ...}
+EXPORT_ENTITIES = {
+    'note': (Note, serialize_note, 'notes.ndjson'),
+    'progress': (Progress, serialize_progress, 'progress.ndjson'),
+    'pomodoro_session': (PomodoroSession, serialize_pomodoro_session, 'pomodoro_sessions.ndjson'),
+    'ai_conversation': (AIConversation, serialize_ai_conversation, 'ai_conversations.ndjson'),
+}
+
+class StreamBuffer:
+    # Write-only file object without tell/seek, so zipfile writes a streamable
+    # archive (data descriptors after each member) that can be drained as it grows
+    def __init__(self):
+        self._chunks = []
+        self.size = 0
+    
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+    
+    def flush(self):
+        pass
+    
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        self.size = 0
+        return data
+
+def export_lines(user_id, entity):
+    # Core rows rather than ORM objects, fetched through a server-side cursor
+    # where the driver supports it, so memory stays flat for large accounts
+    model, serializer, _ = EXPORT_ENTITIES[entity]
+    table = model.__table__
+    result = db.session.execute(
+        select(table).where(table.c.user_id == user_id).order_by(table.c.id)
+        .execution_options(stream_results=True, yield_per=EXPORT_FETCH_SIZE)
+    )
+    for row in result:
+        yield json.dumps({"type": entity, "data": serializer(row)}) + "\n"
+
+def export_header(user_id):
+    return json.dumps({"type": "export", "data": {
+        "version": 1,
+        "user_id": user_id,
+        "exported_at": datetime.utcnow().isoformat()
+    }}) + "\n"
+
+def parse_import_datetime(value):
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+def import_id(value):
+    try:
+        return str(uuid.UUID(str(value)))
+    except ValueError:
+        return str(uuid.uuid4())
+
+def import_row(user_id, entity, data):
+    # Records keep their exported ids, so importing a file again can tell what
+    # is already there; DataImporter.claim_ids settles ids that are taken
+    row = {"id": import_id(data.get('id')), "user_id": user_id}
+    if entity == 'note':
+        tags = data.get('tags') or []
+        row.update(
+            title=str(data['title'])[:200],
+            content=data.get('content') or '',
+            snippet=note_snippet(data.get('content')),
+            search_text=note_search_text(data.get('content')),
+            tags=normalize_tags(tags),
+            week=data.get('week'),
+            day=data.get('day'),
+            created_at=parse_import_datetime(data.get('created_at')) or datetime.utcnow(),
+            updated_at=parse_import_datetime(data.get('updated_at')) or datetime.utcnow()
+        )
+    elif entity == 'progress':
+        row.update(
+            week=int(data['week']),
+            day=str(data['day']),
+            completed=bool(data.get('completed', False)),
+            completion_date=parse_import_datetime(data.get('completion_date')),
+            time_spent=int(data.get('time_spent') or 0),
+            notes=data.get('notes') or ''
+        )
+        if row['completed'] and not row['completion_date']:
+            row['completion_date'] = datetime.utcnow()
+    elif entity == 'pomodoro_session':
+        row.update(
+            start_time=parse_import_datetime(data['start_time']),
+            end_time=parse_import_datetime(data.get('end_time')),
+            duration=int(data.get('duration') or 0),
+            completed=bool(data.get('completed', False)),
+            topic=data.get('topic') or '',
+            session_type=data.get('session_type') or 'study'
+        )
+    else:
+        row.update(
+            question=data['question'],
+            answer=data['answer'],
+            citations=json.dumps(data.get('citations') or []),
+            created_at=parse_import_datetime(data.get('created_at')) or datetime.utcnow()
+        )
+    return row
+
+class DataImporter:
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.zone = user_zone(user_id)
+        self.pending = defaultdict(list)
+        self.imported = defaultdict(int)
+        self.skipped = defaultdict(int)
+        self.study_time = 0
+        self.completed = []
+        self.activity = defaultdict(lambda: {"completions": 0, "pomodoros": 0})
+        self.rollups = defaultdict(lambda: dict.fromkeys(ROLLUP_METRICS, 0))
+        self.progress_keys = set()
+        self.seen_ids = set()
+    
+    def add(self, entity, data):
+        self.pending[entity].append(import_row(self.user_id, entity, data))
+        if sum(len(rows) for rows in self.pending.values()) >= IMPORT_BATCH_SIZE:
+            self.flush()
+    
+    def count(self, when, **increments):
+        local = when.replace(tzinfo=timezone.utc).astimezone(self.zone)
+        for column, amount in increments.items():
+            self.rollups[(local.date(), local.hour)][column] += amount
+            if column in ('completions', 'pomodoros'):
+                self.activity[local.date()][column] += amount
+    
+    def claim_ids(self, entity, rows):
+        # A row whose id this user already has was imported before and is
+        # skipped. An id that belongs to another account (another account's
+        # export) is replaced by one derived from it and this user, so that
+        # importing the same file again finds those rows too.
+        model = EXPORT_ENTITIES[entity][0]
+        
+        def owners(ids):
+            return dict(db.session.execute(select(model.id, model.user_id).where(model.id.in_(ids))).all())
+        
+        taken = owners([row['id'] for row in rows])
+        derived = []
+        for row in rows:
+            if row['id'] in taken and taken[row['id']] != self.user_id:
+                row['id'] = str(uuid.uuid5(uuid.NAMESPACE_URL, f"import:{self.user_id}:{row['id']}"))
+                derived.append(row['id'])
+        if derived:
+            taken.update(owners(derived))
+        
+        kept = []
+        for row in rows:
+            if taken.get(row['id']) == self.user_id or row['id'] in self.seen_ids:
+                self.skipped[entity] += 1
+                continue
+            if row['id'] in taken:
+                row['id'] = str(uuid.uuid4())
+            self.seen_ids.add(row['id'])
+            kept.append(row)
+        return kept
+    
+    def flush(self):
+        # Batches are written as they fill up but only committed by finish(),
+        # so an import that fails part way leaves nothing behind
+        rows_by_entity, self.pending = self.pending, defaultdict(list)
+        rows_by_entity = {entity: self.claim_ids(entity, rows) for entity, rows in rows_by_entity.items() if rows}
+        
+        progress = rows_by_entity.get('progress')
+        if progress:
+            # A day that is already tracked keeps its existing progress
+            candidates = {(row['week'], row['day']) for row in progress} - self.progress_keys
+            existing = set(db.session.execute(
+                select(Progress.week, Progress.day).where(
+                    Progress.user_id == self.user_id,
+                    tuple_(Progress.week, Progress.day).in_(list(candidates))
+                )
+            ).all()) if candidates else set()
+            kept = []
+            for row in progress:
+                key = (row['week'], row['day'])
+                if key in existing or key in self.progress_keys:
+                    self.skipped['progress'] += 1
+                    continue
+                self.progress_keys.add(key)
+                kept.append(row)
+            rows_by_entity['progress'] = kept
+        
+        changes = []
+        for entity, rows in rows_by_entity.items():
+            if not rows:
+                continue
+            model = EXPORT_ENTITIES[entity][0]
+            db.session.execute(insert(model.__table__), rows)
+            self.imported[entity] += len(rows)
+            if entity in SYNC_ENTITIES:
+                changes.extend((entity, row['id'], 'upsert') for row in rows)
+            if entity == 'note':
+                update_tag_index(db.session.connection(),
+                                 [(self.user_id, row['id'], set(), tag_keys(row['tags'])) for row in rows])
+            
+            for row in rows:
+                if entity == 'note':
+                    self.count(row['created_at'], notes_created=1)
+                elif entity == 'progress' and row['completed']:
+                    self.study_time += row['time_spent']
+                    self.completed.append((row['week'], 1, row['time_spent']))
+                    self.count(row['completion_date'], study_minutes=row['time_spent'], completions=1)
+                elif entity == 'pomodoro_session' and row['completed'] and row['session_type'] == 'study':
+                    self.count(row['end_time'] or row['start_time'], pomodoros=1)
+        
+        log_changes(db.session.connection(), self.user_id, changes)
+    
+    def finish(self):
+        self.flush()
+        
+        # Derived per-day tables and user stats are brought up to date once,
+        # after all rows are in
+        for local_date, counts in self.activity.items():
+            record_daily_activity(self.user_id, local_date, **counts)
+        for (local_date, hour), counts in self.rollups.items():
+            upsert_increment(UserDailyRollup,
+                             {"user_id": self.user_id, "local_date": local_date, "hour": hour}, counts)
+        
+        user = get_user(self.user_id)
+        user.total_study_time = func.coalesce(User.total_study_time, 0) + self.study_time
+        refresh_user_streak(user, self.zone)
+        record_cohort_progress(self.user_id, self.completed)
+        db.session.flush()
+        user_id, total_study_time = user.id, user.total_study_time
+        after_commit(lambda: update_leaderboards(user_id, total_study_time, 0))
+        db.session.commit()
+        
+        return {"imported": dict(self.imported), "skipped": dict(self.skipped)}
+
+# Account Deletion
+# DELETE /account only detaches the user; the rows are purged later, table by
+# table in chunks of ACCOUNT_PURGE_CHUNK_SIZE, each chunk in its own short
+# transaction. Children come before their parents so foreign keys hold throughout.
+def owned_cohorts(user_id):
+    return select(Cohort.id).where(Cohort.owner_id == user_id)
+
+ACCOUNT_PURGE_STEPS = (
+    ('note_revision', NoteRevision, lambda user_id: NoteRevision.user_id == user_id),
+    ('note_tag', NoteTag, lambda user_id: NoteTag.user_id == user_id),
+    ('user_tag_count', UserTagCount, lambda user_id: UserTagCount.user_id == user_id),
+    ('note', Note, lambda user_id: Note.user_id == user_id),
+    ('progress', Progress, lambda user_id: Progress.user_id == user_id),
+    ('pomodoro_session', PomodoroSession, lambda user_id: PomodoroSession.user_id == user_id),
+    ('notification', Notification, lambda user_id: Notification.user_id == user_id),
+    ('ai_conversation', AIConversation, lambda user_id: AIConversation.user_id == user_id),
+    ('user_session', UserSession, lambda user_id: UserSession.user_id == user_id),
+    ('password_reset', PasswordReset, lambda user_id: PasswordReset.user_id == user_id),
+    ('idempotency_key', IdempotencyKey, lambda user_id: IdempotencyKey.user_id == user_id),
+    ('change_log', ChangeLog, lambda user_id: ChangeLog.user_id == user_id),
+    ('user_daily_activity', UserDailyActivity, lambda user_id: UserDailyActivity.user_id == user_id),
+    ('user_daily_rollup', UserDailyRollup, lambda user_id: UserDailyRollup.user_id == user_id),
+    ('leaderboard_entry', LeaderboardEntry, lambda user_id: LeaderboardEntry.user_id == user_id),
+    ('cohort_member', CohortMember, lambda user_id: or_(
+        CohortMember.user_id == user_id, CohortMember.cohort_id.in_(owned_cohorts(user_id)))),
+    ('cohort_week_stat', CohortWeekStat, lambda user_id: CohortWeekStat.cohort_id.in_(owned_cohorts(user_id))),
+    ('cohort', Cohort, lambda user_id: Cohort.owner_id == user_id),
+    ('user_preferences', UserPreferences, lambda user_id: UserPreferences.user_id == user_id),
+    ('user', User, lambda user_id: User.id == user_id),
+)
+
+def delete_chunk(model, condition, chunk_size):
+    table = model.__table__
+    key = list(table.primary_key.columns)
+    chunk = select(*key).where(condition).limit(chunk_size)
+    target = key[0].in_(chunk) if len(key) == 1 else tuple_(*key).in_(chunk)
+    return db.session.execute(delete(table).where(target)).rowcount
+
+def serialize_account_deletion(deletion):
+    return {
+        "id": deletion.id,
+        "status": deletion.status,
+        "current_table": deletion.current_table,
+        "deleted_rows": json.loads(deletion.deleted_rows or '{}'),
+        "requested_at": deletion.requested_at.isoformat(),
+        "updated_at": deletion.updated_at.isoformat() if deletion.updated_at else None,
+        "completed_at": deletion.completed_at.isoformat() if deletion.completed_at else None
+    }
+
+def detach_account(user):
+    # Everything that must stop immediately; the bulk of the rows wait for the purge
+    now = datetime.utcnow()
+    original_email = user.email
+    user.deleted_at = now
+    user.email = f"deleted+{user.id}@invalid"
+    user.calendar_token = None
+    
+    session_ids = db.session.execute(
+        select(UserSession.id).where(UserSession.user_id == user.id, UserSession.is_active == true())
+    ).scalars().all()
+    db.session.execute(update(UserSession).where(UserSession.user_id == user.id)
+                       .values(is_active=False).execution_options(synchronize_session=False))
+    EmailOutbox.query.filter(EmailOutbox.to_email == original_email,
+                             EmailOutbox.status.in_(('pending', 'sending'))).delete(synchronize_session=False)
+    for member in CohortMember.query.filter_by(user_id=user.id).all():
+        remove_cohort_member(db.session.get(Cohort, member.cohort_id), member)
+    
+    deletion = AccountDeletion(user_id=user.id, requested_at=now, updated_at=now)
+    db.session.add(deletion)
+    
+    user_id = user.id
+    def forget():
+        for session_id in session_ids:
+            cache.set(session_state_key(session_id), False, ttl=refresh_token_lifetime())
+        for leaderboard in list(_leaderboards.values()):
+            leaderboard.set_score(user_id, 0)
+        cache.delete(calendar_feed_key(user_id))
+    after_commit(forget)
+    return deletion
+
+def claim_account_deletion(deletion_id):
+    now = datetime.utcnow()
+    deletions = AccountDeletion.__table__
+    result = db.session.execute(
+        update(deletions).where(
+            deletions.c.id == deletion_id,
+            deletions.c.status != 'completed',
+            or_(deletions.c.claimed_until.is_(None), deletions.c.claimed_until < now)
+        ).values(status='running', claimed_until=now + timedelta(seconds=ACCOUNT_PURGE_LEASE_SECONDS))
+    )
+    db.session.commit()
+    return result.rowcount == 1
+
+def purge_account(deletion, chunk_size=ACCOUNT_PURGE_CHUNK_SIZE, progress=None):
+    # Safe to resume after a crash: every step just deletes whatever is left
+    counts = json.loads(deletion.deleted_rows or '{}')
+    for name, model, condition in ACCOUNT_PURGE_STEPS:
+        while True:
+            deleted = delete_chunk(model, condition(deletion.user_id), chunk_size)
+            now = datetime.utcnow()
+            counts[name] = counts.get(name, 0) + deleted
+            deletion.current_table = name
+            deletion.deleted_rows = json.dumps(counts)
+            deletion.updated_at = now
+            deletion.claimed_until = now + timedelta(seconds=ACCOUNT_PURGE_LEASE_SECONDS)
+            db.session.commit()
+            if progress:
+                progress(deletion)
+            if deleted < chunk_size:
+                break
+    
+    cache.delete(entity_cache_key(User, deletion.user_id), entity_cache_key(UserPreferences, deletion.user_id))
+    deletion.status = 'completed'
+    deletion.current_table = None
+    deletion.completed_at = datetime.utcnow()
+    deletion.claimed_until = None
+    db.session.commit()
+    return counts
+
+@background_task(ACCOUNT_PURGE_INTERVAL)
+def purge_deleted_accounts(chunk_size=ACCOUNT_PURGE_CHUNK_SIZE, progress=None):
+    pending = db.session.execute(
+        select(AccountDeletion.id).where(AccountDeletion.status != 'completed')
+        .order_by(AccountDeletion.requested_at)
+    ).scalars().all()
+    purged = 0
+    for deletion_id in pending:
+        # Another worker may hold the claim; skip it rather than purge twice
+        if not claim_account_deletion(deletion_id):
+            continue
+        purge_account(db.session.get(AccountDeletion, deletion_id), chunk_size, progress)
+        purged += 1
+    return purged
+
+# Data Retention
+# name -> (model, condition for rows older than the cutoff, archive before deleting)
+RETENTION_POLICIES = {
+    'password_reset': (PasswordReset, lambda cutoff: or_(PasswordReset.used == true(), PasswordReset.expires_at < cutoff), False),
+    'user_session': (UserSession, lambda cutoff: and_(
+        UserSession.last_activity < cutoff,
+        # Active sessions are only dead once their refresh token can no longer be used
+        or_(UserSession.is_active == false(),
+            UserSession.last_activity < datetime.utcnow() - app.config['JWT_REFRESH_TOKEN_EXPIRES'])
+    ), False),
+    'notification': (Notification, lambda cutoff: and_(Notification.is_read == true(), Notification.created_at < cutoff), True),
+    'ai_conversation': (AIConversation, lambda cutoff: AIConversation.created_at < cutoff, True),
+    'idempotency_key': (IdempotencyKey, lambda cutoff: IdempotencyKey.created_at < cutoff, False),
+    # Sync clients whose cursor predates the oldest kept entry get a reset
+    'change_log': (ChangeLog, lambda cutoff: ChangeLog.created_at < cutoff, False),
+    'email_outbox': (EmailOutbox, lambda cutoff: and_(EmailOutbox.status.in_(('sent', 'failed')), EmailOutbox.created_at < cutoff), False),
+    'account_deletion': (AccountDeletion, lambda cutoff: and_(
+        AccountDeletion.status == 'completed', AccountDeletion.completed_at < cutoff), False),
+}
+
+def archive_value(value):
+    return value.isoformat() if isinstance(value, (datetime, date)) else str(value)
+
+def archive_path(name, now):
+    return os.path.join(RETENTION_ARCHIVE_DIR, name, f"{name}-{now.strftime('%Y%m%dT%H%M%S')}.ndjson.gz")
+
+def apply_retention_policy(name, batch_size=RETENTION_BATCH_SIZE):
+    model, condition, archive = RETENTION_POLICIES[name]
+    days = RETENTION_DAYS[name]
+    stats = {"deleted": 0, "archive": None}
+    if days < 0:
+        return stats
+    
+    now = datetime.utcnow()
+    table = model.__table__
+    key = list(table.primary_key.columns)
+    # Deletions of synced rows are logged so /sync clients drop them too
+    entity = SYNC_ENTITY_NAMES.get(model)
+    columns = table.c if archive else key + ([table.c.user_id] if entity else [])
+    query = select(*columns).where(condition(now - timedelta(days=days)))\
+        .order_by(*key).limit(batch_size)
+    if db_dialect() == 'postgresql':
+        # Lets every worker run the job without archiving the same rows twice
+        query = query.with_for_update(skip_locked=True)
+    
+    archive_file = None
+    def write_archive(rows):
+        nonlocal archive_file
+        if archive_file is None:
+            stats["archive"] = archive_path(name, now)
+            os.makedirs(os.path.dirname(stats["archive"]), exist_ok=True)
+            archive_file = gzip.open(stats["archive"], 'at', encoding='utf-8')
+        # Written out before the delete commits: a crash in between
+        # can only repeat rows in an archive, never lose them
+        archive_file.write(''.join(json.dumps(dict(row._mapping), default=archive_value) + "\n" for row in rows))
+        archive_file.flush()
+    
+    try:
+        if name in PARTITIONED_TABLES and db_dialect() == 'postgresql' and is_partitioned(db.session.connection(), name):
+            # Whole months past the cutoff go at once; only the partly
+            # expired month is left to the batched deletes below. This relies
+            # on the policy expiring rows by the partition column alone.
+            column = table.c[PARTITIONED_TABLES[name]]
+            for month in expired_partitions(name, now - timedelta(days=days)):
+                in_month = and_(column >= month, column < add_months(month, 1))
+                if archive:
+                    result = db.session.execute(select(table).where(in_month).order_by(*key)
+                                                .execution_options(stream_results=True, yield_per=batch_size))
+                    for rows in result.partitions():
+                        write_archive(rows)
+                stats["deleted"] += db.session.execute(select(func.count()).select_from(table).where(in_month)).scalar()
+                drop_partition(name, month)
+        
+        while True:
+            rows = db.session.execute(query).all()
+            if not rows:
+                break
+            if archive:
+                write_archive(rows)
+            keys = [tuple(row._mapping[column.name] for column in key) for row in rows]
+            target = key[0].in_([k[0] for k in keys]) if len(key) == 1 else tuple_(*key).in_(keys)
+            db.session.execute(delete(table).where(target))
+            if entity:
+                deleted_by_user = defaultdict(list)
+                for row in rows:
+                    deleted_by_user[row.user_id].append((entity, row.id, 'delete'))
+                for user_id, changes in deleted_by_user.items():
+                    log_changes(db.session.connection(), user_id, changes)
+            db.session.commit()
+            stats["deleted"] += len(rows)
+            if len(rows) < batch_size:
+                break
+    finally:
+        if archive_file is not None:
+            archive_file.close()
+    return stats
+
+@background_task(RETENTION_INTERVAL)
+def enforce_retention(batch_size=RETENTION_BATCH_SIZE):
+    report = {name: apply_retention_policy(name, batch_size) for name in RETENTION_POLICIES}
+    reclaimed = {name: stats["deleted"] for name, stats in report.items() if stats["deleted"]}
+    if reclaimed:
+        print(f"Retention reclaimed {sum(reclaimed.values())} rows: {reclaimed}")
+    return report
+
+# Calendar Feed
+# The rendered events of each user's feed are cached together with the change
+# log position they reflect; later requests re-render only the progress days
+# and pomodoro sessions that changed since.
+def calendar_feed_key(user_id):
+    return f"calendar_feed:{user_id}"
+
+def calendar_window_start(now=None):
+    # Day-aligned, so sessions leaving the window cost one full re-render a day
+    first_day = (now or datetime.utcnow()).date() - timedelta(days=CALENDAR_FEED_POMODORO_DAYS)
+    return datetime(first_day.year, first_day.month, first_day.day)
+
+def calendar_etag(user_id, seq, window_start):
+    return f"{user_id}-{seq}-{CURRICULUM.version}-{window_start.strftime('%Y%m%d')}"
+
+def ics_escape(text):
+    return (text or '').replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
+
+def ics_fold(line):
+    # Content lines are limited to 75 octets; continuations start with a space
+    encoded = line.encode('utf-8')
+    if len(encoded) <= 75:
+        return line
+    parts = []
+    while encoded:
+        limit = 75 if not parts else 74
+        cut = min(limit, len(encoded))
+        while cut < len(encoded) and (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(encoded[:cut].decode('utf-8'))
+        encoded = encoded[cut:]
+    return '\r\n '.join(parts)
+
+def ics_event(uid, fields):
+    lines = ['BEGIN:VEVENT', f'UID:{uid}', f"DTSTAMP:{datetime.utcnow().strftime('%Y%m%dT%H%M%SZ')}"]
+    lines += [f'{name}:{value}' for name, value in fields]
+    lines.append('END:VEVENT')
+    return '\r\n'.join(ics_fold(line) for line in lines)
+
+def roadmap_start_date(user, zone):
+    # Week 1 is scheduled for the week the user signed up
+    signed_up = local_date_for(zone, user.created_at)
+    return signed_up - timedelta(days=signed_up.weekday())
+
+def roadmap_day_event(start_date, week, day, progress):
+    day_info = CURRICULUM.days[(week, day)]
+    scheduled = start_date + timedelta(weeks=week - 1, days=CURRICULUM_DAYS.index(day))
+    done = progress is not None and progress.completed
+    return ics_event(f"roadmap-{week}-{day}@dsa-learning", [
+        ('DTSTART;VALUE=DATE', scheduled.strftime('%Y%m%d')),
+        ('DTEND;VALUE=DATE', (scheduled + timedelta(days=1)).strftime('%Y%m%d')),
+        ('SUMMARY', ics_escape(f"{'✓ ' if done else ''}Week {week}: {day_info['topic']}")),
+        ('DESCRIPTION', ics_escape(f"{day_info['activities']}\nEstimated time: {day_info['time_estimate']} min")),
+        ('TRANSP', 'TRANSPARENT')
+    ])
+
+def pomodoro_event(session):
+    end_time = session.end_time or session.start_time + timedelta(minutes=session.duration)
+    return ics_event(f"pomodoro-{session.id}@dsa-learning", [
+        ('DTSTART', session.start_time.strftime('%Y%m%dT%H%M%SZ')),
+        ('DTEND', end_time.strftime('%Y%m%dT%H%M%SZ')),
+        ('SUMMARY', ics_escape(f"Pomodoro: {session.topic or session.session_type or 'study'}"))
+    ])
+
+def render_calendar_events(user, zone, window_start):
+    start_date = roadmap_start_date(user, zone)
+    progress = {(p.week, p.day): p for p in Progress.query.filter_by(user_id=user.id).all()}
+    events = {}
+    for week, day in CURRICULUM.days:
+        events[f"roadmap-{week}-{day}@dsa-learning"] = roadmap_day_event(start_date, week, day, progress.get((week, day)))
+    
+    sessions = PomodoroSession.query.filter(
+        PomodoroSession.user_id == user.id,
+        PomodoroSession.completed == true(),
+        PomodoroSession.start_time >= window_start
+    ).all()
+    for session in sessions:
+        events[f"pomodoro-{session.id}@dsa-learning"] = pomodoro_event(session)
+    return events
+
+def update_calendar_events(user, zone, feed, window_start):
+    # Applies the change log since the cached position; returns None when
+    # the cached events cannot be brought up to date incrementally
+    rows = ChangeLog.query.filter(ChangeLog.user_id == user.id, ChangeLog.seq > feed['seq'])\
+        .order_by(ChangeLog.seq).all()
+    if not rows or rows[0].seq != feed['seq'] + 1:
+        return None
+    
+    changed = defaultdict(dict)
+    for row in rows:
+        changed[row.entity][row.entity_id] = row.op
+    if 'preferences' in changed or 'delete' in changed.get('progress', {}).values():
+        return None
+    
+    # The in-memory cache hands out the cached dict itself
+    events = dict(feed['events'])
+    start_date = roadmap_start_date(user, zone)
+    if changed.get('progress'):
+        for p in Progress.query.filter(Progress.user_id == user.id, Progress.id.in_(list(changed['progress']))).all():
+            if (p.week, p.day) in CURRICULUM.days:
+                events[f"roadmap-{p.week}-{p.day}@dsa-learning"] = roadmap_day_event(start_date, p.week, p.day, p)
+    
+    if changed.get('pomodoro_session'):
+        sessions = {s.id: s for s in PomodoroSession.query.filter(
+            PomodoroSession.user_id == user.id, PomodoroSession.id.in_(list(changed['pomodoro_session']))).all()}
+        for session_id in changed['pomodoro_session']:
+            session = sessions.get(session_id)
+            uid = f"pomodoro-{session_id}@dsa-learning"
+            if session and session.completed and session.start_time >= window_start:
+                events[uid] = pomodoro_event(session)
+            else:
+                events.pop(uid, None)
+    return events
+
+def calendar_feed(user):
+    zone = user_zone(user.id)
+    key = calendar_feed_key(user.id)
+    current_seq = user.change_seq or 0
+    window_start = calendar_window_start()
+    window = window_start.isoformat()
+    feed = cache.get(key)
+    
+    # A moved window start drops old sessions, which only a full render does
+    if feed and (feed.get('zone'), feed.get('version'), feed.get('window')) == (str(zone), CURRICULUM.version, window):
+        if feed['seq'] == current_seq:
+            return feed
+        events = update_calendar_events(user, zone, feed, window_start)
+    else:
+        events = None
+    if events is None:
+        events = render_calendar_events(user, zone, window_start)
+    
+    feed = {"seq": current_seq, "zone": str(zone), "version": CURRICULUM.version, "window": window, "events": events}
+    cache.set(key, feed, ttl=CALENDAR_FEED_TTL)
+    return feed
+
+def notification_channel(user_id):
+    return f"notifications:{user_id}"
+
+def adjust_unread_notifications(user_id, delta):
+    users = User.__table__
+    forget_cached_entities(User, [user_id])
+    db.session.execute(update(users).where(users.c.id == user_id).values(
+        unread_notifications=sql_greatest(func.coalesce(users.c.unread_notifications, 0) + delta, 0),
+        data_version=func.coalesce(users.c.data_version, 0) + 1
+    ))
+    return db.session.query(User.unread_notifications).filter_by(id=user_id).scalar() or 0
+
+def recount_unread_notifications():
+    # Sets the counter from notification.is_read, for rows written before the
+    # counter existed or after it drifted; only users whose count is off are touched
+    users = User.__table__
+    notifications = Notification.__table__
+    unread = select(func.count()).where(
+        notifications.c.user_id == users.c.id, notifications.c.is_read.is_not(true())
+    ).scalar_subquery()
+    result = db.session.execute(
+        update(users).where(func.coalesce(users.c.unread_notifications, 0) != unread).values(
+            unread_notifications=unread,
+            data_version=func.coalesce(users.c.data_version, 0) + 1
+        )
+    )
+    db.session.commit()
+    bump_entity_cache_generation()
+    return result.rowcount
+
+def log_single_changes(connection, changes):
+    # Bulk variant of log_changes for exactly one change per user:
+    # one UPDATE ... RETURNING hands out all sequence numbers at once
+    if not changes:
+        return
+    users = User.__table__
+    seqs = dict(connection.execute(
+        update(users).where(users.c.id.in_([user_id for user_id, _, _, _ in changes]))
+        .values(change_seq=func.coalesce(users.c.change_seq, 0) + 1, data_version=func.coalesce(users.c.data_version, 0) + 1)
+        .returning(users.c.id, users.c.change_seq)
+    ).all())
+    now = datetime.utcnow()
+    connection.execute(insert(ChangeLog.__table__), [{
+        "user_id": user_id,
+        "seq": seqs[user_id],
+        "entity": entity,
+        "entity_id": entity_id,
+        "op": op,
+        "created_at": now
+    } for user_id, entity, entity_id, op in changes if user_id in seqs])
+    forget_cached_entities(User, seqs)
+
+def publish_unread_count(user_id, unread_count):
+    after_commit(lambda: pubsub.publish(notification_channel(user_id), {
+        "event": "unread",
+        "unread_count": unread_count
+    }))
+
+def create_notification(user_id, title, message='', type='info'):
+    notification = Notification(
+        id=str(uuid.uuid4()),
+        user_id=user_id,
+        title=title,
+        message=message,
+        type=type,
+        created_at=datetime.utcnow()
+    )
+    db.session.add(notification)
+    unread_count = adjust_unread_notifications(user_id, 1)
+    
+    payload = {
+        "event": "notification",
+        "notification": serialize_notification(notification),
+        "unread_count": unread_count
+    }
+    after_commit(lambda: pubsub.publish(notification_channel(user_id), payload))
+    return notification
+
+def notification_targets():
+    # Users who accept in-app notifications; users without a preferences row get the defaults
+    users = User.__table__
+    preferences = UserPreferences.__table__
+    return select(
+        users.c.id,
+        users.c.email,
+        func.coalesce(preferences.c.email_notifications, true()).label('email_notifications')
+    ).select_from(
+        users.outerjoin(preferences, preferences.c.user_id == users.c.id)
+    ).where(func.coalesce(preferences.c.notifications_enabled, true()) == true(), users.c.deleted_at.is_(None))
 
-class UserPreferences(db.Model):
-    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    user_id = db.Column(db.String(36), db.ForeignKey('user.id'), unique=True, nullable=False)
-    theme = db.Column(db.String(20), default='light')
-    layout = db.Column(db.String(20), default='default')
-    notifications_enabled = db.Column(db.Boolean, default=True)
-    email_notifications = db.Column(db.Boolean, default=True)
-    accessibility_mode = db.Column(db.Boolean, default=False)
-    language = db.Column(db.String(10), default='en')
+def insert_notifications(rows):
+    notifications = Notification.__table__
+    if db_dialect() in ('postgresql', 'sqlite'):
+        if db_dialect() == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        stmt = dialect_insert(notifications).on_conflict_do_nothing(index_elements=['user_id', 'dedupe_key'])
+        return set(db.session.execute(stmt.returning(notifications.c.user_id), rows).scalars().all())
+    db.session.execute(insert(notifications), rows)
+    return {row['user_id'] for row in rows}
 
-class Progress(db.Model):
-    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    user_id = db.Column(db.String(36), db.ForeignKey('user.id'), nullable=False)
-    week = db.Column(db.Integer, nullable=False)
-    day = db.Column(db.String(20), nullable=False)
-    completed = db.Column(db.Boolean, default=False)
-    completion_date = db.Column(db.DateTime)
-    time_spent = db.Column(db.Integer, default=0)
-    notes = db.Column(db.Text)
+def fan_out_notification(targets, dedupe_key, title, message, type='reminder', email_subject=None, email_body=None):
+    # Targets are walked in user id order, one chunk per short transaction, so
+    # no statement locks more than NOTIFICATION_FANOUT_CHUNK_SIZE rows at once
+    users = User.__table__
+    notifications = Notification.__table__
+    targets = targets.where(~exists().where(
+        notifications.c.user_id == users.c.id,
+        notifications.c.dedupe_key == dedupe_key
+    )).order_by(users.c.id).limit(NOTIFICATION_FANOUT_CHUNK_SIZE)
+    
+    stats = {"notified": 0, "emails_queued": 0, "chunks": 0}
+    last_id = ''
+    while True:
+        chunk = db.session.execute(targets.where(users.c.id > last_id)).all()
+        if not chunk:
+            break
+        last_id = chunk[-1].id
+        
+        now = datetime.utcnow()
+        rows = [{
+            "id": str(uuid.uuid4()),
+            "user_id": target.id,
+            "title": title,
+            "message": message,
+            "type": type,
+            "is_read": False,
+            "created_at": now,
+            "dedupe_key": dedupe_key
+        } for target in chunk]
+        inserted = insert_notifications(rows)
+        rows = [row for row in rows if row['user_id'] in inserted]
+        
+        if rows:
+            db.session.execute(update(users).where(users.c.id.in_(inserted)).values(
+                unread_notifications=func.coalesce(users.c.unread_notifications, 0) + 1))
+            log_single_changes(db.session.connection(), [
+                (row['user_id'], 'notification', row['id'], 'upsert') for row in rows])
+            
+            if email_subject:
+                emails = [{
+                    "id": str(uuid.uuid4()),
+                    "to_email": target.email,
+                    "subject": email_subject,
+                    "body": email_body or message,
+                    "status": 'pending',
+                    "attempts": 0,
+                    "created_at": now
+                } for target in chunk if target.id in inserted and target.email_notifications]
+                if emails:
+                    db.session.execute(insert(EmailOutbox.__table__), emails)
+                stats["emails_queued"] += len(emails)
+            
+            unread_counts = dict(db.session.execute(
+                select(users.c.id, users.c.unread_notifications).where(users.c.id.in_(inserted))).all())
+            messages = [(notification_channel(row['user_id']), {
+                "event": "notification",
+                "notification": {
+                    "id": row['id'],
+                    "title": title,
+                    "message": message,
+                    "type": type,
+                    "is_read": False,
+                    "created_at": now.isoformat()
+                },
+                "unread_count": unread_counts.get(row['user_id'], 0)
+            }) for row in rows]
+            after_commit(lambda messages=messages: [pubsub.publish(channel, payload) for channel, payload in messages])
+        
+        db.session.commit()
+        stats["notified"] += len(rows)
+        stats["chunks"] += 1
+    return stats
 
-class PomodoroSession(db.Model):
-    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    user_id = db.Column(db.String(36), db.ForeignKey('user.id'), nullable=False)
-    start_time = db.Column(db.DateTime, nullable=False)
-    end_time = db.Column(db.DateTime)
-    duration = db.Column(db.Integer, nullable=False)
-    completed = db.Column(db.Boolean, default=False)
-    topic = db.Column(db.String(200))
-    session_type = db.Column(db.String(20), default='study')
+def send_study_reminders():
+    # "Today" is per timezone, so targets are selected once per distinct zone
+    users = User.__table__
+    preferences = UserPreferences.__table__
+    activity = UserDailyActivity.__table__
+    zone_column = func.coalesce(preferences.c.timezone, 'UTC')
+    zone_names = [row[0] for row in db.session.execute(
+        select(zone_column).select_from(users.outerjoin(preferences, preferences.c.user_id == users.c.id)).distinct()
+    )]
+    
+    totals = defaultdict(int)
+    for zone_name in zone_names:
+        today = local_date_for(get_zone(zone_name) or timezone.utc)
+        targets = notification_targets().where(zone_column == zone_name).where(~exists().where(
+            activity.c.user_id == users.c.id,
+            activity.c.local_date == today
+        ))
+        stats = fan_out_notification(
+            targets,
+            f"study_reminder:{today.isoformat()}",
+            "Time to study",
+            "You haven't studied today yet. A short session keeps your streak alive!",
+            email_subject="Don't break your DSA streak",
+            email_body="<p>You haven't studied today yet. A short session keeps your streak alive!</p>"
+        )
+        for key, value in stats.items():
+            totals[key] += value
+    return dict(totals)
 
-class Note(db.Model):
-    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    user_id = db.Column(db.String(36), db.ForeignKey('user.id'), nullable=False)
-    title = db.Column(db.String(200), nullable=False)
-    content = db.Column(db.Text)
-    tags = db.Column(db.String(500))
-    week = db.Column(db.Integer)
-    day = db.Column(db.String(20))
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+def send_week_unlocked_notifications():
+    # A week unlocks once every day of the previous week is completed
+    users = User.__table__
+    progress = Progress.__table__
+    totals = defaultdict(int)
+    for previous_week, week in zip(ROADMAP, ROADMAP[1:]):
+        finished = select(progress.c.user_id).where(
+            progress.c.week == previous_week['week'],
+            progress.c.completed == true()
+        ).group_by(progress.c.user_id).having(func.count() >= len(previous_week['days']))
+        stats = fan_out_notification(
+            notification_targets().where(users.c.id.in_(finished)),
+            f"week_unlocked:{week['week']}",
+            f"Week {week['week']} unlocked",
+            f"Great work finishing week {previous_week['week']}! Week {week['week']}: {week['title']} is ready.",
+            type='achievement'
+        )
+        for key, value in stats.items():
+            totals[key] += value
+    return dict(totals)
 
-class AIConversation(db.Model):
-    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    user_id = db.Column(db.String(36), db.ForeignKey('user.id'), nullable=False)
-    question = db.Column(db.Text, nullable=False)
-    answer = db.Column(db.Text, nullable=False)
-    citations = db.Column(db.Text)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+NOTIFICATION_CAMPAIGNS = {
+    'study-reminder': send_study_reminders,
+    'week-unlocked': send_week_unlocked_notifications,
+}
+
+@background_task(EMAIL_DELIVERY_INTERVAL)
+def deliver_pending_emails(limit=EMAIL_DELIVERY_BATCH_SIZE):
+    if not (SMTP_USER and SMTP_PASS):
+        return 0
+    
+    # Every worker runs this. Emails are claimed and the claim committed before
+    # any is sent, so no transaction or row lock stays open during SMTP I/O; the
+    # claiming UPDATE re-checks the status, so only one worker wins each row,
+    # also on SQLite where there is no SKIP LOCKED
+    table = EmailOutbox.__table__
+    now = datetime.utcnow()
+    claimable = or_(table.c.status == 'pending',
+                    and_(table.c.status == 'sending', table.c.claimed_until < now))
+    candidates = select(table.c.id).where(claimable).order_by(table.c.created_at).limit(limit)
+    if db_dialect() == 'postgresql':
+        candidates = candidates.with_for_update(skip_locked=True)
+    emails = db.session.execute(
+        update(table).where(table.c.id.in_(candidates.scalar_subquery()), claimable).values(
+            status='sending',
+            claimed_until=now + timedelta(seconds=EMAIL_DELIVERY_LEASE_SECONDS),
+            attempts=table.c.attempts + 1
+        ).returning(table.c.id, table.c.to_email, table.c.subject, table.c.body, table.c.attempts)
+    ).all()
+    db.session.commit()
+    
+    for email in emails:
+        if send_email(email.to_email, email.subject, email.body):
+            result = {"status": 'sent', "sent_at": datetime.utcnow()}
+        elif email.attempts >= EMAIL_MAX_ATTEMPTS:
+            result = {"status": 'failed'}
+        else:
+            result = {"status": 'pending'}
+        # Recorded one by one, so a crash mid-batch does not resend what went out
+        db.session.execute(update(table).where(table.c.id == email.id, table.c.status == 'sending')
+                           .values(claimed_until=None, **result))
+        db.session.commit()
+    return len(emails)
 
-# Helper Functions
 def send_email(to_email, subject, body):
     try:
         msg = MIMEMultipart()  # Changed from MimeMultipart
@@ -787,19 +3552,19 @@ def register():
         
         user = User(
             email=data['email'],
-            password_hash=generate_password_hash(data['password']),
+            password_hash=hash_password(data['password']),
             name=data['name']
         )
         
         db.session.add(user)
-        db.session.commit()
+        db.session.flush()
         
         preferences = UserPreferences(user_id=user.id)
         db.session.add(preferences)
+        session = start_user_session(user)
         db.session.commit()
         
-        access_token = create_access_token(identity=user.id)
-        refresh_token = create_refresh_token(identity=user.id)
+        access_token, refresh_token = issue_tokens(user.id, session.id)
         
         return jsonify({
             "access_token": access_token,
@@ -811,6 +3576,8 @@ def register():
                 "avatar_url": user.avatar_url
             }
         }), 201
+    except PasswordHashBusy:
+        return jsonify({"error": "Server busy, please retry"}), 503, {"Retry-After": "1"}
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -820,22 +3587,17 @@ def login():
         data = request.get_json()
         user = User.query.filter_by(email=data['email']).first()
         
-        if not user or not check_password_hash(user.password_hash, data['password']):
+        if not user or not verify_password(user.password_hash, data['password']):
             return jsonify({"error": "Invalid credentials"}), 401
         
-        user.last_login = datetime.utcnow()
-        db.session.commit()
+        if password_needs_rehash(user.password_hash):
+            user.password_hash = hash_password(data['password'])
         
-        session = UserSession(
-            user_id=user.id,
-            device_info=request.headers.get('User-Agent', ''),
-            ip_address=request.remote_addr
-        )
-        db.session.add(session)
+        user.last_login = datetime.utcnow()
+        session = start_user_session(user)
         db.session.commit()
         
-        access_token = create_access_token(identity=user.id)
-        refresh_token = create_refresh_token(identity=user.id)
+        access_token, refresh_token = issue_tokens(user.id, session.id)
         
         return jsonify({
             "access_token": access_token,
@@ -847,6 +3609,8 @@ def login():
                 "avatar_url": user.avatar_url
             }
         })
+    except PasswordHashBusy:
+        return jsonify({"error": "Server busy, please retry"}), 503, {"Retry-After": "1"}
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -895,13 +3659,15 @@ def reset_password():
         if not reset or reset.expires_at < datetime.utcnow():
             return jsonify({"error": "Invalid or expired token"}), 400
         
-        user = User.query.get(reset.user_id)
-        user.password_hash = generate_password_hash(data['password'])
+        user = get_user(reset.user_id)
+        user.password_hash = hash_password(data['password'])
         reset.used = True
         
         db.session.commit()
         
         return jsonify({"message": "Password reset successful"}), 200
+    except PasswordHashBusy:
+        return jsonify({"error": "Server busy, please retry"}), 503, {"Retry-After": "1"}
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -909,17 +3675,20 @@ def reset_password():
 @jwt_required(refresh=True)
 def refresh():
     current_user_id = get_jwt_identity()
-    access_token = create_access_token(identity=current_user_id)
+    session_id = get_jwt().get('sid')
+    claims = {"sid": session_id} if session_id else None
+    access_token = create_access_token(identity=current_user_id, additional_claims=claims)
     return jsonify({"access_token": access_token})
 
 # Profile Routes
 @app.route('/profile', methods=['GET'])
 @jwt_required()
+@data_version_etag
 def get_profile():
     try:
         user_id = get_jwt_identity()
-        user = User.query.get(user_id)
-        preferences = UserPreferences.query.filter_by(user_id=user_id).first()
+        user = get_user(user_id)
+        preferences = get_preferences(user_id)
         
         return jsonify({
             "user": {
@@ -928,7 +3697,7 @@ def get_profile():
                 "name": user.name,
                 "avatar_url": user.avatar_url,
                 "created_at": user.created_at.isoformat(),
-                "current_streak": user.current_streak,
+                "current_streak": effective_current_streak(user, (get_zone(preferences.timezone) if preferences else None) or timezone.utc),
                 "longest_streak": user.longest_streak,
                 "total_study_time": user.total_study_time
             },
@@ -938,7 +3707,8 @@ def get_profile():
                 "notifications_enabled": preferences.notifications_enabled if preferences else True,
                 "email_notifications": preferences.email_notifications if preferences else True,
                 "accessibility_mode": preferences.accessibility_mode if preferences else False,
-                "language": preferences.language if preferences else 'en'
+                "language": preferences.language if preferences else 'en',
+                "timezone": preferences.timezone if preferences else 'UTC'
             }
         })
     except Exception as e:
@@ -949,7 +3719,7 @@ def get_profile():
 def update_profile():
     try:
         user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = get_user(user_id)
         data = request.get_json()
         
         if 'name' in data:
@@ -978,7 +3748,7 @@ def update_profile():
 def upload_avatar():
     try:
         user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = get_user(user_id)
         
         if 'avatar' not in request.files:
             return jsonify({"error": "No file provided"}), 400
@@ -1001,6 +3771,44 @@ def upload_avatar():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+# Account Routes
+@app.route('/account', methods=['DELETE'])
+@jwt_required()
+def delete_account():
+    try:
+        user_id = get_jwt_identity()
+        user = get_user(user_id)
+        data = request.get_json(silent=True) or {}
+        
+        if not user or user.deleted_at:
+            return jsonify({"error": "User not found"}), 404
+        if not data.get('password') or not verify_password(user.password_hash, data['password']):
+            return jsonify({"error": "Password confirmation required"}), 401
+        
+        deletion = detach_account(user)
+        db.session.commit()
+        
+        return jsonify({
+            "message": "Account scheduled for deletion",
+            "deletion": serialize_account_deletion(deletion),
+            "status_url": f"/account/deletions/{deletion.id}"
+        }), 202
+    except PasswordHashBusy:
+        return jsonify({"error": "Server busy, please retry"}), 503, {"Retry-After": "1"}
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/account/deletions/<deletion_id>', methods=['GET'])
+def get_account_deletion(deletion_id):
+    # The caller's tokens are revoked by now; the unguessable id is the credential
+    try:
+        deletion = AccountDeletion.query.get(deletion_id)
+        if not deletion:
+            return jsonify({"error": "Deletion not found"}), 404
+        return jsonify(serialize_account_deletion(deletion))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 # Preferences Routes
 @app.route('/preferences', methods=['PUT'])
 @jwt_required()
@@ -1009,11 +3817,14 @@ def update_preferences():
         user_id = get_jwt_identity()
         data = request.get_json()
         
-        preferences = UserPreferences.query.filter_by(user_id=user_id).first()
+        preferences = get_preferences(user_id)
         if not preferences:
             preferences = UserPreferences(user_id=user_id)
             db.session.add(preferences)
         
+        if 'timezone' in data and not get_zone(data['timezone']):
+            return jsonify({"error": "Unknown timezone"}), 400
+        
         for key, value in data.items():
             if hasattr(preferences, key):
                 setattr(preferences, key, value)
@@ -1036,16 +3847,11 @@ def get_notifications():
         notifications = Notification.query.filter_by(user_id=user_id)\
             .order_by(desc(Notification.created_at))\
             .paginate(page=page, per_page=per_page, error_out=False)
+        unread_count = db.session.query(User.unread_notifications).filter_by(id=user_id).scalar() or 0
         
         return jsonify({
-            "notifications": [{
-                "id": n.id,
-                "title": n.title,
-                "message": n.message,
-                "type": n.type,
-                "is_read": n.is_read,
-                "created_at": n.created_at.isoformat()
-            } for n in notifications.items],
+            "notifications": [serialize_notification(n) for n in notifications.items],
+            "unread_count": unread_count,
             "pagination": {
                 "page": page,
                 "pages": notifications.pages,
@@ -1066,20 +3872,100 @@ def mark_notification_read(notification_id):
         if not notification:
             return jsonify({"error": "Notification not found"}), 404
         
-        notification.is_read = True
+        if not notification.is_read:
+            notification.is_read = True
+            publish_unread_count(user_id, adjust_unread_notifications(user_id, -1))
         db.session.commit()
         
         return jsonify({"message": "Notification marked as read"})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/notifications/read', methods=['POST'])
+@jwt_required()
+def mark_notifications_read():
+    try:
+        user_id = get_jwt_identity()
+        data = request.get_json(silent=True) or {}
+        
+        # No filter marks everything read; ids and/or a created_at range narrow it down
+        table = Notification.__table__
+        conditions = [table.c.user_id == user_id, table.c.is_read == False]
+        if data.get('ids'):
+            conditions.append(table.c.id.in_(data['ids']))
+        if data.get('since'):
+            conditions.append(table.c.created_at >= datetime.fromisoformat(data['since']))
+        if data.get('until'):
+            conditions.append(table.c.created_at <= datetime.fromisoformat(data['until']))
+        
+        marked_ids = db.session.execute(
+            update(table).where(*conditions).values(is_read=True).returning(table.c.id)
+        ).scalars().all()
+        
+        unread_count = db.session.query(User.unread_notifications).filter_by(id=user_id).scalar() or 0
+        if marked_ids:
+            log_changes(db.session.connection(), user_id, [('notification', i, 'upsert') for i in marked_ids])
+            unread_count = adjust_unread_notifications(user_id, -len(marked_ids))
+            publish_unread_count(user_id, unread_count)
+        db.session.commit()
+        
+        return jsonify({
+            "message": "Notifications marked as read",
+            "marked": len(marked_ids),
+            "unread_count": unread_count
+        })
+    except ValueError:
+        return jsonify({"error": "since/until must be ISO timestamps"}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/notifications/unread-count', methods=['GET'])
+@jwt_required()
+def get_unread_notification_count():
+    try:
+        user_id = get_jwt_identity()
+        unread_count = db.session.query(User.unread_notifications).filter_by(id=user_id).scalar() or 0
+        return jsonify({"unread_count": unread_count})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/notifications/stream', methods=['GET'])
+@jwt_required(locations=['headers', 'query_string'])
+def stream_notifications():
+    # EventSource cannot send headers, so the token may come as ?jwt=<token>
+    user_id = get_jwt_identity()
+    unread_count = db.session.query(User.unread_notifications).filter_by(id=user_id).scalar() or 0
+    subscription = pubsub.subscribe(notification_channel(user_id))
+    
+    def generate():
+        # The stream is closed after NOTIFICATION_STREAM_MAX_SECONDS; EventSource
+        # reconnects on its own, which also re-checks the token
+        deadline = time.monotonic() + NOTIFICATION_STREAM_MAX_SECONDS
+        try:
+            yield "retry: 3000\n"
+            yield f"event: unread\ndata: {json.dumps({'event': 'unread', 'unread_count': unread_count})}\n\n"
+            while time.monotonic() < deadline:
+                message = subscription.get(timeout=NOTIFICATION_STREAM_HEARTBEAT)
+                if message is None:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: {message['event']}\ndata: {json.dumps(message)}\n\n"
+        finally:
+            subscription.close()
+    
+    return app.response_class(generate(), mimetype='text/event-stream', headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+
 # Progress Routes
 @app.route('/progress', methods=['GET'])
 @jwt_required()
+@data_version_etag
 def get_progress():
     try:
         user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = get_user(user_id)
         
         progress = Progress.query.filter_by(user_id=user_id).all()
         progress_data = {}
@@ -1097,7 +3983,7 @@ def get_progress():
         return jsonify({
             "progress": progress_data,
             "stats": {
-                "current_streak": user.current_streak,
+                "current_streak": effective_current_streak(user, user_zone(user_id)),
                 "longest_streak": user.longest_streak,
                 "total_study_time": user.total_study_time
             }
@@ -1118,6 +4004,7 @@ def update_progress():
             day=data['day']
         ).first()
         
+        before = (progress.completed, progress.time_spent) if progress else None
         if not progress:
             progress = Progress(
                 user_id=user_id,
@@ -1133,18 +4020,11 @@ def update_progress():
         if progress.completed and not progress.completion_date:
             progress.completion_date = datetime.utcnow()
             
-            user = User.query.get(user_id)
-            user.total_study_time += progress.time_spent
-            
-            today = datetime.utcnow().date()
-            if user.last_streak_date == today - timedelta(days=1):
-                user.current_streak += 1
-            elif user.last_streak_date != today:
-                user.current_streak = 1
-            
-            user.last_streak_date = today
-            if user.current_streak > user.longest_streak:
-                user.longest_streak = user.current_streak
+            user = get_user(user_id)
+            record_study_day(user, progress.time_spent)
+        record_cohort_progress(user_id, [
+            cohort_progress_change(progress.week, before, (progress.completed, progress.time_spent))
+        ])
         
         db.session.commit()
         
@@ -1152,46 +4032,180 @@ def update_progress():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/progress/batch', methods=['POST'])
+@jwt_required()
+def update_progress_batch():
+    try:
+        user_id = get_jwt_identity()
+        data = request.get_json() or {}
+        
+        idempotency_key = request.headers.get('Idempotency-Key') or data.get('idempotency_key')
+        if idempotency_key:
+            idempotency_key = str(idempotency_key)[:100]
+            previous = stored_idempotent_response(user_id, idempotency_key)
+            if previous:
+                return previous
+        
+        entries = data.get('entries')
+        if not isinstance(entries, list) or not entries:
+            return jsonify({"error": "entries must be a non-empty list"}), 400
+        if len(entries) > PROGRESS_BATCH_MAX_ENTRIES:
+            return jsonify({"error": f"At most {PROGRESS_BATCH_MAX_ENTRIES} entries per batch"}), 400
+        
+        # Later entries for the same day win, as if they had been sent one by one
+        updates = {}
+        for index, entry in enumerate(entries):
+            if not isinstance(entry, dict) or 'week' not in entry or 'day' not in entry:
+                return jsonify({"error": f"Entry {index} requires week and day"}), 400
+            try:
+                week = int(entry['week'])
+                time_spent = int(entry.get('time_spent') or 0)
+            except (TypeError, ValueError):
+                return jsonify({"error": f"Entry {index} has a non-numeric week or time_spent"}), 400
+            updates[(week, str(entry['day']))] = {**entry, "time_spent": time_spent}
+        
+        existing = {
+            (p.week, p.day): p for p in Progress.query.filter(
+                Progress.user_id == user_id,
+                tuple_(Progress.week, Progress.day).in_(list(updates))
+            ).all()
+        }
+        
+        now = datetime.utcnow()
+        new_rows = []
+        changed_rows = []
+        completed_time = 0
+        newly_completed = []
+        cohort_changes = []
+        
+        for (week, day), entry in updates.items():
+            current = existing.get((week, day))
+            row = {
+                "completed": bool(entry.get('completed', False)),
+                "time_spent": entry.get('time_spent', 0),
+                "notes": entry.get('notes', ''),
+                "completion_date": current.completion_date if current else None
+            }
+            
+            if row['completed'] and not row['completion_date']:
+                row['completion_date'] = now
+                completed_time += row['time_spent']
+                newly_completed.append((week, row['time_spent']))
+            cohort_changes.append(cohort_progress_change(
+                week, (current.completed, current.time_spent) if current else None, (row['completed'], row['time_spent'])))
+            
+            if current:
+                changed_rows.append({"id": current.id, **row})
+            else:
+                new_rows.append({"id": str(uuid.uuid4()), "user_id": user_id, "week": week, "day": day, **row})
+        
+        if new_rows:
+            db.session.execute(insert(Progress), new_rows)
+        if changed_rows:
+            db.session.execute(update(Progress), changed_rows)
+        log_changes(db.session.connection(), user_id,
+                    [('progress', row['id'], 'upsert') for row in new_rows + changed_rows])
+        
+        user = get_user(user_id)
+        if newly_completed:
+            record_study_day(user, completed_time, completions=len(newly_completed))
+        record_cohort_progress(user_id, cohort_changes)
+        
+        result = {
+            "message": "Progress updated successfully",
+            "created": len(new_rows),
+            "updated": len(changed_rows),
+            "newly_completed": len(newly_completed),
+            "stats": {
+                "current_streak": effective_current_streak(user, user_zone(user_id)),
+                "longest_streak": user.longest_streak,
+                "total_study_time": user.total_study_time
+            }
+        }
+        
+        if idempotency_key:
+            db.session.add(IdempotencyKey(
+                user_id=user_id,
+                key=idempotency_key,
+                endpoint=request.endpoint,
+                status_code=200,
+                response=json.dumps(result)
+            ))
+        
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # A concurrent retry with the same key committed first
+            db.session.rollback()
+            previous = idempotency_key and stored_idempotent_response(user_id, idempotency_key)
+            if previous:
+                return previous
+            raise
+        
+        return jsonify(result)
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
+
 # Calendar Routes
+def calendar_week_data(roadmap_week, progress_dict):
+    calendar_data = {
+        "week": roadmap_week,
+        "progress": {}
+    }
+    
+    for day_data in roadmap_week['days']:
+        day = day_data['day']
+        p = progress_dict.get(day)
+        calendar_data["progress"][day] = {
+            "completed": p.completed if p else False,
+            "time_spent": p.time_spent if p else 0,
+            "completion_date": p.completion_date.isoformat() if p and p.completion_date else None
+        }
+    return calendar_data
+
 @app.route('/calendar', methods=['GET'])
 @jwt_required()
+@data_version_etag
 def get_calendar():
     try:
         user_id = get_jwt_identity()
         week = request.args.get('week', type=int)
+        from_week = request.args.get('from_week', type=int)
+        to_week = request.args.get('to_week', type=int)
         
         if week:
-            roadmap_week = next((w for w in ROADMAP if w['week'] == week), None)
+            roadmap_week = CURRICULUM.weeks.get(week)
             if not roadmap_week:
                 return jsonify({"error": "Week not found"}), 404
             
             progress = Progress.query.filter_by(user_id=user_id, week=week).all()
-            progress_dict = {p.day: p for p in progress}
+            return jsonify(calendar_week_data(roadmap_week, {p.day: p for p in progress}))
+        elif from_week or to_week:
+            from_week = from_week or ROADMAP[0]['week']
+            to_week = to_week or from_week
+            if to_week < from_week or to_week - from_week >= CALENDAR_MAX_RANGE_WEEKS:
+                return jsonify({"error": f"Range must cover 1 to {CALENDAR_MAX_RANGE_WEEKS} weeks"}), 400
             
-            calendar_data = {
-                "week": roadmap_week,
-                "progress": {}
-            }
-            
-            for day_data in roadmap_week['days']:
-                day = day_data['day']
-                p = progress_dict.get(day)
-                calendar_data["progress"][day] = {
-                    "completed": p.completed if p else False,
-                    "time_spent": p.time_spent if p else 0,
-                    "completion_date": p.completion_date.isoformat() if p and p.completion_date else None
-                }
+            # One range scan over the (user_id, week, day) unique index
+            progress_by_week = defaultdict(dict)
+            for p in Progress.query.filter(Progress.user_id == user_id, Progress.week.between(from_week, to_week)).all():
+                progress_by_week[p.week][p.day] = p
             
-            return jsonify(calendar_data)
+            return jsonify({"weeks": [
+                calendar_week_data(CURRICULUM.weeks[week_num], progress_by_week[week_num])
+                for week_num in range(from_week, to_week + 1) if week_num in CURRICULUM.weeks
+            ]})
         else:
-            progress = Progress.query.filter_by(user_id=user_id).all()
+            completed_by_week = dict(db.session.query(Progress.week, func.count())
+                                     .filter(Progress.user_id == user_id, Progress.completed == true())
+                                     .group_by(Progress.week).all())
             calendar_overview = {}
             
             for week_data in ROADMAP:
                 week_num = week_data['week']
-                week_progress = [p for p in progress if p.week == week_num]
-                total_days = len(week_data['days'])
-                completed_days = len([p for p in week_progress if p.completed])
+                total_days = CURRICULUM.week_totals[week_num]['days']
+                completed_days = completed_by_week.get(week_num, 0)
                 
                 calendar_overview[week_num] = {
                     "title": week_data['title'],
@@ -1204,6 +4218,66 @@ def get_calendar():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/calendar/feed', methods=['POST'])
+@jwt_required()
+def create_calendar_feed():
+    try:
+        user = get_user(get_jwt_identity())
+        # Calendar apps cannot send a JWT, so the feed URL carries its own
+        # token; issuing a new one revokes the old URL
+        user.calendar_token = secrets.token_urlsafe(32)
+        db.session.commit()
+        
+        return jsonify({"url": f"{request.host_url}calendar.ics?token={user.calendar_token}"})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/calendar/feed', methods=['DELETE'])
+@jwt_required()
+def delete_calendar_feed():
+    try:
+        user = get_user(get_jwt_identity())
+        user.calendar_token = None
+        db.session.commit()
+        cache.delete(calendar_feed_key(user.id))
+        
+        return jsonify({"message": "Calendar feed disabled"})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/calendar.ics', methods=['GET'])
+def get_calendar_feed():
+    try:
+        token = request.args.get('token')
+        user = User.query.filter_by(calendar_token=token).first() if token else None
+        if not user:
+            return jsonify({"error": "Invalid calendar token"}), 404
+        
+        # The ETag only depends on counters and the day, so unchanged polls end here
+        etag = calendar_etag(user.id, user.change_seq or 0, calendar_window_start())
+        if request.if_none_match.contains(etag):
+            response = app.response_class(status=304)
+            response.set_etag(etag)
+            return response
+        
+        feed = calendar_feed(user)
+        body = '\r\n'.join([
+            'BEGIN:VCALENDAR',
+            'VERSION:2.0',
+            'PRODID:-//DSA Learning//Study Calendar//EN',
+            'CALSCALE:GREGORIAN',
+            'X-WR-CALNAME:DSA Study Plan',
+            *feed['events'].values(),
+            'END:VCALENDAR'
+        ]) + '\r\n'
+        
+        response = app.response_class(body, mimetype='text/calendar')
+        response.set_etag(calendar_etag(user.id, feed['seq'], datetime.fromisoformat(feed['window'])))
+        response.headers['Cache-Control'] = 'private, max-age=300'
+        return response
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 # Pomodoro Routes
 @app.route('/pomodoro', methods=['POST'])
 @jwt_required()
@@ -1235,17 +4309,35 @@ def start_pomodoro():
 def complete_pomodoro(session_id):
     try:
         user_id = get_jwt_identity()
-        session = PomodoroSession.query.filter_by(id=session_id, user_id=user_id).first()
+        query = PomodoroSession.query.filter(PomodoroSession.id == session_id, PomodoroSession.user_id == user_id)
+        # The start_time bound lets PostgreSQL skip all but the newest
+        # partitions; sessions left open for longer are found without it
+        session = query.filter(
+            PomodoroSession.start_time >= datetime.utcnow() - timedelta(hours=POMODORO_MAX_OPEN_HOURS)
+        ).first() or query.first()
         
         if not session:
             return jsonify({"error": "Session not found"}), 404
         
+        if session.completed:
+            # A retried completion must not count the session a second time
+            return jsonify({
+                "message": "Session already completed",
+                "actual_duration": session.duration
+            })
+        
         session.end_time = datetime.utcnow()
         session.completed = True
         
         actual_duration = (session.end_time - session.start_time).total_seconds() / 60
         session.duration = min(session.duration, actual_duration)
         
+        if session.session_type == 'study':
+            zone = user_zone(user_id)
+            record_daily_activity(user_id, local_date_for(zone, session.end_time), pomodoros=1)
+            record_rollup(user_id, zone, session.end_time, pomodoros=1)
+            refresh_user_streak(get_user(user_id), zone)
+        
         db.session.commit()
         
         return jsonify({
@@ -1268,15 +4360,7 @@ def get_pomodoro_history():
             .paginate(page=page, per_page=per_page, error_out=False)
         
         return jsonify({
-            "sessions": [{
-                "id": s.id,
-                "start_time": s.start_time.isoformat(),
-                "end_time": s.end_time.isoformat() if s.end_time else None,
-                "duration": s.duration,
-                "completed": s.completed,
-                "topic": s.topic,
-                "session_type": s.session_type
-            } for s in sessions.items],
+            "sessions": [serialize_pomodoro_session(s) for s in sessions.items],
             "pagination": {
                 "page": page,
                 "pages": sessions.pages,
@@ -1287,76 +4371,174 @@ def get_pomodoro_history():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-# Notes Routes
-@app.route('/notes', methods=['GET'])
+@app.route('/pomodoro/stats', methods=['GET'])
+@jwt_required()
+def get_pomodoro_stats():
+    try:
+        user_id = get_jwt_identity()
+        data_version = db.session.query(User.data_version).filter_by(id=user_id).scalar()
+        key = pomodoro_stats_key(user_id, data_version)
+        
+        stats = cache.get(key)
+        if stats is None:
+            stats = compute_pomodoro_stats(user_id)
+            cache.set(key, stats, ttl=POMODORO_STATS_TTL)
+        
+        return jsonify(stats)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# Notes Routes
+@app.route('/notes', methods=['GET'])
+@jwt_required()
+def get_notes():
+    try:
+        user_id = get_jwt_identity()
+        page = request.args.get('page', 1, type=int)
+        per_page = request.args.get('per_page', 20, type=int)
+        week = request.args.get('week', type=int)
+        search = request.args.get('search', '')
+        include_content = request.args.get('include_content', 'false').lower() == 'true'
+        tags = request.args.get('tags', '')
+        tag_match = request.args.get('match', 'any')
+        if tag_match not in ('any', 'all'):
+            return jsonify({"error": "match must be any or all"}), 400
+        
+        query = Note.query.filter_by(user_id=user_id)
+        if not include_content:
+            query = query.options(defer(Note.content))
+        
+        if week:
+            query = query.filter_by(week=week)
+        
+        if search:
+            query = query.filter(note_search_condition(search))
+        
+        if normalize_tags(tags):
+            query = query.filter(note_tag_filter(user_id, tags, tag_match))
+        
+        notes = query.order_by(desc(Note.updated_at))\
+            .paginate(page=page, per_page=per_page, error_out=False)
+        serializer = serialize_note if include_content else serialize_note_summary
+        
+        return jsonify({
+            "notes": [serializer(n) for n in notes.items],
+            "pagination": {
+                "page": page,
+                "pages": notes.pages,
+                "per_page": per_page,
+                "total": notes.total
+            }
+        })
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/notes', methods=['POST'])
+@jwt_required()
+def create_note():
+    try:
+        user_id = get_jwt_identity()
+        data = request.get_json()
+        
+        note = Note(
+            user_id=user_id,
+            title=data['title'],
+            content=data.get('content', ''),
+            tags=normalize_tags(data.get('tags', [])),
+            week=data.get('week'),
+            day=data.get('day')
+        )
+        
+        db.session.add(note)
+        db.session.flush()
+        add_note_revision(note, note.version, note_state(note))
+        record_rollup(user_id, user_zone(user_id), notes_created=1)
+        db.session.commit()
+        
+        return jsonify({
+            "id": note.id,
+            "version": note.version,
+            "message": "Note created successfully"
+        }), 201, {"ETag": note_etag(note)}
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/notes/tags', methods=['GET'])
+@jwt_required()
+def get_note_tags():
+    try:
+        user_id = get_jwt_identity()
+        rows = UserTagCount.query.filter(UserTagCount.user_id == user_id, UserTagCount.count > 0)\
+            .order_by(desc(UserTagCount.count), UserTagCount.tag).all()
+        
+        return jsonify({"tags": [{"tag": row.tag, "count": row.count} for row in rows]})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/notes/<note_id>', methods=['GET'])
+@jwt_required()
+def get_note(note_id):
+    try:
+        user_id = get_jwt_identity()
+        note = Note.query.filter_by(id=note_id, user_id=user_id).first()
+        
+        if not note:
+            return jsonify({"error": "Note not found"}), 404
+        
+        return jsonify(serialize_note(note)), 200, {"ETag": note_etag(note)}
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/notes/<note_id>/revisions', methods=['GET'])
 @jwt_required()
-def get_notes():
+def get_note_revisions(note_id):
     try:
         user_id = get_jwt_identity()
         page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 20, type=int)
-        week = request.args.get('week', type=int)
-        search = request.args.get('search', '')
-        
-        query = Note.query.filter_by(user_id=user_id)
-        
-        if week:
-            query = query.filter_by(week=week)
+        per_page = min(request.args.get('per_page', 20, type=int), 100)
         
-        if search:
-            query = query.filter(or_(
-                Note.title.contains(search),
-                Note.content.contains(search),
-                Note.tags.contains(search)
-            ))
+        if not db.session.query(exists().where(Note.id == note_id, Note.user_id == user_id)).scalar():
+            return jsonify({"error": "Note not found"}), 404
         
-        notes = query.order_by(desc(Note.updated_at))\
+        revisions = db.session.query(NoteRevision.version, NoteRevision.kind, NoteRevision.created_at)\
+            .filter(NoteRevision.note_id == note_id)\
+            .order_by(desc(NoteRevision.version))\
             .paginate(page=page, per_page=per_page, error_out=False)
         
         return jsonify({
-            "notes": [{
-                "id": n.id,
-                "title": n.title,
-                "content": n.content,
-                "tags": n.tags.split(',') if n.tags else [],
-                "week": n.week,
-                "day": n.day,
-                "created_at": n.created_at.isoformat(),
-                "updated_at": n.updated_at.isoformat()
-            } for n in notes.items],
+            "revisions": [{
+                "version": r.version,
+                "kind": r.kind,
+                "created_at": r.created_at.isoformat()
+            } for r in revisions.items],
             "pagination": {
                 "page": page,
-                "pages": notes.pages,
+                "pages": revisions.pages,
                 "per_page": per_page,
-                "total": notes.total
+                "total": revisions.total
             }
         })
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route('/notes', methods=['POST'])
+@app.route('/notes/<note_id>/revisions/<int:version>', methods=['GET'])
 @jwt_required()
-def create_note():
+def get_note_revision(note_id, version):
     try:
         user_id = get_jwt_identity()
-        data = request.get_json()
-        
-        note = Note(
-            user_id=user_id,
-            title=data['title'],
-            content=data.get('content', ''),
-            tags=','.join(data.get('tags', [])),
-            week=data.get('week'),
-            day=data.get('day')
-        )
+        if not db.session.query(exists().where(Note.id == note_id, Note.user_id == user_id)).scalar():
+            return jsonify({"error": "Note not found"}), 404
         
-        db.session.add(note)
-        db.session.commit()
+        state = note_at_version(note_id, version)
+        if state is None:
+            return jsonify({"error": "Revision not found"}), 404
         
         return jsonify({
-            "id": note.id,
-            "message": "Note created successfully"
-        }), 201
+            "version": version,
+            "title": state['title'],
+            "content": state['content'],
+            "tags": state['tags'].split(',') if state['tags'] else []
+        })
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -1370,18 +4552,75 @@ def update_note(note_id):
         if not note:
             return jsonify({"error": "Note not found"}), 404
         
+        # Saves must name the version they were based on; anything else
+        # would silently overwrite a concurrent edit
+        if request.headers.get('If-Match') is None:
+            return jsonify({"error": "If-Match header with the note's ETag is required"}), 428
+        if not if_match_allows(note):
+            return jsonify({
+                "error": "Note has been modified since it was loaded",
+                "version": note.version
+            }), 412, {"ETag": note_etag(note)}
+        
         data = request.get_json()
+        previous_state, previous_version = note_state(note), note.version
         
-        note.title = data.get('title', note.title)
         note.content = data.get('content', note.content)
-        note.tags = ','.join(data.get('tags', note.tags.split(',') if note.tags else []))
-        note.week = data.get('week', note.week)
-        note.day = data.get('day', note.day)
-        note.updated_at = datetime.utcnow()
+        apply_note_fields(note, data)
         
-        db.session.commit()
+        record_note_update(note, previous_state, previous_version)
+        
+        try:
+            db.session.commit()
+        except StaleDataError:
+            # Another save committed between our read and write
+            db.session.rollback()
+            return jsonify({"error": "Note has been modified since it was loaded"}), 412
+        
+        return jsonify({"message": "Note updated successfully", "version": note.version}), 200, {"ETag": note_etag(note)}
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/notes/<note_id>', methods=['PATCH'])
+@jwt_required()
+def patch_note(note_id):
+    try:
+        user_id = get_jwt_identity()
+        data = request.get_json() or {}
+        note = Note.query.filter_by(id=note_id, user_id=user_id).first()
+        
+        if not note:
+            return jsonify({"error": "Note not found"}), 404
+        
+        # Edits are only meaningful against the exact text they were made on;
+        # on a mismatch the client falls back to reloading or a full PUT
+        base_version = data.get('base_version')
+        if base_version is None and request.headers.get('If-Match') is None:
+            return jsonify({"error": "base_version or If-Match is required"}), 428
+        if (base_version is not None and base_version != note.version) or \
+                (base_version is None and not if_match_allows(note)):
+            return jsonify({
+                "error": "Note has been modified since the base version",
+                "version": note.version
+            }), 409, {"ETag": note_etag(note)}
+        
+        previous_state, previous_version = note_state(note), note.version
+        try:
+            content = apply_text_ops(previous_state['content'], data.get('ops', []))
+        except (ValueError, UnicodeDecodeError) as e:
+            return jsonify({"error": f"Cannot apply ops: {e}"}), 422
+        
+        note.content = content
+        apply_note_fields(note, data)
+        record_note_update(note, previous_state, previous_version)
+        
+        try:
+            db.session.commit()
+        except StaleDataError:
+            db.session.rollback()
+            return jsonify({"error": "Note has been modified since the base version"}), 409
         
-        return jsonify({"message": "Note updated successfully"})
+        return jsonify({"message": "Note updated successfully", "version": note.version}), 200, {"ETag": note_etag(note)}
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -1395,6 +4634,7 @@ def delete_note(note_id):
         if not note:
             return jsonify({"error": "Note not found"}), 404
         
+        NoteRevision.query.filter_by(note_id=note.id).delete()
         db.session.delete(note)
         db.session.commit()
         
@@ -1447,17 +4687,15 @@ def search():
         
         if search_type in ['all', 'notes']:
             user_id = get_jwt_identity()
-            notes_query = Note.query.filter_by(user_id=user_id).filter(or_(
-                Note.title.contains(query),
-                Note.content.contains(query),
-                Note.tags.contains(query)
-            ))
+            notes_query = Note.query.filter_by(user_id=user_id)\
+                .options(defer(Note.content))\
+                .filter(note_search_condition(query))
             
             notes = notes_query.paginate(page=page, per_page=per_page, error_out=False)
             results['notes'] = [{
                 "id": n.id,
                 "title": n.title,
-                "content": n.content[:200] + "..." if len(n.content) > 200 else n.content,
+                "content": n.snippet if n.snippet is not None else note_snippet(n.content),
                 "tags": n.tags.split(',') if n.tags else [],
                 "updated_at": n.updated_at.isoformat()
             } for n in notes.items]
@@ -1499,7 +4737,7 @@ def generate_study_plan():
         user_id = get_jwt_identity()
         data = request.get_json()
         
-        user = User.query.get(user_id)
+        user = get_user(user_id)
         progress = Progress.query.filter_by(user_id=user_id).all()
         
         completed_weeks = set(p.week for p in progress if p.completed)
@@ -1622,30 +4860,36 @@ Focus on the most important information for DSA learning."""
 # Dashboard Routes
 @app.route('/dashboard', methods=['GET'])
 @jwt_required()
+@data_version_etag
 def get_dashboard():
     try:
         user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = get_user(user_id)
         
         progress = Progress.query.filter_by(user_id=user_id).all()
         recent_sessions = PomodoroSession.query.filter_by(user_id=user_id)\
             .order_by(desc(PomodoroSession.start_time)).limit(5).all()
-        recent_notes = Note.query.filter_by(user_id=user_id)\
+        recent_notes = Note.query.filter_by(user_id=user_id).options(defer(Note.content))\
             .order_by(desc(Note.updated_at)).limit(5).all()
         
         completed_days = len([p for p in progress if p.completed])
-        total_days = len(ROADMAP) * 7
+        total_days = CURRICULUM.total_days
+        
+        completed_by_week = defaultdict(int)
+        for p in progress:
+            if p.completed:
+                completed_by_week[p.week] += 1
         
         weekly_progress = {}
         for week in ROADMAP:
             week_num = week['week']
-            week_progress = [p for p in progress if p.week == week_num]
-            completed_week_days = len([p for p in week_progress if p.completed])
+            completed_week_days = completed_by_week[week_num]
+            week_days = CURRICULUM.week_totals[week_num]['days']
             weekly_progress[week_num] = {
                 "title": week['title'],
                 "completed": completed_week_days,
-                "total": len(week['days']),
-                "percentage": (completed_week_days / len(week['days'])) * 100 if week['days'] else 0
+                "total": week_days,
+                "percentage": (completed_week_days / week_days) * 100 if week_days else 0
             }
         
         study_time_last_7_days = db.session.query(func.sum(PomodoroSession.duration))\
@@ -1655,7 +4899,7 @@ def get_dashboard():
         
         return jsonify({
             "stats": {
-                "current_streak": user.current_streak,
+                "current_streak": effective_current_streak(user, user_zone(user_id)),
                 "longest_streak": user.longest_streak,
                 "total_study_time": user.total_study_time,
                 "study_time_last_7_days": study_time_last_7_days,
@@ -1680,6 +4924,455 @@ def get_dashboard():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+# Analytics Routes
+def rollup_totals(user_id, start_date, end_date, group_column):
+    rollup = UserDailyRollup.__table__
+    return db.session.execute(
+        select(group_column, *(func.sum(rollup.c[metric]).label(metric) for metric in ROLLUP_METRICS))
+        .where(rollup.c.user_id == user_id, rollup.c.local_date.between(start_date, end_date))
+        .group_by(group_column)
+        .order_by(group_column)
+    ).all()
+
+def serialize_rollup_row(row):
+    return {metric: int(getattr(row, metric) or 0) for metric in ROLLUP_METRICS}
+
+@app.route('/analytics/heatmap', methods=['GET'])
+@jwt_required()
+def get_analytics_heatmap():
+    try:
+        user_id = get_jwt_identity()
+        today = local_date_for(user_zone(user_id))
+        year = request.args.get('year', today.year, type=int)
+        
+        rows = rollup_totals(user_id, date(year, 1, 1), date(year, 12, 31), UserDailyRollup.local_date)
+        
+        return jsonify({
+            "year": year,
+            "days": [{"date": row.local_date.isoformat(), **serialize_rollup_row(row)} for row in rows]
+        })
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/analytics/weekly', methods=['GET'])
+@jwt_required()
+def get_analytics_weekly():
+    try:
+        user_id = get_jwt_identity()
+        weeks = min(max(request.args.get('weeks', 12, type=int), 1), 104)
+        today = local_date_for(user_zone(user_id))
+        this_week = today - timedelta(days=today.weekday())
+        first_week = this_week - timedelta(weeks=weeks - 1)
+        
+        # Grouped by day in SQL and folded into weeks here, which keeps the
+        # query portable across databases
+        totals = {first_week + timedelta(weeks=i): dict.fromkeys(ROLLUP_METRICS, 0) for i in range(weeks)}
+        for row in rollup_totals(user_id, first_week, today, UserDailyRollup.local_date):
+            week_totals = totals[row.local_date - timedelta(days=row.local_date.weekday())]
+            for metric, value in serialize_rollup_row(row).items():
+                week_totals[metric] += value
+        
+        return jsonify({
+            "weeks": [{"week_start": week_start.isoformat(), **values} for week_start, values in totals.items()]
+        })
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/analytics/hours', methods=['GET'])
+@jwt_required()
+def get_analytics_hours():
+    try:
+        user_id = get_jwt_identity()
+        days = min(max(request.args.get('days', 90, type=int), 1), 366)
+        today = local_date_for(user_zone(user_id))
+        
+        hours = {hour: dict.fromkeys(ROLLUP_METRICS, 0) for hour in range(24)}
+        for row in rollup_totals(user_id, today - timedelta(days=days - 1), today, UserDailyRollup.hour):
+            hours[row.hour] = serialize_rollup_row(row)
+        
+        return jsonify({
+            "days": days,
+            "hours": [{"hour": hour, **values} for hour, values in hours.items()]
+        })
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# Leaderboard Routes
+def leaderboard_response_entries(entries):
+    users = {u.id: u for u in db.session.query(User.id, User.name, User.avatar_url)
+             .filter(User.id.in_([member for _, member, _ in entries])).all()}
+    return [{
+        "rank": rank + 1,
+        "user_id": member,
+        "name": users[member].name if member in users else None,
+        "avatar_url": users[member].avatar_url if member in users else None,
+        "score": score
+    } for rank, member, score in entries]
+
+@app.route('/leaderboard', methods=['GET'])
+@jwt_required()
+def get_leaderboard_top():
+    try:
+        board = request.args.get('board', 'all_time')
+        if board not in LEADERBOARD_BOARDS:
+            return jsonify({"error": "Unknown board"}), 400
+        limit = min(max(request.args.get('limit', 10, type=int), 1), LEADERBOARD_MAX_LIMIT)
+        period = request.args.get('period')
+        
+        # Past weekly boards are only available from snapshots
+        if board == 'weekly' and period and period != current_week_period():
+            rows = LeaderboardEntry.query.filter_by(board=board, period=period)\
+                .order_by(LeaderboardEntry.rank).limit(limit).all()
+            return jsonify({
+                "board": board,
+                "period": period,
+                "entries": leaderboard_response_entries([(r.rank - 1, r.user_id, r.score) for r in rows])
+            })
+        
+        leaderboard = get_leaderboard(board)
+        return jsonify({
+            "board": board,
+            "period": leaderboard.period,
+            "total": len(leaderboard),
+            "entries": leaderboard_response_entries(leaderboard.entries(0, limit))
+        })
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/leaderboard/me', methods=['GET'])
+@jwt_required()
+def get_leaderboard_rank():
+    try:
+        user_id = get_jwt_identity()
+        board = request.args.get('board', 'all_time')
+        if board not in LEADERBOARD_BOARDS:
+            return jsonify({"error": "Unknown board"}), 400
+        neighbors = min(max(request.args.get('neighbors', 2, type=int), 0), 25)
+        
+        leaderboard = get_leaderboard(board)
+        rank, score = leaderboard.rank(user_id)
+        entries = leaderboard.entries(rank - neighbors, rank + neighbors + 1) if rank is not None else []
+        
+        return jsonify({
+            "board": board,
+            "period": leaderboard.period,
+            "total": len(leaderboard),
+            "rank": rank + 1 if rank is not None else None,
+            "score": score,
+            "entries": leaderboard_response_entries(entries)
+        })
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# Cohort Routes
+def serialize_cohort(cohort, user_id):
+    result = {
+        "id": cohort.id,
+        "name": cohort.name,
+        "member_count": cohort.member_count,
+        "is_owner": cohort.owner_id == user_id,
+        "created_at": cohort.created_at.isoformat()
+    }
+    if cohort.owner_id == user_id:
+        result["join_code"] = cohort.join_code
+    return result
+
+@app.route('/cohorts', methods=['GET'])
+@jwt_required()
+def get_cohorts():
+    try:
+        user_id = get_jwt_identity()
+        member_of = select(CohortMember.cohort_id).where(CohortMember.user_id == user_id)
+        cohorts = Cohort.query.filter(or_(Cohort.owner_id == user_id, Cohort.id.in_(member_of)))\
+            .order_by(Cohort.created_at.desc()).all()
+        return jsonify([serialize_cohort(cohort, user_id) for cohort in cohorts])
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/cohorts', methods=['POST'])
+@jwt_required()
+def create_cohort():
+    try:
+        user_id = get_jwt_identity()
+        data = request.get_json() or {}
+        name = (data.get('name') or '').strip()
+        if not name:
+            return jsonify({"error": "Name is required"}), 400
+        
+        # The creator runs the cohort and is not counted as a member
+        cohort = Cohort(name=name[:100], owner_id=user_id, join_code=secrets.token_hex(4).upper())
+        db.session.add(cohort)
+        db.session.commit()
+        
+        return jsonify(serialize_cohort(cohort, user_id)), 201
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/cohorts/join', methods=['POST'])
+@jwt_required()
+def join_cohort():
+    try:
+        user_id = get_jwt_identity()
+        data = request.get_json() or {}
+        code = (data.get('code') or '').strip().upper()
+        
+        cohort = Cohort.query.filter_by(join_code=code).with_for_update().first() if code else None
+        if not cohort:
+            return jsonify({"error": "Invalid join code"}), 404
+        if cohort.owner_id == user_id or db.session.get(CohortMember, (cohort.id, user_id)):
+            return jsonify({"error": "Already in this cohort"}), 409
+        if cohort.member_count >= COHORT_MAX_MEMBERS:
+            return jsonify({"error": "Cohort is full"}), 409
+        
+        add_cohort_member(cohort, get_user(user_id))
+        db.session.commit()
+        
+        return jsonify(serialize_cohort(cohort, user_id)), 201
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({"error": "Already in this cohort"}), 409
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/cohorts/<cohort_id>/members/<member_id>', methods=['DELETE'])
+@jwt_required()
+def remove_cohort_member_route(cohort_id, member_id):
+    try:
+        user_id = get_jwt_identity()
+        cohort = Cohort.query.get(cohort_id)
+        if not cohort or user_id not in (cohort.owner_id, member_id):
+            return jsonify({"error": "Cohort not found"}), 404
+        
+        member = db.session.get(CohortMember, (cohort_id, member_id))
+        if not member:
+            return jsonify({"error": "Member not found"}), 404
+        
+        remove_cohort_member(cohort, member)
+        db.session.commit()
+        
+        return jsonify({"message": "Member removed"})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/cohorts/<cohort_id>', methods=['DELETE'])
+@jwt_required()
+def delete_cohort(cohort_id):
+    try:
+        user_id = get_jwt_identity()
+        cohort = Cohort.query.filter_by(id=cohort_id, owner_id=user_id).first()
+        if not cohort:
+            return jsonify({"error": "Cohort not found"}), 404
+        
+        CohortWeekStat.query.filter_by(cohort_id=cohort_id).delete()
+        CohortMember.query.filter_by(cohort_id=cohort_id).delete()
+        db.session.delete(cohort)
+        db.session.commit()
+        
+        return jsonify({"message": "Cohort deleted"})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/cohorts/<cohort_id>/dashboard', methods=['GET'])
+@jwt_required()
+def get_cohort_dashboard(cohort_id):
+    try:
+        user_id = get_jwt_identity()
+        cohort = Cohort.query.filter_by(id=cohort_id, owner_id=user_id).first()
+        if not cohort:
+            return jsonify({"error": "Cohort not found"}), 404
+        
+        # Members come with their denormalized totals in a single query
+        members = db.session.execute(
+            select(CohortMember.user_id, User.name, User.avatar_url, User.current_streak,
+                   CohortMember.completed_days, CohortMember.total_study_time,
+                   CohortMember.last_completed_at, CohortMember.joined_at)
+            .join(User, User.id == CohortMember.user_id)
+            .where(CohortMember.cohort_id == cohort_id)
+            .order_by(CohortMember.completed_days.desc(), CohortMember.total_study_time.desc())
+        ).all()
+        week_stats = {stat.week: stat for stat in CohortWeekStat.query.filter_by(cohort_id=cohort_id).all()}
+        
+        study_times = sorted(member.total_study_time for member in members)
+        completed = sorted(member.completed_days for member in members)
+        member_count = len(members)
+        
+        weeks = []
+        for week in ROADMAP:
+            number = week['week']
+            stat = week_stats.get(number)
+            days = CURRICULUM.week_totals[number]['days']
+            completions = stat.completions if stat else 0
+            weeks.append({
+                "week": number,
+                "title": week['title'],
+                "completions": completions,
+                "study_time": stat.study_time if stat else 0,
+                "members_completed": stat.members_completed if stat else 0,
+                "completion_rate": round(completions / (days * member_count) * 100, 1) if member_count and days else 0
+            })
+        
+        # Stragglers have gone quiet or sit in the bottom quartile by days completed
+        inactive_before = datetime.utcnow() - timedelta(days=COHORT_STRAGGLER_DAYS)
+        bottom_quartile = percentile(completed, 25)
+        stragglers = []
+        for member in members:
+            inactive = member.last_completed_at is None or member.last_completed_at < inactive_before
+            behind = member_count >= 4 and member.completed_days < bottom_quartile
+            if inactive or behind:
+                stragglers.append({
+                    "user_id": member.user_id,
+                    "name": member.name,
+                    "completed_days": member.completed_days,
+                    "last_completed_at": member.last_completed_at.isoformat() if member.last_completed_at else None,
+                    "inactive": inactive,
+                    "behind": behind
+                })
+        stragglers.sort(key=lambda s: (s["completed_days"], s["last_completed_at"] or ''))
+        
+        return jsonify({
+            "cohort": serialize_cohort(cohort, user_id),
+            "total_days": CURRICULUM.total_days,
+            "study_time_percentiles": {f"p{pct}": percentile(study_times, pct) for pct in (25, 50, 75, 90)},
+            "completed_days_percentiles": {f"p{pct}": percentile(completed, pct) for pct in (25, 50, 75, 90)},
+            "weeks": weeks,
+            "stragglers": stragglers,
+            "members": [{
+                "user_id": member.user_id,
+                "name": member.name,
+                "avatar_url": member.avatar_url,
+                "current_streak": member.current_streak,
+                "completed_days": member.completed_days,
+                "total_study_time": member.total_study_time,
+                "last_completed_at": member.last_completed_at.isoformat() if member.last_completed_at else None,
+                "joined_at": member.joined_at.isoformat()
+            } for member in members]
+        })
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# Sync Routes
+@app.route('/sync', methods=['GET'])
+@jwt_required()
+def sync_changes():
+    try:
+        user_id = get_jwt_identity()
+        since = request.args.get('since', type=int)
+        limit = min(request.args.get('limit', 500, type=int), 1000)
+        
+        current_seq = db.session.query(User.change_seq).filter_by(id=user_id).scalar() or 0
+        
+        # No cursor, a cursor from the future, or a cursor older than the
+        # retained log: the client has to reload everything and restart from current_seq
+        reset = since is None or since < 0 or since > current_seq
+        if not reset and since < current_seq:
+            oldest_seq = db.session.query(func.min(ChangeLog.seq)).filter_by(user_id=user_id).scalar()
+            reset = oldest_seq is None or oldest_seq > since + 1
+        if reset:
+            return jsonify({"reset": True, "token": str(current_seq), "changes": {}, "deleted": {}, "has_more": False})
+        
+        rows = ChangeLog.query.filter(ChangeLog.user_id == user_id, ChangeLog.seq > since)\
+            .order_by(ChangeLog.seq).limit(limit + 1).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        
+        latest_ops = {}
+        for row in rows:
+            latest_ops[(row.entity, row.entity_id)] = row.op
+        
+        upserted_ids = defaultdict(list)
+        deleted = defaultdict(list)
+        for (entity, entity_id), op in latest_ops.items():
+            if op == 'delete':
+                deleted[entity].append(entity_id)
+            else:
+                upserted_ids[entity].append(entity_id)
+        
+        changes = {}
+        for entity, ids in upserted_ids.items():
+            model, serializer = SYNC_ENTITIES[entity]
+            records = model.query.filter(model.user_id == user_id, model.id.in_(ids)).all()
+            changes[entity] = [serializer(r) for r in records]
+            # Deleted by a change past this page: report it as deleted already
+            deleted[entity].extend(set(ids) - {r.id for r in records})
+        
+        return jsonify({
+            "reset": False,
+            "token": str(rows[-1].seq if rows else since),
+            "changes": changes,
+            "deleted": {entity: ids for entity, ids in deleted.items() if ids},
+            "has_more": has_more
+        })
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# Data Export Routes
+@app.route('/export', methods=['GET'])
+@jwt_required()
+def export_data():
+    user_id = get_jwt_identity()
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in ('ndjson', 'zip'):
+        return jsonify({"error": "format must be ndjson or zip"}), 400
+    filename = f"dsa-export-{datetime.utcnow().strftime('%Y%m%d')}"
+    
+    if export_format == 'ndjson':
+        def generate():
+            yield export_header(user_id)
+            for entity in EXPORT_ENTITIES:
+                yield from export_lines(user_id, entity)
+        
+        return app.response_class(stream_with_context(generate()), mimetype='application/x-ndjson', headers={
+            "Content-Disposition": f"attachment; filename={filename}.ndjson"
+        })
+    
+    def generate_zip():
+        buffer = StreamBuffer()
+        with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+            archive.writestr('export.json', export_header(user_id))
+            for entity, (_, _, member) in EXPORT_ENTITIES.items():
+                with archive.open(member, 'w', force_zip64=True) as output:
+                    for line in export_lines(user_id, entity):
+                        output.write(line.encode())
+                        if buffer.size >= 64 * 1024:
+                            yield buffer.drain()
+                yield buffer.drain()
+        yield buffer.drain()
+    
+    return app.response_class(stream_with_context(generate_zip()), mimetype='application/zip', headers={
+        "Content-Disposition": f"attachment; filename={filename}.zip"
+    })
+
+@app.route('/import', methods=['POST'])
+@jwt_required()
+def import_data():
+    try:
+        user_id = get_jwt_identity()
+        importer = DataImporter(user_id)
+        
+        # Read line by line from the request stream; the body is never held whole
+        for line_number, line in enumerate(request.stream, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+                entity = record.get('type')
+                if entity not in EXPORT_ENTITIES:
+                    continue
+                importer.add(entity, record['data'])
+            except (ValueError, KeyError, TypeError, AttributeError) as e:
+                # All or nothing, so the corrected file can simply be sent again
+                db.session.rollback()
+                return jsonify({
+                    "error": f"Invalid record on line {line_number}: {e}; nothing was imported",
+                    "line": line_number
+                }), 400
+        
+        return jsonify({"message": "Import completed", **importer.finish()})
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
+
 # Resource Routes
 @app.route('/resources', methods=['GET'])
 def get_resources():
@@ -1688,9 +5381,7 @@ def get_resources():
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 50, type=int)
         
-        filtered_resources = RESOURCES
-        if resource_type:
-            filtered_resources = {k: v for k, v in RESOURCES.items() if v['type'] == resource_type}
+        filtered_resources = CURRICULUM.resources_by_type.get(resource_type, {}) if resource_type else RESOURCES
         
         resource_list = [{"id": k, **v} for k, v in filtered_resources.items()]
         
@@ -1710,18 +5401,37 @@ def get_resources():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/resources/<resource_id>', methods=['GET'])
+def get_resource(resource_id):
+    try:
+        resource = RESOURCES.get(resource_id)
+        if not resource:
+            return jsonify({"error": "Resource not found"}), 404
+        
+        return jsonify({
+            "id": resource_id,
+            **resource,
+            "days": [{
+                "week": week,
+                "day": day,
+                "topic": CURRICULUM.days[(week, day)]['topic']
+            } for week, day in CURRICULUM.resource_days.get(resource_id, [])]
+        })
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 @app.route('/roadmap', methods=['GET'])
 def get_roadmap():
     try:
         week = request.args.get('week', type=int)
         
         if week:
-            roadmap_week = next((w for w in ROADMAP if w['week'] == week), None)
+            roadmap_week = CURRICULUM.weeks.get(week)
             if not roadmap_week:
                 return jsonify({"error": "Week not found"}), 404
             return jsonify(roadmap_week)
         
-        return jsonify({"roadmap": ROADMAP})
+        return jsonify({"version": CURRICULUM.version, "roadmap": ROADMAP})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -1731,6 +5441,7 @@ def get_roadmap():
 def get_sessions():
     try:
         user_id = get_jwt_identity()
+        current_session_id = get_jwt().get('sid')
         sessions = UserSession.query.filter_by(user_id=user_id, is_active=True)\
             .order_by(desc(UserSession.last_activity)).all()
         
@@ -1740,7 +5451,8 @@ def get_sessions():
                 "device_info": s.device_info,
                 "ip_address": s.ip_address,
                 "login_time": s.login_time.isoformat(),
-                "last_activity": s.last_activity.isoformat()
+                "last_activity": s.last_activity.isoformat(),
+                "current": s.id == current_session_id
             } for s in sessions]
         })
     except Exception as e:
@@ -1758,12 +5470,117 @@ def revoke_session(session_id):
         
         session.is_active = False
         db.session.commit()
+        cache.set(session_state_key(session.id), False, ttl=refresh_token_lifetime())
         
         return jsonify({"message": "Session revoked successfully"})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+# Batch Routes
+# Sub-requests go through the normal routing, hooks and handlers. Run one
+# after another they share the batch's app context, so its g, DB session and
+# session check; parallel reads each get their own context on a worker thread.
+# State g holds for a single request is dropped before each sub-request, and
+# the session is rolled back after each one, so nothing a handler left behind
+# (say a failed update it never rolled back) is committed by the next.
+_batch_executor = ThreadPoolExecutor(max_workers=BATCH_PARALLEL_WORKERS, thread_name_prefix='batch')
+
+def batch_environ(sub):
+    headers = {name.title(): value for name, value in (sub.get('headers') or {}).items()
+               if name.title() in BATCH_FORWARDED_HEADERS}
+    headers['Authorization'] = request.headers.get('Authorization', '')
+    headers['User-Agent'] = request.headers.get('User-Agent', '')
+    builder = EnvironBuilder(
+        path=sub['path'],
+        method=sub.get('method', 'GET').upper(),
+        base_url=request.host_url,
+        headers=headers,
+        json=sub['body'] if 'body' in sub else None,
+        environ_base={"REMOTE_ADDR": request.remote_addr}
+    )
+    try:
+        return builder.get_environ()
+    finally:
+        builder.close()
+
+def run_sub_request(sub_id, environ, session_id):
+    try:
+        with app.request_context(environ):
+            for name in BATCH_REQUEST_SCOPED_GLOBALS:
+                g.pop(name, None)
+            g.verified_session_id = session_id
+            response = app.full_dispatch_request()
+        
+        if response.is_streamed:
+            response.close()
+            return {"id": sub_id, "status": 400, "headers": {}, "body": {"error": "Streaming endpoints cannot be batched"}}
+        return {
+            "id": sub_id,
+            "status": response.status_code,
+            "headers": {name: response.headers[name] for name in BATCH_RESPONSE_HEADERS if name in response.headers},
+            "body": response.get_json(silent=True) if response.is_json else (response.get_data(as_text=True) or None)
+        }
+    except Exception as e:
+        # Only this sub-request fails; the others still get their responses
+        return {"id": sub_id, "status": 500, "headers": {}, "body": {"error": str(e)}}
+
+@app.route('/batch', methods=['POST'])
+@jwt_required()
+def batch_requests():
+    try:
+        data = request.get_json() or {}
+        subs = data.get('requests')
+        if not isinstance(subs, list) or not subs:
+            return jsonify({"error": "requests must be a non-empty list"}), 400
+        if len(subs) > BATCH_MAX_REQUESTS:
+            return jsonify({"error": f"At most {BATCH_MAX_REQUESTS} requests per batch"}), 400
+        for sub in subs:
+            if not isinstance(sub, dict) or not isinstance(sub.get('path'), str) or not sub['path'].startswith('/'):
+                return jsonify({"error": "Every request needs a path starting with /"}), 400
+            if sub['path'].split('?')[0].rstrip('/') == '/batch':
+                return jsonify({"error": "Batches cannot be nested"}), 400
+            if str(sub.get('method', 'GET')).upper() not in ('GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE'):
+                return jsonify({"error": f"Unsupported method {sub.get('method')}"}), 400
+        
+        session_id = get_jwt().get('sid')
+        jobs = [(sub.get('id', index), batch_environ(sub)) for index, sub in enumerate(subs)]
+        
+        # Only a batch of nothing but reads may run concurrently; anything
+        # else runs in order, so later requests see earlier writes
+        reads_only = all(environ['REQUEST_METHOD'] in ('GET', 'HEAD') for _, environ in jobs)
+        if data.get('parallel') and reads_only and len(jobs) > 1:
+            futures = [_batch_executor.submit(run_sub_request, sub_id, environ, session_id) for sub_id, environ in jobs]
+            responses = [future.result() for future in futures]
+        else:
+            responses = []
+            for sub_id, environ in jobs:
+                responses.append(run_sub_request(sub_id, environ, session_id))
+                # Handlers do not roll back on errors; the next one shares this session
+                db.session.rollback()
+        
+        return jsonify({"responses": responses})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 # JWT Error Handlers
+@jwt.token_in_blocklist_loader
+def check_if_session_revoked(jwt_header, jwt_payload):
+    session_id = jwt_payload.get('sid')
+    if not session_id:
+        return False
+    # Sub-requests of a batch were checked once for the whole batch
+    if g.get('verified_session_id') == session_id:
+        return False
+    if not session_is_active(session_id):
+        return True
+    touch_session(session_id)
+    g.verified_session_id = session_id
+    return False
+
+@jwt.revoked_token_loader
+def revoked_token_callback(jwt_header, jwt_payload):
+    return jsonify({"error": "Session has been revoked"}), 401
+
 @jwt.expired_token_loader
 def expired_token_callback(jwt_header, jwt_payload):
     return jsonify({"error": "Token has expired"}), 401
@@ -1793,7 +5610,165 @@ def health_check():
         "timestamp": datetime.utcnow().isoformat()
     })
 
+# CLI Commands
+@app.cli.command('upgrade-schema')
+def upgrade_schema_command():
+    """Add columns and indexes that existing tables are missing (run after every deploy, before the backfills)."""
+    changes = upgrade_schema()
+    for change in changes:
+        click.echo(f"Added {change}")
+    click.echo(f"Schema is up to date ({len(changes)} changes, {ensure_partitions()} partitions created)")
+
+@app.cli.command('recompute-streaks')
+def recompute_streaks_command():
+    """Recompute every user's streaks from user_daily_activity (run nightly)."""
+    updated = recompute_all_streaks()
+    click.echo(f"Recomputed streaks for {updated} users")
+
+@app.cli.command('backfill-daily-activity')
+@click.option('--batch-size', default=500, show_default=True, help='Users rebuilt per transaction.')
+def backfill_daily_activity_command(batch_size):
+    """Rebuild user_daily_activity from progress and pomodoro history, then recompute streaks."""
+    click.echo(f"Rebuilt daily activity for {backfill_daily_activity(batch_size)} users")
+    click.echo(f"Recomputed streaks for {recompute_all_streaks()} users")
+
+@app.cli.command('fanout-notifications')
+@click.argument('campaign', type=click.Choice(sorted(NOTIFICATION_CAMPAIGNS)))
+def fanout_notifications_command(campaign):
+    """Create a scheduled notification campaign for every eligible user."""
+    started = time.perf_counter()
+    stats = NOTIFICATION_CAMPAIGNS[campaign]()
+    click.echo(f"{campaign}: {stats} in {time.perf_counter() - started:.2f}s")
+
+@app.cli.command('recount-unread-notifications')
+def recount_unread_notifications_command():
+    """Recount every user's unread notification counter from the notifications themselves."""
+    click.echo(f"Corrected unread counts for {recount_unread_notifications()} users")
+
+@app.cli.command('send-emails')
+def send_emails_command():
+    """Drain the email outbox."""
+    sent = 0
+    while True:
+        processed = deliver_pending_emails()
+        if not processed:
+            break
+        sent += processed
+    click.echo(f"Processed {sent} queued emails")
+
+@app.cli.command('snapshot-leaderboards')
+def snapshot_leaderboards_command():
+    """Rebuild the leaderboards from the database and persist them."""
+    click.echo(f"Snapshotted leaderboards: {snapshot_leaderboards()}")
+
+@app.cli.command('backfill-rollups')
+@click.option('--batch-size', default=500, show_default=True, help='Users rebuilt per transaction.')
+def backfill_rollups_command(batch_size):
+    """Rebuild the daily analytics rollup from progress, pomodoro and note history."""
+    click.echo(f"Rebuilt rollups for {backfill_rollups(batch_size)} users")
+
+@app.cli.command('backfill-note-storage')
+@click.option('--batch-size', default=500, show_default=True, help='Notes rewritten per transaction.')
+def backfill_note_storage_command(batch_size):
+    """Fill note snippets and compress large note bodies written before either existed."""
+    click.echo(f"Rewrote {backfill_note_storage(batch_size)} notes")
+
+@app.cli.command('rebuild-tag-index')
+@click.option('--batch-size', default=500, show_default=True, help='Notes indexed per transaction.')
+def rebuild_tag_index_command(batch_size):
+    """Rebuild note_tag and the per-user tag counts from note.tags."""
+    click.echo(f"Indexed tags for {rebuild_tag_index(batch_size)} notes")
+
+@app.cli.command('recompute-cohort-stats')
+@click.option('--cohort', 'cohort_id', default=None, help='Only rebuild this cohort.')
+def recompute_cohort_stats_command(cohort_id):
+    """Rebuild cohort member totals and weekly stats from progress."""
+    click.echo(f"Recomputed {recompute_cohort_stats(cohort_id)} cohorts")
+
+@app.cli.command('simulate-replication')
+@click.option('--lag', default=2.0, show_default=True, help='Seconds between copies, i.e. the replication lag.')
+def simulate_replication_command(lag):
+    """Keep SQLite replicas trailing the primary by copying it over every --lag seconds."""
+    if not REPLICA_BINDS:
+        raise click.ClickException("DATABASE_REPLICA_URL is not set")
+    if db_dialect() != 'sqlite':
+        # A PostgreSQL standby can be delayed with recovery_min_apply_delay instead
+        raise click.ClickException("Only SQLite primaries can be copied")
+    while True:
+        copy_primary_to_replicas()
+        click.echo(f"Copied primary to {len(REPLICA_BINDS)} replicas at {datetime.utcnow().isoformat()}")
+        time.sleep(lag)
+
+@app.cli.command('purge-deleted-accounts')
+@click.option('--chunk-size', default=ACCOUNT_PURGE_CHUNK_SIZE, show_default=True, help='Rows deleted per transaction.')
+def purge_deleted_accounts_command(chunk_size):
+    """Purge the data of accounts deleted through DELETE /account."""
+    def progress(deletion):
+        click.echo(f"{deletion.user_id} {deletion.current_table}: {deletion.deleted_rows}")
+    click.echo(f"Purged {purge_deleted_accounts(chunk_size, progress)} accounts")
+
+@app.cli.command('enforce-retention')
+@click.option('--batch-size', default=RETENTION_BATCH_SIZE, show_default=True, help='Rows deleted per transaction.')
+@click.option('--table', 'tables', multiple=True, type=click.Choice(sorted(RETENTION_POLICIES)), help='Only these tables.')
+def enforce_retention_command(batch_size, tables):
+    """Delete, or archive and delete, rows past their table's retention period."""
+    for name in tables or RETENTION_POLICIES:
+        stats = apply_retention_policy(name, batch_size)
+        archive = f" (archived to {stats['archive']})" if stats['archive'] else ''
+        click.echo(f"{name}: reclaimed {stats['deleted']} rows{archive}")
+
+@app.cli.command('redis-standin')
+@click.option('--host', default='127.0.0.1', show_default=True)
+@click.option('--port', default=6379, show_default=True)
+def redis_standin_command(host, port):
+    """Serve a shared cache and pub/sub to local workers over the Redis protocol (development only)."""
+    with RedisStandInServer((host, port)) as server:
+        click.echo(f"Listening on redis://{host}:{port}")
+        server.serve_forever()
+
+@app.cli.command('partition-tables')
+def partition_tables_command():
+    """Convert pomodoro_session and ai_conversation to monthly partitions (PostgreSQL, locks the tables while copying)."""
+    if db_dialect() != 'postgresql':
+        raise click.ClickException("Partitioning needs PostgreSQL")
+    for table_name in PARTITIONED_TABLES:
+        converted = partition_existing_table(table_name)
+        click.echo(f"{table_name}: {'partitioned' if converted else 'already partitioned'}")
+    click.echo(f"Created {ensure_partitions()} partitions")
+
+@app.cli.command('drop-partitions')
+@click.argument('table_name', type=click.Choice(sorted(PARTITIONED_TABLES)))
+@click.option('--before', required=True, help='Drop monthly partitions that end before this month (YYYY-MM).')
+@click.option('--detach-only', is_flag=True, help='Detach the partitions but keep them as standalone tables.')
+def drop_partitions_command(table_name, before, detach_only):
+    """Detach or drop whole monthly partitions instead of deleting their rows."""
+    if db_dialect() != 'postgresql':
+        raise click.ClickException("Partitioning needs PostgreSQL")
+    cutoff = datetime.strptime(before, '%Y-%m')
+    for month in expired_partitions(table_name, cutoff):
+        click.echo(f"{'Detached' if detach_only else 'Dropped'} {drop_partition(table_name, month, detach_only)}")
+
+@app.cli.command('validate-curriculum')
+@click.argument('path', default=CURRICULUM_PATH)
+def validate_curriculum_command(path):
+    """Check a curriculum file for unknown resources and duplicate weeks or days."""
+    with open(path, encoding='utf-8') as f:
+        errors = validate_curriculum(json.load(f))
+    for error in errors:
+        click.echo(error, err=True)
+    if errors:
+        raise SystemExit(1)
+    click.echo(f"{path} is valid")
+
 # Initialize Database
+# New tables are created here. Existing databases also need
+#   flask --app app upgrade-schema
+# after each deploy, before traffic reaches it. Databases created before the
+# corresponding tables and columns existed then need backfill-daily-activity,
+# recount-unread-notifications, backfill-note-storage, rebuild-tag-index and
+# backfill-rollups once, and on PostgreSQL partition-tables. upgrade-schema
+# also tops up the monthly partitions. Cohort stats count only days that are
+# still completed; recompute-cohort-stats once brings older totals in line.
 with app.app_context():
     db.create_all()
 
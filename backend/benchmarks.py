@@ -0,0 +1,236 @@
+#backend/benchmarks.py
+# Ad-hoc load benchmarks run in-process against a throwaway SQLite database.
+#
+#   python benchmarks.py login --hash-workers 0 --concurrency 16 --requests 200
+#   python benchmarks.py login --hash-workers 2 --concurrency 16 --requests 200
+#   python benchmarks.py notes --notes 500 --note-size 20000
+#   python benchmarks.py notes --notes 500 --note-size 20000 --compress-threshold 1000000000
+#   python benchmarks.py autosave --note-size 50000 --requests 200
+#   python benchmarks.py batch --requests 200
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+def load_app(args):
+    db_path = os.path.join(tempfile.mkdtemp(prefix='dsa-bench-'), 'bench.db')
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+    os.environ['PASSWORD_HASH_WORKERS'] = str(args.hash_workers)
+    os.environ['PASSWORD_HASH_MAX_PENDING'] = str(max(args.concurrency, 1))
+    os.environ['NOTE_COMPRESSION_THRESHOLD'] = str(args.compress_threshold)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import app as backend
+    return backend
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def report(name, latencies, elapsed):
+    print(f"{name}: {len(latencies)} requests in {elapsed:.2f}s "
+          f"({len(latencies) / elapsed:.1f} req/s)")
+    print(f"  p50={percentile(latencies, 50) * 1000:.1f}ms "
+          f"p95={percentile(latencies, 95) * 1000:.1f}ms "
+          f"p99={percentile(latencies, 99) * 1000:.1f}ms "
+          f"mean={statistics.mean(latencies) * 1000:.1f}ms")
+
+
+def bench_login(args):
+    backend = load_app(args)
+    client = backend.app.test_client()
+    credentials = {"email": "bench@example.com", "password": "correct horse battery staple"}
+    client.post('/auth/register', json={**credentials, "name": "Bench"})
+
+    def login(_):
+        started = time.perf_counter()
+        response = backend.app.test_client().post('/auth/login', json=credentials)
+        assert response.status_code == 200, response.get_json()
+        return time.perf_counter() - started
+
+    def health(_):
+        started = time.perf_counter()
+        backend.app.test_client().get('/health')
+        return time.perf_counter() - started
+
+    # Warm up the hashing pool so process start-up is not measured
+    login(None)
+
+    probes = []
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        started = time.perf_counter()
+        logins = [executor.submit(login, i) for i in range(args.requests)]
+        # Probe a cheap endpoint while the burst is in flight to see whether
+        # hashing starves unrelated requests
+        while not all(f.done() for f in logins):
+            probes.append(health(None))
+            time.sleep(0.05)
+        login_latencies = [f.result() for f in logins]
+        elapsed = time.perf_counter() - started
+
+    print(f"hash method={backend.PASSWORD_HASH_METHOD} hash_workers={args.hash_workers} "
+          f"concurrency={args.concurrency}")
+    report('login', login_latencies, elapsed)
+    report('health during login burst', probes, sum(probes) or 1)
+
+
+def login_headers(client):
+    credentials = {"email": "bench@example.com", "password": "correct horse battery staple"}
+    client.post('/auth/register', json={**credentials, "name": "Bench"})
+    token = client.post('/auth/login', json=credentials).get_json()['access_token']
+    return {"Authorization": f"Bearer {token}"}
+
+
+def note_body(rng, size):
+    # Prose-like bodies: HTML paragraphs drawn from a limited vocabulary
+    vocabulary = [f"term{i}" for i in range(400)] + ["array", "graph", "heap", "tree", "the", "of", "and", "a"]
+    words = []
+    while sum(len(w) + 1 for w in words) < size:
+        words.append(rng.choice(vocabulary))
+    return ''.join(f"<p>{' '.join(words[j:j + 60])}</p>" for j in range(0, len(words), 60))
+
+
+def bench_notes(args):
+    backend = load_app(args)
+    client = backend.app.test_client()
+    headers = login_headers(client)
+    
+    rng = random.Random(42)
+    for i in range(args.notes):
+        client.post('/notes', headers=headers, json={"title": f"Note {i}", "content": note_body(rng, args.note_size), "tags": ["bench"]})
+    
+    with backend.app.app_context():
+        notes = backend.Note.__table__
+        stored = backend.db.session.execute(
+            backend.select(backend.func.sum(backend.func.length(notes.c.content)))
+        ).scalar()
+        backend.db.session.remove()
+        database_path = backend.db.engine.url.database
+    
+    def timed(path, rounds):
+        latencies = []
+        size = 0
+        for _ in range(rounds):
+            started = time.perf_counter()
+            response = client.get(path, headers=headers)
+            latencies.append(time.perf_counter() - started)
+            assert response.status_code == 200, response.get_json()
+            size = len(response.data)
+        return latencies, size
+    
+    print(f"notes={args.notes} note_size={args.note_size} compress_threshold={args.compress_threshold}")
+    print(f"  stored content: {stored / 1024 / 1024:.1f} MiB, "
+          f"database file: {os.path.getsize(database_path) / 1024 / 1024:.1f} MiB")
+    for name, path in (
+        ('list (content deferred)', '/notes?per_page=20'),
+        ('list (with content)', '/notes?per_page=20&include_content=true'),
+        ('dashboard', '/dashboard'),
+    ):
+        latencies, size = timed(path, args.requests)
+        report(f"{name}, {size / 1024:.1f} KiB/response", latencies, sum(latencies))
+
+
+def bench_autosave(args):
+    backend = load_app(args)
+    client = backend.app.test_client()
+    headers = login_headers(client)
+    
+    rng = random.Random(42)
+    original = note_body(rng, args.note_size)
+    edits = [(rng.randint(0, len(original)), f" edit{i} ") for i in range(args.requests)]
+    
+    def run(method):
+        response = client.post('/notes', headers=headers, json={"title": "Autosave", "content": original})
+        note_id, etag = response.get_json()['id'], response.headers['ETag']
+        content = original
+        latencies = []
+        sent = 0
+        for position, text in edits:
+            position = min(position, len(content))
+            if method == 'PUT':
+                payload = {"content": content[:position] + text + content[position:]}
+            else:
+                payload = {"ops": [["=", position], ["+", text]]}
+            content = content[:position] + text + content[position:]
+            body = backend.json.dumps(payload)
+            sent += len(body)
+            
+            started = time.perf_counter()
+            response = client.open(f'/notes/{note_id}', method=method, data=body,
+                                   headers={**headers, "If-Match": etag, "Content-Type": "application/json"})
+            latencies.append(time.perf_counter() - started)
+            assert response.status_code == 200, response.get_json()
+            etag = response.headers['ETag']
+        
+        with backend.app.app_context():
+            revisions = backend.NoteRevision.__table__
+            stored = backend.db.session.execute(
+                backend.select(backend.func.sum(backend.func.length(revisions.c.data)))
+                .where(revisions.c.note_id == note_id)
+            ).scalar()
+            backend.db.session.remove()
+        return latencies, sent, stored
+    
+    print(f"note_size={args.note_size} saves={args.requests}")
+    for method in ('PUT', 'PATCH'):
+        latencies, sent, stored = run(method)
+        report(f"{method}: {sent / len(edits) / 1024:.2f} KiB/request, "
+               f"{stored / len(edits) / 1024:.2f} KiB revision data/save", latencies, sum(latencies))
+
+
+def bench_batch(args):
+    backend = load_app(args)
+    client = backend.app.test_client()
+    headers = login_headers(client)
+    # The calls pages/analytics.html makes on load
+    paths = ['/progress', '/pomodoro/history?per_page=1000', '/notes?per_page=1000']
+    
+    def separate():
+        for path in paths:
+            assert client.get(path, headers=headers).status_code == 200
+    
+    def batched(parallel):
+        response = client.post('/batch', headers=headers,
+                               json={"requests": [{"path": path} for path in paths], "parallel": parallel})
+        assert all(r['status'] == 200 for r in response.get_json()['responses'])
+    
+    print(f"analytics page load: {len(paths)} calls, {args.requests} rounds")
+    for name, run in (('separate requests', separate),
+                      ('batch', lambda: batched(False)),
+                      ('batch, parallel', lambda: batched(True))):
+        latencies = []
+        for _ in range(args.requests):
+            started = time.perf_counter()
+            run()
+            latencies.append(time.perf_counter() - started)
+        report(name, latencies, sum(latencies))
+
+
+BENCHMARKS = {
+    'login': bench_login,
+    'notes': bench_notes,
+    'autosave': bench_autosave,
+    'batch': bench_batch,
+}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='DSA backend benchmarks')
+    parser.add_argument('benchmark', choices=sorted(BENCHMARKS))
+    parser.add_argument('--hash-workers', type=int, default=2)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--notes', type=int, default=500)
+    parser.add_argument('--note-size', type=int, default=20000)
+    parser.add_argument('--compress-threshold', type=int, default=4096)
+    args = parser.parse_args()
+    BENCHMARKS[args.benchmark](args)
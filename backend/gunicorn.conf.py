@@ -0,0 +1,28 @@
+#backend/gunicorn.conf.py
+# gunicorn picks this file up from the working directory: gunicorn app:app
+import gc
+import os
+
+# Import the app (and parse/index the curriculum) once in the master; forked
+# workers then share those pages copy-on-write
+preload_app = True
+
+# Every open notification stream holds a thread for up to
+# NOTIFICATION_STREAM_MAX_SECONDS, which would tie up a whole sync worker
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', 32))
+# Kept above the stream limit, so streams are never cut off by the arbiter
+timeout = int(os.getenv('NOTIFICATION_STREAM_MAX_SECONDS', 300)) + 30
+
+
+def pre_fork(server, worker):
+    # Move everything allocated so far out of the collector's reach, so that
+    # collections in the workers do not write to (and un-share) those pages
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    # Connections opened while preloading must not be shared across processes
+    from app import app, db
+    with app.app_context():
+        db.engine.dispose(close=False)
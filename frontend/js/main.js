@@ -94,6 +94,18 @@ const api = {
         }
     },
 
+    // Several calls in one round trip, e.g.
+    // api.batch([{ id: 'progress', path: '/progress' }, { id: 'notes', path: '/notes?per_page=1' }], { parallel: true })
+    // resolves to { progress: { status, headers, body }, notes: {...} }
+    async batch(requests, { parallel = false } = {}) {
+        const data = await api.post('/batch', { requests, parallel });
+        const results = {};
+        data.responses.forEach((response) => {
+            results[response.id] = response;
+        });
+        return results;
+    },
+
     get: (url) => api.request(url, { method: 'GET' }),
     post: (url, data) => api.request(url, { method: 'POST', body: JSON.stringify(data) }),
     put: (url, data) => api.request(url, { method: 'PUT', body: JSON.stringify(data) }),